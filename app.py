@@ -6,6 +6,9 @@ from datetime import datetime, timedelta
 import requests
 import os
 from database import SupabaseDB
+from utils.rollups import get_shared_rollup
+from utils.stream_cache import StreamCache
+from utils.gap import GAPStore
 
 # Configuration de la page
 st.set_page_config(
@@ -126,12 +129,12 @@ def get_activities(access_token, after_timestamp=None, per_page=200):
         if response.status_code != 200:
             st.error(f"Erreur API Strava: {response.status_code}")
             break
-            
+        
         activities = response.json()
         
         if not activities:
             break
-            
+        
         all_activities.extend(activities)
         page += 1
         
@@ -154,7 +157,7 @@ def process_activities(activities):
         'id', 'name', 'distance', 'moving_time', 'elapsed_time', 
         'total_elevation_gain', 'type', 'start_date', 
         'average_speed', 'max_speed', 'average_heartrate',
-        'max_heartrate', 'suffer_score'
+        'max_heartrate', 'suffer_score', 'workout_type'
     ]
     
     df = df[[col for col in columns_to_keep if col in df.columns]]
@@ -317,6 +320,9 @@ if df.empty:
 st.session_state.df = df
 st.session_state.after_date = after_date
 
+# Agrégats jour/semaine/mois partagés avec les autres pages (mis à jour incrémentalement)
+rollup = get_shared_rollup(st.session_state, df)
+
 # Page d'accueil - Vue d'ensemble
 # Les autres pages (Charge d'entraînement, Analyse détaillée) sont dans le dossier pages/
 # et sont automatiquement détectées par Streamlit
@@ -354,19 +360,12 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader("📈 Évolution hebdomadaire")
     
-    # Regroupement par semaine
-    df_weekly = df.copy()
-    df_weekly['week'] = df_weekly['start_date'].dt.to_period('W').astype(str)
-    
-    weekly_stats = df_weekly.groupby('week').agg({
-        'distance_km': 'sum',
-        'elevation_gain_m': 'sum',
-        'duration_hours': 'sum'
-    }).reset_index()
+    # Regroupement par semaine (agrégats partagés)
+    weekly_stats = rollup.get('week')
     
     fig = go.Figure()
     fig.add_trace(go.Bar(
-        x=weekly_stats['week'],
+        x=weekly_stats.index,
         y=weekly_stats['distance_km'],
         name='Distance (km)',
         marker_color='#FC4C02'
@@ -386,7 +385,7 @@ with col2:
     
     fig = go.Figure()
     fig.add_trace(go.Bar(
-        x=weekly_stats['week'],
+        x=weekly_stats.index,
         y=weekly_stats['elevation_gain_m'],
         name='D+ (m)',
         marker_color='#00A8E8'
@@ -401,6 +400,49 @@ with col2:
     
     st.plotly_chart(fig, use_container_width=True)
 
+# Tendance de l'allure ajustée à la pente (streams en cache)
+if 'stream_cache' not in st.session_state:
+    st.session_state.stream_cache = StreamCache()
+if 'gap_store' not in st.session_state:
+    st.session_state.gap_store = GAPStore()
+
+gap_store = st.session_state.gap_store
+gap_store.sync(st.session_state.stream_cache)
+gap_trend = gap_store.gap_trend(df, freq='W')
+
+st.subheader("🏔️ Allure ajustée à la pente (GAP)")
+
+if not gap_trend.empty:
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=gap_trend.index,
+        y=gap_trend['pace_min_km'],
+        mode='lines+markers',
+        name='Allure réelle',
+        line=dict(color='#FC4C02', width=2)
+    ))
+    fig.add_trace(go.Scatter(
+        x=gap_trend.index,
+        y=gap_trend['gap_pace_min_km'],
+        mode='lines+markers',
+        name='GAP',
+        line=dict(color='#2E7D32', width=2)
+    ))
+    
+    fig.update_layout(
+        height=350,
+        xaxis_title="Semaine",
+        yaxis_title="Allure (min/km)",
+        yaxis=dict(autorange='reversed'),
+        hovermode='x unified'
+    )
+    
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"Calculée sur {len(gap_store.activities)} sorties dont les streams sont en cache "
+               "(préchargement depuis la page Charge d'entraînement)")
+else:
+    st.info("Préchargez les streams depuis la page Charge d'entraînement pour suivre la GAP")
+
 st.divider()
 
 # Analyses détaillées
@@ -12,8 +12,17 @@ sys.path.append('..')
 
 from utils.training_load import (
     TrainingLoadCalculator, 
+    IncrementalLoadEngine,
+    PLAN_TEMPLATES,
+    build_plan_from_template,
     add_training_load_metrics
 )
+from utils.banister_model import fit_banister_from_history
+from utils.activity_analysis import ActivityAnalyzer
+from utils.stream_cache import StreamCache, ANALYSIS_STREAM_TYPES
+from utils.hr_zones import HRZoneEngine
+from utils.rollups import get_activity_rollup, get_activity_index
+from utils.performance_prediction import PerformancePredictor
 
 st.set_page_config(
     page_title="Charge d'entraînement",
@@ -32,6 +41,10 @@ if 'df' not in st.session_state or st.session_state.df.empty:
 
 df = st.session_state.df
 
+if 'stream_cache' not in st.session_state:
+    st.session_state.stream_cache = StreamCache()
+stream_cache = st.session_state.stream_cache
+
 st.header("⚡ Charge d'entraînement")
 
 # Configuration personnalisée
@@ -60,6 +73,26 @@ with st.sidebar:
         help="Pour le calcul du TRIMP"
     )
     
+    # Constantes ATL/CTL personnalisées (modèle de Banister ajusté)
+    atl_days, ctl_days = 7, 42
+    if st.session_state.get('banister_fit'):
+        banister_fit = st.session_state.banister_fit
+        if st.checkbox(
+            "Utiliser mes constantes personnalisées",
+            help=f"ATL {banister_fit['atl_days']:.0f} j / CTL {banister_fit['ctl_days']:.0f} j (modèle de Banister)"
+        ):
+            atl_days = banister_fit['atl_days']
+            ctl_days = banister_fit['ctl_days']
+    
+    # Réglages partagés avec les autres pages (ex: affûtage des objectifs)
+    st.session_state.load_settings = {
+        'fc_max': fc_max,
+        'fc_repos': fc_repos,
+        'gender': gender,
+        'atl_days': atl_days,
+        'ctl_days': ctl_days
+    }
+    
     st.divider()
     
     # Période d'analyse
@@ -85,12 +118,54 @@ if df_filtered.empty:
     st.warning("Aucune donnée pour cette période")
     st.stop()
 
+# Streams FC : TSS/TRIMP intégrés seconde par seconde pour les sorties téléchargées
+with st.sidebar:
+    st.divider()
+    
+    with_hr = df_filtered
+    if 'average_heartrate' in df_filtered.columns:
+        with_hr = df_filtered[df_filtered['average_heartrate'].notna()]
+    missing_ids = [
+        int(activity_id) for activity_id in with_hr.sort_values('start_date', ascending=False)['id']
+        if pd.notna(activity_id) and activity_id not in stream_cache
+    ] if 'id' in with_hr.columns else []
+    
+    st.caption(
+        f"📈 Streams FC en cache : {len(with_hr) - len(missing_ids)}/{len(with_hr)} sorties "
+        "(TSS calculé seconde par seconde)"
+    )
+    
+    if missing_ids and st.button(
+        f"Télécharger les streams FC ({min(len(missing_ids), 50)} sorties)",
+        help="Limité à 50 sorties par clic (quota de l'API Strava)"
+    ):
+        analyzer = ActivityAnalyzer(st.session_state.access_token, stream_cache)
+        progress = st.progress(0.0)
+        analyzer.prefetch_streams(
+            missing_ids, stream_types=ANALYSIS_STREAM_TYPES, progress_callback=progress.progress
+        )
+        st.rerun()
+
 # Calcul des métriques de charge
 with st.spinner("Calcul des métriques de charge..."):
-    df_with_load = add_training_load_metrics(df_filtered, fc_max, fc_repos, gender)
+    # TSS de tout l'historique : le moteur incrémental garde le même point de départ
+    # quelle que soit la période affichée, et ATL/CTL partent d'un état établi
+    df_all_load = add_training_load_metrics(df, fc_max, fc_repos, gender, stream_cache)
+    df_with_load = df_all_load[df_all_load['start_date'] >= cutoff_date].copy()
+    
+    calculator = TrainingLoadCalculator(fc_max, fc_repos, atl_days=atl_days, ctl_days=ctl_days)
+    
+    # Moteur incrémental conservé entre les reruns : seuls les nouveaux jours
+    # (ou ceux modifiés par une activité antidatée) sont recalculés
+    if 'load_engine' not in st.session_state:
+        st.session_state.load_engine = IncrementalLoadEngine()
     
-    calculator = TrainingLoadCalculator(fc_max, fc_repos)
-    load_df = calculator.calculate_atl_ctl_tsb(df_with_load, 'tss')
+    athlete_id = st.session_state.get('strava_id') or 'default'
+    full_load_df = st.session_state.load_engine.update(
+        athlete_id, df_all_load, calculator, 'tss', variant=gender
+    )
+    display_start = pd.Timestamp(cutoff_date).normalize()
+    load_df = full_load_df[full_load_df['date'] >= display_start].reset_index(drop=True)
 
 # Métriques clés actuelles
 st.subheader("📊 État actuel")
@@ -130,9 +205,13 @@ with col3:
     )
 
 with col4:
-    total_tss_week = df_with_load[
-        df_with_load['start_date'] >= (now - timedelta(days=7))
-    ]['tss'].sum()
+    load_index = get_activity_index(
+        st.session_state,
+        df_with_load,
+        name='load',
+        version=(fc_max, fc_repos, gender, stream_cache.version)
+    )
+    total_tss_week = load_index.window_sums(now - timedelta(days=7))['tss'].iloc[0]
     
     st.metric(
         "TSS cette semaine",
@@ -148,6 +227,61 @@ st.divider()
 # Graphique ATL/CTL/TSB
 st.subheader("📈 Évolution ATL / CTL / TSB")
 
+# Projection de la charge selon un plan d'entraînement
+with st.expander("🔭 Projection selon un plan d'entraînement"):
+    col_p1, col_p2, col_p3, col_p4 = st.columns(4)
+    
+    with col_p1:
+        show_projection = st.checkbox("Afficher la projection", value=False)
+    
+    with col_p2:
+        projection_end = st.date_input(
+            "Jusqu'au (jour de course)",
+            value=(now + timedelta(weeks=8)).date(),
+            min_value=(now + timedelta(days=1)).date()
+        )
+    
+    with col_p3:
+        plan_template = st.selectbox("Modèle de plan", list(PLAN_TEMPLATES.keys()))
+    
+    with col_p4:
+        # TSS hebdomadaire moyen des 4 dernières semaines comme base
+        recent_weekly_tss = load_df['daily_tss'].tail(28).sum() / 4
+        planned_weekly_tss = st.number_input(
+            "TSS hebdo de base",
+            min_value=0,
+            max_value=2000,
+            value=int(recent_weekly_tss),
+            step=10
+        )
+
+projection_df = None
+
+if show_projection:
+    engine_state = st.session_state.load_engine.get_state(athlete_id, calculator, 'tss', variant=gender)
+    projection_start = engine_state['last_date'] + pd.Timedelta(days=1)
+    n_projection_days = (pd.Timestamp(projection_end) - projection_start).days + 1
+    
+    if n_projection_days > 0:
+        planned_tss = build_plan_from_template(
+            n_projection_days,
+            planned_weekly_tss,
+            template=plan_template,
+            start_date=projection_start
+        )
+        
+        # Les jours déjà écoulés sans activité sont des jours de repos
+        elapsed_days = (pd.Timestamp(now.date()) - projection_start).days
+        if elapsed_days > 0:
+            planned_tss[:elapsed_days] = 0
+        
+        projection_df = calculator.project_load(
+            engine_state['last_atl'],
+            engine_state['last_ctl'],
+            planned_tss,
+            projection_start
+        )
+
 fig = go.Figure()
 
 # ATL (Fatigue) - 7 jours
@@ -182,6 +316,31 @@ fig.add_trace(go.Bar(
     opacity=0.6
 ))
 
+# Projection (pointillés)
+if projection_df is not None:
+    fig.add_trace(go.Scatter(
+        x=projection_df['date'],
+        y=projection_df['ATL'],
+        name='ATL projetée',
+        line=dict(color='#FF6B6B', width=2, dash='dot')
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=projection_df['date'],
+        y=projection_df['CTL'],
+        name='CTL projetée',
+        line=dict(color='#4ECDC4', width=2, dash='dot')
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=projection_df['date'],
+        y=projection_df['TSB'],
+        name='TSB projeté',
+        line=dict(color='gray', width=2, dash='dot')
+    ))
+    
+    fig.add_vline(x=projection_df['date'].iloc[0], line_dash="dot", line_color="gray", opacity=0.5)
+
 # Ligne de référence TSB = 0
 fig.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5)
 
@@ -201,6 +360,15 @@ fig.update_layout(
 
 st.plotly_chart(fig, use_container_width=True)
 
+if projection_df is not None:
+    race_day = projection_df.iloc[-1]
+    race_tsb = calculator.interpret_tsb(race_day['TSB'])
+    st.caption(
+        f"📅 Projection au {race_day['date'].strftime('%d/%m/%Y')} : "
+        f"CTL {race_day['CTL']:.1f} • ATL {race_day['ATL']:.1f} • "
+        f"TSB {race_day['TSB']:.1f} ({race_tsb['status']})"
+    )
+
 # Explications
 with st.expander("ℹ️ Comprendre ATL / CTL / TSB"):
     st.markdown("""
@@ -231,16 +399,15 @@ st.divider()
 # TSS hebdomadaire
 st.subheader("📊 TSS hebdomadaire")
 
-# Agrégation par semaine
-df_weekly = df_with_load.copy()
-df_weekly['week'] = df_weekly['start_date'].dt.to_period('W').astype(str)
-
-weekly_tss = df_weekly.groupby('week').agg({
-    'tss': 'sum',
-    'trimp': 'sum',
-    'distance_km': 'sum',
-    'elevation_gain_m': 'sum'
-}).reset_index()
+# Agrégats hebdomadaires partagés, propres aux réglages FC de cette page
+load_rollup = get_activity_rollup(
+    st.session_state,
+    df,
+    name='load',
+    version=(fc_max, fc_repos, gender, stream_cache.version),
+    prepare=lambda rows: add_training_load_metrics(rows, fc_max, fc_repos, gender, stream_cache)
+)
+weekly_tss = load_rollup.get('week', start=cutoff_date).rename_axis('week').reset_index()
 
 col1, col2 = st.columns(2)
 
@@ -272,26 +439,140 @@ with col2:
 
 st.divider()
 
+# Répartition du temps par zones FC (streams en cache)
+st.subheader("❤️ Temps par zones FC")
+
+if 'hr_zone_engine' not in st.session_state:
+    st.session_state.hr_zone_engine = HRZoneEngine()
+hr_zone_engine = st.session_state.hr_zone_engine
+hr_zone_engine.sync(stream_cache)
+
+col1, col2 = st.columns(2)
+
+with col1:
+    zone_method = st.selectbox(
+        "Méthode de zones",
+        options=['seuil', 'reserve', 'fc_max'],
+        format_func=lambda m: {
+            'seuil': '% FC seuil',
+            'reserve': '% FC de réserve (Karvonen)',
+            'fc_max': '% FC max'
+        }[m]
+    )
+
+with col2:
+    zone_seuil_fc = st.number_input(
+        "FC seuil (bpm)",
+        min_value=120,
+        max_value=210,
+        value=calculator.seuil_fc,
+        help="Utilisée par la méthode '% FC seuil'"
+    )
+
+zone_calculator = TrainingLoadCalculator(fc_max, fc_repos, seuil_fc=zone_seuil_fc)
+zone_hours = hr_zone_engine.zone_distribution(df_with_load, zone_calculator, zone_method)
+
+if zone_hours.empty:
+    st.info("Télécharge les streams FC (barre latérale) pour voir ta répartition par zones")
+else:
+    zone_bounds = zone_calculator.hr_zone_bounds(zone_method)
+    st.caption(
+        "Bornes : " + " · ".join(
+            f"{name.split()[0]} ≥ {bound:.0f} bpm"
+            for name, bound in zip(TrainingLoadCalculator.HR_ZONE_NAMES[1:], zone_bounds)
+        )
+    )
+    
+    zone_colors = ['#9E9E9E', '#2196F3', '#4CAF50', '#FF9800', '#F44336']
+    
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        fig_zones = go.Figure()
+        for zone_name, color in zip(zone_hours.columns, zone_colors):
+            fig_zones.add_trace(go.Bar(
+                x=zone_hours.index,
+                y=zone_hours[zone_name],
+                name=zone_name,
+                marker_color=color
+            ))
+        fig_zones.update_layout(
+            barmode='stack',
+            title='Heures par zone et par semaine',
+            xaxis_title='Semaine',
+            yaxis_title='Heures',
+            height=350
+        )
+        st.plotly_chart(fig_zones, use_container_width=True)
+    
+    with col2:
+        zone_totals = zone_hours.sum()
+        fig_pie = go.Figure(go.Pie(
+            labels=zone_totals.index,
+            values=zone_totals.values,
+            marker_colors=zone_colors,
+            sort=False,
+            hole=0.4
+        ))
+        fig_pie.update_layout(title='Répartition sur la période', height=350)
+        st.plotly_chart(fig_pie, use_container_width=True)
+
+st.divider()
+
 # Détection de surcharge
 st.subheader("⚠️ Alertes de surcharge")
 
+# Épisodes d'au moins 7 jours avec TSB < -30 et ATL au-dessus de son 90e percentile
 warnings = calculator.detect_overreaching(load_df, threshold_days=7, tsb_threshold=-30)
 
 if warnings:
     st.warning(f"{len(warnings)} période(s) à risque détectée(s)")
     
-    warnings_df = pd.DataFrame(warnings)
-    warnings_df['date'] = pd.to_datetime(warnings_df['date'])
-    warnings_df = warnings_df.sort_values('date', ascending=False)
-    
-    for _, warning in warnings_df.head(5).iterrows():
-        date_str = warning['date'].strftime('%Y-%m-%d')
-        st.error(f"**{date_str}** : {warning['message']}")
+    for warning in sorted(warnings, key=lambda w: w['start'], reverse=True)[:5]:
+        period_str = f"{warning['start']:%Y-%m-%d} → {warning['end']:%Y-%m-%d}"
+        if warning['type'] == 'critical':
+            st.error(f"**{period_str}** : {warning['message']}")
+        else:
+            st.warning(f"**{period_str}** : {warning['message']}")
 else:
     st.success("✅ Aucune période de surcharge détectée récemment")
 
 st.divider()
 
+# Modèle impulsion-réponse personnalisé
+with st.expander("🧬 Modèle personnalisé (Banister)"):
+    st.markdown("""
+    Estime tes propres constantes de temps **forme** et **fatigue** à partir de
+    ton historique de TSS et de tes performances (VDOT des sorties type course, sur terrain roulant).
+    """)
+    
+    if st.button("🔬 Ajuster le modèle sur tout l'historique"):
+        with st.spinner("Ajustement du modèle..."):
+            df_history = add_training_load_metrics(df, fc_max, fc_repos, gender, stream_cache)
+            st.session_state.banister_fit = fit_banister_from_history(
+                df_history, PerformancePredictor(), TrainingLoadCalculator(fc_max, fc_repos)
+            )
+        
+        if st.session_state.banister_fit is None:
+            st.warning("Pas assez d'efforts type course pour ajuster le modèle (minimum 4)")
+    
+    if st.session_state.get('banister_fit'):
+        banister_fit = st.session_state.banister_fit
+        
+        col_b1, col_b2, col_b3, col_b4 = st.columns(4)
+        col_b1.metric("τ forme", f"{banister_fit['tau_fitness']:.1f} j", help=f"Span CTL équivalent : {banister_fit['ctl_days']:.0f} j")
+        col_b2.metric("τ fatigue", f"{banister_fit['tau_fatigue']:.1f} j", help=f"Span ATL équivalent : {banister_fit['atl_days']:.0f} j")
+        col_b3.metric("R²", f"{banister_fit['r2']:.2f}")
+        col_b4.metric("Marqueurs", f"{banister_fit['n_markers']}")
+        
+        st.caption(
+            f"Gains : k forme = {banister_fit['k_fitness']:.4f}, k fatigue = {banister_fit['k_fatigue']:.4f} "
+            f"• Erreur moyenne : {banister_fit['rmse']:.2f} VDOT • {banister_fit['n_candidates']} couples testés. "
+            "Active « Utiliser mes constantes personnalisées » dans la barre latérale pour les appliquer."
+        )
+
+st.divider()
+
 # Taux de progression CTL (ramp rate)
 st.subheader("📊 Taux de progression (CTL Ramp Rate)")
 
@@ -351,6 +632,142 @@ st.info("""
 
 st.divider()
 
+# Ratio charge aiguë / chronique (ACWR)
+st.subheader("⚖️ Ratio charge aiguë / chronique (ACWR)")
+
+# Calculé sur tout l'historique : fenêtre chronique et EWMA déjà établies au début de la période
+acwr_df = calculator.calculate_acwr(full_load_df, acute_days=7, chronic_days=28)
+acwr_df = acwr_df[acwr_df['date'] >= display_start].reset_index(drop=True)
+latest_acwr = acwr_df.iloc[-1]
+
+col1, col2 = st.columns(2)
+
+with col1:
+    st.metric(
+        "ACWR (moyennes glissantes)",
+        f"{latest_acwr['acwr_rolling']:.2f}" if pd.notna(latest_acwr['acwr_rolling']) else "N/A",
+        help="TSS moyen des 7 derniers jours / TSS moyen des 28 derniers jours"
+    )
+
+with col2:
+    st.metric(
+        "ACWR (EWMA)",
+        f"{latest_acwr['acwr_ewma']:.2f}" if pd.notna(latest_acwr['acwr_ewma']) else "N/A",
+        help="Moyennes exponentielles 7 j / 28 j, plus réactives aux pics récents"
+    )
+
+fig_acwr = go.Figure()
+
+fig_acwr.add_trace(go.Scatter(
+    x=acwr_df['date'],
+    y=acwr_df['acwr_rolling'],
+    mode='lines',
+    name='ACWR glissant',
+    line=dict(color='#FC4C02', width=2)
+))
+
+fig_acwr.add_trace(go.Scatter(
+    x=acwr_df['date'],
+    y=acwr_df['acwr_ewma'],
+    mode='lines',
+    name='ACWR EWMA',
+    line=dict(color='#00A8E8', width=2, dash='dot')
+))
+
+# Zones de risque
+fig_acwr.add_hrect(
+    y0=0, y1=0.8,
+    fillcolor="gray", opacity=0.1,
+    line_width=0,
+    annotation_text="Sous-charge",
+    annotation_position="top left"
+)
+
+fig_acwr.add_hrect(
+    y0=0.8, y1=1.3,
+    fillcolor="green", opacity=0.1,
+    line_width=0,
+    annotation_text="Zone optimale",
+    annotation_position="top left"
+)
+
+fig_acwr.add_hrect(
+    y0=1.3, y1=1.5,
+    fillcolor="orange", opacity=0.1,
+    line_width=0,
+    annotation_text="Vigilance",
+    annotation_position="top left"
+)
+
+fig_acwr.add_hrect(
+    y0=1.5, y1=3,
+    fillcolor="red", opacity=0.1,
+    line_width=0,
+    annotation_text="⚠️ Risque de blessure",
+    annotation_position="top left"
+)
+
+fig_acwr.update_layout(
+    xaxis_title="Date",
+    yaxis_title="ACWR",
+    yaxis_range=[0, 2.5],
+    height=400,
+    hovermode='x unified'
+)
+
+st.plotly_chart(fig_acwr, use_container_width=True)
+
+# Monotonie et strain de Foster
+st.subheader("🔁 Monotonie et strain (Foster)")
+
+monotony_df = calculator.calculate_monotony_strain(full_load_df, window=7)
+monotony_df = monotony_df[monotony_df['date'] >= display_start].reset_index(drop=True)
+
+fig_monotony = go.Figure()
+
+fig_monotony.add_trace(go.Bar(
+    x=monotony_df['date'],
+    y=monotony_df['strain'],
+    name='Strain',
+    marker_color='rgba(252, 76, 2, 0.4)'
+))
+
+fig_monotony.add_trace(go.Scatter(
+    x=monotony_df['date'],
+    y=monotony_df['monotony'],
+    mode='lines',
+    name='Monotonie',
+    line=dict(color='purple', width=2),
+    yaxis='y2'
+))
+
+fig_monotony.add_hline(
+    y=2,
+    line_dash="dash",
+    line_color="red",
+    annotation_text="Monotonie élevée (> 2)",
+    yref='y2'
+)
+
+fig_monotony.update_layout(
+    xaxis_title="Date",
+    yaxis=dict(title="Strain (TSS hebdo × monotonie)"),
+    yaxis2=dict(title="Monotonie", overlaying='y', side='right', range=[0, 4]),
+    height=400,
+    hovermode='x unified'
+)
+
+st.plotly_chart(fig_monotony, use_container_width=True)
+
+st.info("""
+**Repères :**
+- 🟢 **ACWR 0.8 à 1.3** : charge récente cohérente avec ta base
+- 🔴 **ACWR > 1.5** : pic de charge, risque de blessure accru
+- 🔴 **Monotonie > 2** : séances trop uniformes, alterne jours durs et faciles
+""")
+
+st.divider()
+
 # Tableau des dernières sorties avec métriques
 st.subheader("🏃 Dernières sorties avec métriques de charge")
 
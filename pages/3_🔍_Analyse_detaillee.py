@@ -4,10 +4,14 @@ Page d'analyse détaillée des sorties
 
 import streamlit as st
 import pandas as pd
+import re
 import sys
 sys.path.append('..')
 
 from utils.activity_analysis import ActivityAnalyzer, get_similar_activities
+from utils.stream_cache import StreamCache
+from utils.climbs import ClimbStore
+from utils.gap import activity_gap, speed_to_pace
 
 st.set_page_config(
     page_title="Analyse détaillée",
@@ -99,7 +103,10 @@ if 'id' not in selected_activity or pd.isna(selected_activity['id']):
 activity_id = int(selected_activity['id'])
 
 # Récupération des streams
-analyzer = ActivityAnalyzer(access_token)
+if 'stream_cache' not in st.session_state:
+    st.session_state.stream_cache = StreamCache()
+
+analyzer = ActivityAnalyzer(access_token, st.session_state.stream_cache)
 
 with st.spinner("Chargement des données détaillées..."):
     streams = analyzer.get_activity_streams(
@@ -112,12 +119,20 @@ if not streams:
     st.error("Impossible de récupérer les données détaillées de cette activité")
     st.stop()
 
+# Montées/descentes de toutes les activités en cache
+if 'climb_store' not in st.session_state:
+    st.session_state.climb_store = ClimbStore()
+
+climb_store = st.session_state.climb_store
+climb_store.sync(st.session_state.stream_cache)
+
 # Tabs pour les différentes analyses
-tab1, tab2, tab3, tab4 = st.tabs([
+tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "🗺️ Carte", 
     "⛰️ Profil d'élévation", 
     "📊 Allure & FC",
-    "🔬 Analyse par segments"
+    "🔬 Analyse par segments",
+    "🧗 Montées"
 ])
 
 # TAB 1: Carte interactive
@@ -149,7 +164,8 @@ with tab2:
             'name': selected_activity['name']
         }
         
-        elev_fig = analyzer.create_elevation_profile(streams, activity_info)
+        activity_climbs = climb_store.for_activity(activity_id)
+        elev_fig = analyzer.create_elevation_profile(streams, activity_info, climbs=activity_climbs)
         
         if elev_fig:
             st.plotly_chart(elev_fig, use_container_width=True)
@@ -175,6 +191,20 @@ with tab2:
                 gradient = np.gradient(altitude, distance_m) * 100
                 avg_gradient = np.mean(gradient[gradient > 0])  # Seulement montées
                 st.metric("Pente moy. montée", f"{avg_gradient:.1f} %")
+            
+            # Montées et descentes détectées
+            if not activity_climbs.empty:
+                st.write(f"**{(activity_climbs['type'] == 'montée').sum()} montée(s) et "
+                         f"{(activity_climbs['type'] == 'descente').sum()} descente(s) détectées**")
+                
+                display_climbs = activity_climbs[[
+                    'type', 'start_km', 'end_km', 'length_m', 'elevation_m',
+                    'avg_grade_pct', 'max_grade_pct', 'vam_m_h'
+                ]].copy()
+                display_climbs.columns = ['Type', 'Début (km)', 'Fin (km)', 'Longueur (m)', 'Dénivelé (m)',
+                                          'Pente moy. (%)', 'Pente max (%)', 'VAM (m/h)']
+                
+                st.dataframe(display_climbs.round(1), use_container_width=True, hide_index=True)
         else:
             st.warning("Impossible de créer le profil")
     else:
@@ -208,6 +238,18 @@ with tab3:
                 st.metric("Allure min", f"{pace.min():.2f} min/km")
                 st.metric("Allure max", f"{pace.max():.2f} min/km")
                 st.metric("Allure médiane", f"{np.median(pace):.2f} min/km")
+            
+            if all(key in streams for key in ('time', 'distance', 'altitude')):
+                gap = activity_gap(
+                    streams['time']['data'], streams['distance']['data'], streams['altitude']['data']
+                )
+                if gap:
+                    st.metric(
+                        "GAP moyenne",
+                        f"{speed_to_pace(gap['gap_speed_m_s']):.2f} min/km",
+                        delta=f"{speed_to_pace(gap['gap_speed_m_s']) - speed_to_pace(gap['speed_m_s']):+.2f} min/km vs allure",
+                        delta_color="off"
+                    )
         
         with col2:
             if 'heartrate' in streams:
@@ -233,7 +275,22 @@ with tab4:
         step=0.5
     )
     
-    segments_df = analyzer.analyze_segments(streams, segment_distance_km=segment_size)
+    custom_boundaries = st.text_input(
+        "Bornes personnalisées (km, séparées par des virgules)",
+        placeholder="ex: 12.5, 27, 41.3 (ravitaillements)",
+        help="Si renseigné, remplace le découpage régulier"
+    )
+    
+    boundaries_km = None
+    if custom_boundaries.strip():
+        try:
+            boundaries_km = [float(b) for b in re.split(r'[;,\s]+', custom_boundaries.strip()) if b]
+        except ValueError:
+            st.warning("Bornes invalides, découpage régulier utilisé")
+    
+    segments_df = analyzer.analyze_segments(
+        streams, segment_distance_km=segment_size, boundaries_km=boundaries_km
+    )
     
     if segments_df is not None and not segments_df.empty:
         st.write(f"**{len(segments_df)} segments analysés**")
@@ -293,6 +350,47 @@ with tab4:
     else:
         st.warning("Impossible d'analyser par segments")
 
+# TAB 5: Recherche de montées dans l'historique
+with tab5:
+    st.subheader("Recherche de montées")
+    st.caption(f"Parmi les {len(st.session_state.stream_cache)} activités dont les streams sont en cache "
+               "(préchargement depuis la page Charge d'entraînement)")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        climb_kind = st.radio("Type", ["montée", "descente"], horizontal=True)
+    
+    with col2:
+        min_climb_elevation = st.number_input("Dénivelé min. (m)", min_value=0, value=300, step=50)
+    
+    with col3:
+        years = sorted(df['start_date'].dt.year.unique(), reverse=True)
+        climb_year = st.selectbox("Année", ["Toutes"] + [str(year) for year in years])
+    
+    found_climbs = climb_store.search(
+        df,
+        kind=climb_kind,
+        min_elevation_m=min_climb_elevation,
+        start_date=f"{climb_year}-01-01" if climb_year != "Toutes" else None,
+        end_date=f"{int(climb_year) + 1}-01-01" if climb_year != "Toutes" else None
+    )
+    
+    if not found_climbs.empty:
+        st.write(f"**{len(found_climbs)} {climb_kind}(s) trouvée(s)**")
+        
+        display_found = found_climbs[[
+            'start_date', 'name', 'start_km', 'length_m', 'elevation_m',
+            'avg_grade_pct', 'max_grade_pct', 'vam_m_h'
+        ]].copy()
+        display_found['start_date'] = display_found['start_date'].dt.strftime('%Y-%m-%d')
+        display_found.columns = ['Date', 'Sortie', 'Début (km)', 'Longueur (m)', 'Dénivelé (m)',
+                                 'Pente moy. (%)', 'Pente max (%)', 'VAM (m/h)']
+        
+        st.dataframe(display_found.round(1), use_container_width=True, hide_index=True)
+    else:
+        st.info("Aucune montée ne correspond à ces critères")
+
 st.divider()
 
 # Comparaison avec sorties similaires
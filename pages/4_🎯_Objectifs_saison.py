@@ -8,6 +8,17 @@ import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
 import json
+import sys
+sys.path.append('..')
+
+from utils.training_load import (
+    TrainingLoadCalculator,
+    IncrementalLoadEngine,
+    build_plan_from_template,
+    add_training_load_metrics
+)
+from utils.rollups import get_shared_rollup, get_shared_index
+from utils.race_simulation import goal_terrain_seconds, get_simulation
 
 st.set_page_config(
     page_title="Objectifs de saison",
@@ -25,6 +36,8 @@ if 'df' not in st.session_state or st.session_state.df.empty:
     st.stop()
 
 df = st.session_state.df
+rollup = get_shared_rollup(st.session_state, df)
+activity_index = get_shared_index(st.session_state, df)
 
 st.header("🎯 Objectifs de saison")
 
@@ -38,25 +51,20 @@ def save_goals():
     # Plus tard : sauvegarder dans un fichier JSON ou BDD
     pass
 
-# Fonction pour calculer les statistiques depuis une date
-def get_stats_since_date(df, start_date):
-    """Calcule les stats depuis une date donnée"""
-    df_filtered = df[df['start_date'] >= start_date].copy()
-    
-    if df_filtered.empty:
-        return {
-            'total_km': 0,
-            'total_elevation': 0,
-            'total_time': 0,
-            'num_activities': 0
-        }
+# Fonction pour calculer les statistiques depuis plusieurs dates
+def get_stats_since_dates(activity_index, start_dates):
+    """Calcule les stats depuis chaque date donnée (une seule requête sur l'index)"""
+    sums = activity_index.window_sums(pd.to_datetime(start_dates))
     
-    return {
-        'total_km': df_filtered['distance_km'].sum(),
-        'total_elevation': df_filtered['elevation_gain_m'].sum(),
-        'total_time': df_filtered['duration_hours'].sum(),
-        'num_activities': len(df_filtered)
-    }
+    return [
+        {
+            'total_km': row['distance_km'],
+            'total_elevation': row['elevation_gain_m'],
+            'total_time': row['duration_hours'],
+            'num_activities': int(row['count'])
+        }
+        for _, row in sums.iterrows()
+    ]
 
 # Fonction pour calculer le temps estimé nécessaire
 def estimate_time_needed(distance_km, elevation_m, pace_min_km=6.5, elevation_penalty_min_per_100m=5):
@@ -84,6 +92,42 @@ def estimate_time_needed(distance_km, elevation_m, pace_min_km=6.5, elevation_pe
     
     return total_time_hours
 
+# État de charge actuel (ATL/CTL) pour l'optimisation de l'affûtage
+def get_current_load_state(df, settings):
+    """
+    Retourne le calculateur, le dernier état ATL/CTL et le TSS hebdo récent
+    
+    Le calcul passe par le moteur incrémental de la page Charge
+    d'entraînement : avec les mêmes réglages, son état est réutilisé tel quel.
+    
+    Args:
+        df: DataFrame des activités
+        settings: Réglages de charge (fc_max, fc_repos, gender, atl_days, ctl_days)
+    """
+    stream_cache = st.session_state.get('stream_cache')
+    calculator = TrainingLoadCalculator(
+        settings['fc_max'], settings['fc_repos'],
+        atl_days=settings['atl_days'], ctl_days=settings['ctl_days']
+    )
+    df_with_load = add_training_load_metrics(
+        df, settings['fc_max'], settings['fc_repos'], settings['gender'], stream_cache
+    )
+    
+    if 'load_engine' not in st.session_state:
+        st.session_state.load_engine = IncrementalLoadEngine()
+    
+    athlete_id = st.session_state.get('strava_id') or 'default'
+    load_df = st.session_state.load_engine.update(
+        athlete_id, df_with_load, calculator, 'tss', variant=settings['gender']
+    )
+    
+    return calculator, {
+        'last_date': load_df['date'].iloc[-1],
+        'atl': load_df['ATL'].iloc[-1],
+        'ctl': load_df['CTL'].iloc[-1],
+        'weekly_tss': load_df['daily_tss'].tail(28).sum() / 4
+    }
+
 # Section : Ajouter un objectif
 st.subheader("➕ Ajouter un objectif de course")
 
@@ -148,8 +192,11 @@ else:
     oldest_goal_date = goals_sorted[0]['date']
     season_start = oldest_goal_date - timedelta(days=180)  # 6 mois avant
     
-    # Stats globales de la saison
-    season_stats = get_stats_since_date(df, pd.Timestamp(season_start))
+    # Stats de la saison et depuis la création de chaque objectif, en une requête
+    season_stats, *goals_stats = get_stats_since_dates(
+        activity_index,
+        [pd.Timestamp(season_start)] + [pd.Timestamp(goal['created_at']) for goal in goals_sorted]
+    )
     
     # Métriques globales
     st.markdown("### 📊 Progression globale de la saison")
@@ -193,7 +240,7 @@ else:
         days_remaining = (goal_date - today).days
         
         # Calculer les stats depuis la création de l'objectif
-        stats_since_goal = get_stats_since_date(df, pd.Timestamp(goal['created_at']))
+        stats_since_goal = goals_stats[idx]
         
         # Carte de l'objectif
         with st.container():
@@ -278,21 +325,18 @@ else:
                 # Graphique d'évolution
                 st.markdown("#### 📊 Évolution de la préparation")
                 
-                # Filtrer les données depuis la création de l'objectif
-                df_goal = df[df['start_date'] >= pd.Timestamp(goal['created_at'])].copy()
-                df_goal = df_goal.sort_values('start_date')
+                # Cumuls journaliers depuis la création de l'objectif (agrégats partagés)
+                daily_goal = rollup.get(
+                    'day', start=pd.Timestamp(goal['created_at']).normalize(), fill=False
+                )
                 
-                if not df_goal.empty:
-                    # Calculer les cumuls
-                    df_goal['cumul_km'] = df_goal['distance_km'].cumsum()
-                    df_goal['cumul_elevation'] = df_goal['elevation_gain_m'].cumsum()
-                    
+                if not daily_goal.empty:
                     fig = go.Figure()
                     
                     # Distance cumulée
                     fig.add_trace(go.Scatter(
-                        x=df_goal['start_date'],
-                        y=df_goal['cumul_km'],
+                        x=daily_goal.index,
+                        y=daily_goal['distance_km'].cumsum(),
                         name='Distance (km)',
                         line=dict(color='#FC4C02', width=2),
                         fill='tozeroy'
@@ -343,6 +387,139 @@ else:
                             st.success("✅ Objectif D+ atteint !")
                 else:
                     st.warning("⏰ Moins d'une semaine avant la course - Phase de taper ! Repose-toi bien.")
+                
+                # Distribution du temps d'arrivée
+                with st.expander("🎲 Distribution du temps d'arrivée"):
+                    col_mc1, col_mc2 = st.columns(2)
+                    
+                    with col_mc1:
+                        variability_pct = st.slider(
+                            "Variabilité de l'allure (%)", 0, 20, 8, key=f"mc_sd_{goal['id']}"
+                        )
+                    
+                    with col_mc2:
+                        cutoff_h = st.number_input(
+                            "Barrière horaire (h, 0 = aucune)",
+                            min_value=0.0, max_value=200.0, value=0.0, step=0.5,
+                            key=f"mc_cutoff_{goal['id']}"
+                        )
+                    
+                    terrain_seconds, ends_km = goal_terrain_seconds(
+                        goal['distance_km'],
+                        goal['elevation_m'],
+                        goal.get('pace_estimation', 6.5),
+                        goal.get('elevation_penalty', 5.0)
+                    )
+                    
+                    # L'estimation de l'objectif inclut déjà la fatigue : dérive centrée sur 0
+                    simulation = get_simulation(
+                        st.session_state,
+                        terrain_seconds,
+                        ends_km,
+                        cutoffs_h=[cutoff_h] if cutoff_h > 0 else None,
+                        pace_sd=variability_pct / 100 / 2,
+                        terrain_sd=variability_pct / 100,
+                        fatigue_per_hour=0.0,
+                        fatigue_sd=0.005
+                    )
+                    finish = simulation['checkpoints'].iloc[-1]
+                    
+                    col_q1, col_q2, col_q3, col_q4 = st.columns(4)
+                    col_q1.metric("Rapide (P10)", f"{finish['p10_s'] / 3600:.1f}h")
+                    col_q2.metric("Médian (P50)", f"{finish['p50_s'] / 3600:.1f}h")
+                    col_q3.metric("Lent (P90)", f"{finish['p90_s'] / 3600:.1f}h")
+                    if cutoff_h > 0:
+                        col_q4.metric("Barrière manquée", f"{simulation['miss_probability'] * 100:.1f}%")
+                    
+                    st.caption("10 000 simulations (graine fixe) autour de l'estimation de l'objectif")
+                
+                # Optimisation de l'affûtage
+                with st.expander("🧪 Plan d'affûtage optimal"):
+                    tsb_band = st.slider(
+                        "TSB visé le jour de course",
+                        min_value=-10,
+                        max_value=40,
+                        value=(5, 25),
+                        key=f"tsb_band_{goal['id']}"
+                    )
+                    
+                    if st.button("🔍 Chercher le meilleur affûtage", key=f"taper_{goal['id']}"):
+                        # Recalcul seulement si les activités (ou les streams en cache) ont changé
+                        # Réglages de la page Charge d'entraînement (défauts sinon)
+                        load_settings = st.session_state.get('load_settings') or {
+                            'fc_max': 190, 'fc_repos': 50, 'gender': 'M',
+                            'atl_days': 7, 'ctl_days': 42
+                        }
+                        stream_cache = st.session_state.get('stream_cache')
+                        dataset_key = (
+                            len(df), df['start_date'].max(),
+                            stream_cache.version if stream_cache is not None else 0,
+                            tuple(sorted(load_settings.items()))
+                        )
+                        if st.session_state.get('load_state_key') != dataset_key:
+                            st.session_state.load_state = get_current_load_state(df, load_settings)
+                            st.session_state.load_state_key = dataset_key
+                        calculator, load_state = st.session_state.load_state
+                        
+                        plan_start = load_state['last_date'] + pd.Timedelta(days=1)
+                        n_plan_days = (goal_date - plan_start).days
+                        
+                        if n_plan_days <= 0:
+                            st.info("Pas de jours à planifier avant la course")
+                        else:
+                            base_tss = build_plan_from_template(
+                                n_plan_days, load_state['weekly_tss'], 'Maintien', start_date=plan_start
+                            )
+                            elapsed_days = (today - plan_start).days
+                            if elapsed_days > 0:
+                                base_tss[:elapsed_days] = 0
+                            
+                            with st.spinner("Recherche du meilleur plan..."):
+                                taper = calculator.optimize_taper(
+                                    load_state['atl'],
+                                    load_state['ctl'],
+                                    base_tss,
+                                    target_tsb=tsb_band,
+                                    time_budget_s=1.0
+                                )
+                            
+                            col_t1, col_t2, col_t3, col_t4 = st.columns(4)
+                            col_t1.metric("Durée d'affûtage", f"{taper['taper_days']} j")
+                            col_t2.metric("Réduction de volume", f"{taper['volume_reduction'] * 100:.0f}%")
+                            col_t3.metric("Intensité", f"×{taper['intensity']:.2f}")
+                            col_t4.metric("CTL / TSB jour J", f"{taper['race_ctl']:.1f} / {taper['race_tsb']:+.1f}")
+                            
+                            if not taper['in_band']:
+                                st.warning("⚠️ Aucun plan n'atteint la bande de TSB visée : voici le plus proche")
+                            
+                            projection = calculator.project_load(
+                                load_state['atl'], load_state['ctl'], taper['planned_tss'], plan_start
+                            )
+                            
+                            fig_taper = go.Figure()
+                            fig_taper.add_trace(go.Bar(
+                                x=projection['date'], y=projection['planned_tss'],
+                                name='TSS planifié', marker_color='lightgray'
+                            ))
+                            fig_taper.add_trace(go.Scatter(
+                                x=projection['date'], y=projection['CTL'],
+                                name='CTL', line=dict(color='#4ECDC4', width=2)
+                            ))
+                            fig_taper.add_trace(go.Scatter(
+                                x=projection['date'], y=projection['TSB'],
+                                name='TSB', line=dict(color='#FC4C02', width=2)
+                            ))
+                            fig_taper.add_hrect(
+                                y0=tsb_band[0], y1=tsb_band[1],
+                                fillcolor="green", opacity=0.1, line_width=0
+                            )
+                            fig_taper.update_layout(
+                                height=300,
+                                hovermode='x unified',
+                                legend=dict(orientation="h", yanchor="bottom", y=1.02)
+                            )
+                            st.plotly_chart(fig_taper, use_container_width=True)
+                            st.caption(f"{taper['n_evaluated']:,} plans évalués")
             
             # Actions
             col_action1, col_action2 = st.columns([1, 5])
@@ -4,10 +4,23 @@ Page de prédiction de performances
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+import re
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
-from utils.performance_prediction import PerformancePredictor, format_time, format_pace
+from utils.performance_prediction import (
+    PerformancePredictor, format_time, format_pace, course_content_hash, get_gpx_course,
+    get_gpx_courses, compare_courses
+)
+from utils.rollups import get_shared_index
+from utils.activity_analysis import ActivityAnalyzer
+from utils.stream_cache import StreamCache, ANALYSIS_STREAM_TYPES
+from utils.best_efforts import BestEffortStore
+from utils.pace_model import get_pace_model
+from utils.gap import cost_factor
+from utils.race_simulation import course_terrain_seconds, get_simulation
+from utils.vdot import VDOTTimeline
 
 st.set_page_config(
     page_title="Prédiction de performances",
@@ -197,9 +210,25 @@ with tab2:
             format_func=lambda x: {'beginner': '🔰 Débutant', 'intermediate': '🏃 Intermédiaire', 'advanced': '⚡ Avancé'}[x]
         )
         
+        # Modèle allure / pente appris sur les streams en cache
+        pace_model = get_pace_model(st.session_state, df)
+        personal_penalty = None
+        
+        if not pace_model.is_empty:
+            use_personal_model = st.checkbox(
+                "Utiliser mon modèle allure / pente",
+                value=True,
+                help="Pénalité apprise sur tes streams en cache (pente de 10%, sorties récentes pondérées)"
+            )
+            if use_personal_model:
+                personal_penalty = float(pace_model.climbing_penalty(0.10))
+        
         # Pénalité affichée
         penalties = {'beginner': 6.0, 'intermediate': 4.5, 'advanced': 3.0}
-        st.info(f"Pénalité utilisée : **{penalties[runner_level]} min / 100m D+**")
+        if personal_penalty is not None:
+            st.info(f"Pénalité personnelle utilisée : **{personal_penalty:.1f} min / 100m D+**")
+        else:
+            st.info(f"Pénalité utilisée : **{penalties[runner_level]} min / 100m D+**")
     
     with col2:
         if 'calculated_vdot' in st.session_state:
@@ -216,7 +245,8 @@ with tab2:
                 flat_time,
                 target_elevation_m,
                 target_distance_m,
-                runner_level
+                runner_level,
+                penalty_per_100m=personal_penalty
             )
             
             # Affichage
@@ -273,6 +303,49 @@ with tab2:
         )
         
         st.plotly_chart(fig, use_container_width=True)
+    
+    # Courbe personnelle allure / pente
+    if not pace_model.is_empty:
+        st.divider()
+        st.markdown("### 🧭 Mon profil allure / pente")
+        
+        curve = pace_model.to_frame()
+        curve = curve[curve['grade_pct'].abs() <= 30]
+        
+        fig = go.Figure()
+        
+        fig.add_trace(go.Scatter(
+            x=curve['grade_pct'],
+            y=curve['pace_min_km'],
+            mode='lines+markers',
+            name='Mon allure',
+            line=dict(color='#FC4C02', width=3),
+            customdata=np.stack([curve['hours'], curve['heartrate']], axis=-1),
+            hovertemplate='<b>Pente</b>: %{x:.0f}%<br><b>Allure</b>: %{y:.2f} min/km<br>'
+                          '<b>Temps observé</b>: %{customdata[0]:.1f} h<br>'
+                          '<b>FC moy.</b>: %{customdata[1]:.0f} bpm<extra></extra>'
+        ))
+        
+        # Référence : allure à plat corrigée par le coût énergétique (Minetti)
+        fig.add_trace(go.Scatter(
+            x=curve['grade_pct'],
+            y=1000 / 60 / (pace_model.flat_speed / cost_factor(curve['grade_pct'] / 100)),
+            mode='lines',
+            name='Référence énergétique (Minetti)',
+            line=dict(color='gray', dash='dash')
+        ))
+        
+        fig.update_layout(
+            xaxis_title="Pente (%)",
+            yaxis_title="Allure (min/km)",
+            yaxis=dict(autorange='reversed'),
+            height=400,
+            hovermode='x unified'
+        )
+        
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"Appris sur {pace_model.seconds.sum() / 3600:.0f} h de course pondérées "
+                   "(demi-vie 90 jours) à partir des streams en cache")
 
 # ===== TAB 3: Progression nécessaire =====
 with tab3:
@@ -465,29 +538,50 @@ with tab4:
     distribution des pentes, portions roulantes, montées/descentes techniques.
     """)
     
-    st.info("💡 **Comment faire :** Ouvre ton fichier GPX dans un éditeur de texte (Notepad, TextEdit, etc.), copie tout le contenu (Ctrl+A puis Ctrl+C) et colle-le ci-dessous")
+    st.info("💡 **Comment faire :** Importe ton fichier GPX ou TCX (éventuellement compressé en .gz), ou ouvre-le dans un éditeur de texte et colle son contenu ci-dessous")
+    
+    gpx_file = st.file_uploader(
+        "📂 Importer un fichier GPX / TCX",
+        type=['gpx', 'tcx', 'gz'],
+        help="Le fichier est lu au fil de l'eau : les gros tracés (100 km et plus) sont acceptés"
+    )
     
     gpx_content = st.text_area(
-        "📋 Colle le contenu de ton fichier GPX ici :",
+        "📋 … ou colle le contenu de ton fichier GPX ici :",
         height=250,
         placeholder='<?xml version="1.0"?>\n<gpx version="1.1" creator="Strava">\n  <trk>\n    <trkseg>\n      <trkpt lat="45.123" lon="6.456">\n        <ele>1234</ele>\n      </trkpt>\n      ...\n    </trkseg>\n  </trk>\n</gpx>',
-        help="Copie-colle le contenu entier de ton fichier .gpx"
+        help="Copie-colle le contenu entier de ton fichier .gpx",
+        disabled=gpx_file is not None
     )
     
-    if gpx_content and len(gpx_content) > 100:
+    if gpx_file is not None:
+        gpx_source = gpx_file
+    elif gpx_content and len(gpx_content) > 100:
+        gpx_source = gpx_content
+    else:
+        gpx_source = None
+    
+    if gpx_source is not None:
+        # Empreinte du contenu : un même parcours n'est lu et analysé qu'une fois
+        course_hash = course_content_hash(gpx_source)
+        
+        # Le parcours reste affiché après le clic pour pouvoir régler la prédiction
         if st.button("🔮 Analyser le parcours", type="primary"):
+            st.session_state.analyzed_gpx = course_hash
+        
+        if st.session_state.get('analyzed_gpx') == course_hash:
             with st.spinner("Analyse du parcours en cours..."):
                 try:
-                    # Parser le GPX
-                    gpx_data = predictor.parse_gpx_file(gpx_content)
+                    # Parser le GPX et analyser le profil (en cache)
+                    gpx_data, profile = get_gpx_course(
+                        st.session_state, gpx_source, predictor,
+                        resample_step_m=10, course_hash=course_hash
+                    )
                     
                     if 'error' in gpx_data:
                         st.error(f"❌ Erreur lors de la lecture du fichier : {gpx_data['error']}")
-                        st.info("💡 Assure-toi d'avoir copié l'intégralité du fichier GPX, depuis la première ligne jusqu'à la dernière")
+                        st.info("💡 Assure-toi d'avoir importé un fichier GPX/TCX valide, ou copié l'intégralité du fichier, depuis la première ligne jusqu'à la dernière")
                     else:
-                        # Analyser le profil
-                        profile = predictor.analyze_gpx_elevation_profile(gpx_data)
-                        
                         st.success("✅ Fichier GPX analysé avec succès !")
                         
                         # Métriques principales
@@ -523,85 +617,85 @@ with tab4:
                         
                         # Distribution des pentes
                         st.markdown("### 📈 Distribution des pentes")
-                
+                        
                         slope_dist = profile['slope_distribution']
-                
+                        
                         # Préparer les données pour le graphique
                         categories = []
                         percentages = []
                         colors = []
                         distances = []
-                
+                        
                         # D- très raide
                         if slope_dist['very_steep_downhill']['percent'] > 0:
                             categories.append('D- très raide\n(< -15%)')
                             percentages.append(slope_dist['very_steep_downhill']['percent'])
                             distances.append(slope_dist['very_steep_downhill']['distance_m'] / 1000)
                             colors.append('#8B0000')
-                
+                        
                         # D- raide
                         if slope_dist['steep_downhill']['percent'] > 0:
                             categories.append('D- raide\n(-15% à -10%)')
                             percentages.append(slope_dist['steep_downhill']['percent'])
                             distances.append(slope_dist['steep_downhill']['distance_m'] / 1000)
                             colors.append('#CD5C5C')
-                
+                        
                         # D- modérée
                         if slope_dist['moderate_downhill']['percent'] > 0:
                             categories.append('D- modérée\n(-10% à -6%)')
                             percentages.append(slope_dist['moderate_downhill']['percent'])
                             distances.append(slope_dist['moderate_downhill']['distance_m'] / 1000)
                             colors.append('#FFA07A')
-                
+                        
                         # D- légère
                         if slope_dist['gentle_downhill']['percent'] > 0:
                             categories.append('D- légère\n(-6% à -3%)')
                             percentages.append(slope_dist['gentle_downhill']['percent'])
                             distances.append(slope_dist['gentle_downhill']['distance_m'] / 1000)
                             colors.append('#FFB6C1')
-                
+                        
                         # Plat
                         if slope_dist['flat']['percent'] > 0:
                             categories.append('Plat\n(-3% à 3%)')
                             percentages.append(slope_dist['flat']['percent'])
                             distances.append(slope_dist['flat']['distance_m'] / 1000)
                             colors.append('#90EE90')
-                
+                        
                         # D+ légère
                         if slope_dist['gentle_uphill']['percent'] > 0:
                             categories.append('D+ légère\n(3% à 6%)')
                             percentages.append(slope_dist['gentle_uphill']['percent'])
                             distances.append(slope_dist['gentle_uphill']['distance_m'] / 1000)
                             colors.append('#98FB98')
-                
+                        
                         # D+ modérée
                         if slope_dist['moderate_uphill']['percent'] > 0:
                             categories.append('D+ modérée\n(6% à 10%)')
                             percentages.append(slope_dist['moderate_uphill']['percent'])
                             distances.append(slope_dist['moderate_uphill']['distance_m'] / 1000)
                             colors.append('#32CD32')
-                
+                        
                         # D+ raide
                         if slope_dist['steep_uphill']['percent'] > 0:
                             categories.append('D+ raide\n(10% à 15%)')
                             percentages.append(slope_dist['steep_uphill']['percent'])
                             distances.append(slope_dist['steep_uphill']['distance_m'] / 1000)
                             colors.append('#228B22')
-                
+                        
                         # D+ très raide
                         if slope_dist['very_steep_uphill']['percent'] > 0:
                             categories.append('D+ très raide\n(> 15%)')
                             percentages.append(slope_dist['very_steep_uphill']['percent'])
                             distances.append(slope_dist['very_steep_uphill']['distance_m'] / 1000)
                             colors.append('#006400')
-                
+                        
                         # Graphiques
                         col_g1, col_g2 = st.columns(2)
-                
+                        
                         with col_g1:
                             # Graphique en barres (pourcentages)
                             fig1 = go.Figure()
-                    
+                            
                             fig1.add_trace(go.Bar(
                                 x=categories,
                                 y=percentages,
@@ -609,7 +703,7 @@ with tab4:
                                 text=[f"{p:.1f}%" for p in percentages],
                                 textposition='outside'
                             ))
-                    
+                            
                             fig1.update_layout(
                                 title="Répartition par type de pente (%)",
                                 xaxis_title="Type de pente",
@@ -617,13 +711,13 @@ with tab4:
                                 height=400,
                                 showlegend=False
                             )
-                    
+                            
                             st.plotly_chart(fig1, use_container_width=True)
-                
+                        
                         with col_g2:
                             # Pie chart
                             fig2 = go.Figure()
-                    
+                            
                             fig2.add_trace(go.Pie(
                                 labels=categories,
                                 values=distances,
@@ -631,97 +725,265 @@ with tab4:
                                 textinfo='label+percent',
                                 hovertemplate='<b>%{label}</b><br>%{value:.1f} km<br>%{percent}<extra></extra>'
                             ))
-                    
+                            
                             fig2.update_layout(
                                 title="Répartition par distance (km)",
                                 height=400
                             )
-                    
+                            
                             st.plotly_chart(fig2, use_container_width=True)
-                
+                        
                         # Profil d'élévation
                         st.markdown("### ⛰️ Profil d'élévation")
-                
+                        
                         fig3 = go.Figure()
-                
+                        
                         fig3.add_trace(go.Scatter(
-                            x=[d/1000 for d in gpx_data['distance']],
+                            x=gpx_data['distance'] / 1000,
                             y=gpx_data['altitude'],
                             fill='tozeroy',
                             line=dict(color='#FC4C02', width=2),
                             name='Altitude'
                         ))
-                
+                        
                         fig3.update_layout(
                             xaxis_title="Distance (km)",
                             yaxis_title="Altitude (m)",
                             height=400,
                             hovermode='x unified'
                         )
-                
+                        
                         st.plotly_chart(fig3, use_container_width=True)
-                
+                        
                         # Analyse tactique
                         st.markdown("### 💡 Analyse tactique")
-                
+                        
                         col_t1, col_t2 = st.columns(2)
-                
+                        
                         with col_t1:
                             st.markdown("**🟢 Points forts du parcours :**")
-                    
+                            
                             flat_pct = slope_dist['flat']['percent']
                             gentle_down = slope_dist['gentle_downhill']['percent']
                             gentle_up = slope_dist['gentle_uphill']['percent']
-                    
+                            
                             if flat_pct > 30:
                                 st.markdown(f"- {flat_pct:.0f}% de portions roulantes (récupération possible)")
                             if gentle_down > 20:
                                 st.markdown(f"- {gentle_down:.0f}% de descentes légères (pour refaire du temps)")
                             if gentle_up < 15:
                                 st.markdown("- Peu de montées techniques")
-                
+                        
                         with col_t2:
                             st.markdown("**🔴 Difficultés du parcours :**")
-                    
+                            
                             steep_up = slope_dist['steep_uphill']['percent'] + slope_dist['very_steep_uphill']['percent']
                             steep_down = slope_dist['steep_downhill']['percent'] + slope_dist['very_steep_downhill']['percent']
-                    
+                            
                             if steep_up > 15:
                                 st.markdown(f"- {steep_up:.0f}% de montées raides/très raides")
                             if steep_down > 15:
                                 st.markdown(f"- {steep_down:.0f}% de descentes techniques")
                             if deniv_pct > 5:
                                 st.markdown(f"- D+ important : {deniv_pct:.1f}%")
-                
+                        
                         # Estimation du temps avec ce profil
                         if 'calculated_vdot' in st.session_state:
                             st.divider()
                             st.markdown("### ⏱️ Estimation de temps pour ce parcours")
-                    
+                            
                             vdot = st.session_state.calculated_vdot
                             distance_m = profile['total_distance_m']
                             elevation_m = profile['positive_elevation_m']
-                    
+                            
                             # Temps plat
                             flat_time = predictor._predict_time_for_distance(distance_m, vdot)
-                    
+                            
                             # Pour chaque niveau
                             levels = ['beginner', 'intermediate', 'advanced']
                             level_names = ['🔰 Débutant', '🏃 Intermédiaire', '⚡ Avancé']
-                    
+                            
                             cols = st.columns(3)
-                    
+                            
                             for idx, (level, level_name) in enumerate(zip(levels, level_names)):
                                 adjusted = predictor.adjust_time_for_elevation(
                                     flat_time, elevation_m, distance_m, level
                                 )
-        
+                                
                                 with cols[idx]:
                                     st.metric(
                                         level_name,
                                         format_time(adjusted),
                                         f"+{format_time(adjusted - flat_time)}"
                                     )
+                        
+                        # Prédiction point par point (pente de chaque pas + fatigue)
+                        course_model = get_pace_model(st.session_state, df)
+                        
+                        if not course_model.is_empty or 'calculated_vdot' in st.session_state:
+                            st.divider()
+                            st.markdown("### 🗺️ Temps de passage prédits")
+                            
+                            col_p1, col_p2 = st.columns(2)
+                            
+                            with col_p1:
+                                model_options = []
+                                if not course_model.is_empty:
+                                    model_options.append("Mon modèle allure / pente")
+                                if 'calculated_vdot' in st.session_state:
+                                    model_options.append("VDOT + coût énergétique (Minetti)")
+                                course_model_choice = st.radio("Modèle", model_options)
+                                
+                                fatigue_pct = st.slider(
+                                    "Dérive de fatigue (% d'allure par heure)",
+                                    min_value=0.0, max_value=5.0, value=1.0, step=0.5
+                                )
+                            
+                            with col_p2:
+                                checkpoints_input = st.text_input(
+                                    "Points de contrôle (km, séparés par des virgules)",
+                                    placeholder="ex: 8, 21.5, 31, 45 (ravitaillements)"
+                                )
+                            
+                            checkpoints_km = []
+                            if checkpoints_input.strip():
+                                try:
+                                    checkpoints_km = [float(c) for c in re.split(r'[;,\s]+', checkpoints_input.strip()) if c]
+                                except ValueError:
+                                    st.warning("Points de contrôle invalides, seule l'arrivée est affichée")
+                            
+                            if course_model_choice == "Mon modèle allure / pente":
+                                speed_model = {'pace_model': course_model}
+                            else:
+                                course_flat_time = predictor._predict_time_for_distance(
+                                    profile['total_distance_m'], st.session_state.calculated_vdot
+                                )
+                                speed_model = {'flat_speed_m_s': profile['total_distance_m'] / course_flat_time}
+                            
+                            course = predictor.predict_course_times(
+                                gpx_data, fatigue_per_hour=fatigue_pct / 100, **speed_model
+                            )
+                            
+                            splits = predictor.course_splits(course, checkpoints_km)
+                            
+                            st.metric("⏱️ Temps d'arrivée prédit", format_time(course['elapsed_s'].iloc[-1]))
+                            
+                            fig_course = go.Figure()
+                            fig_course.add_trace(go.Scatter(
+                                x=course['distance_km'],
+                                y=course['altitude_m'],
+                                fill='tozeroy',
+                                line=dict(color='#FC4C02', width=2),
+                                name='Altitude',
+                                customdata=[format_time(t) for t in course['elapsed_s']],
+                                hovertemplate='<b>%{x:.1f} km</b> - %{y:.0f} m<br>'
+                                              '<b>Passage</b>: %{customdata}<extra></extra>'
+                            ))
+                            for checkpoint in splits.itertuples():
+                                fig_course.add_vline(
+                                    x=checkpoint.checkpoint_km,
+                                    line_dash='dot',
+                                    annotation_text=format_time(checkpoint.elapsed_s)
+                                )
+                            fig_course.update_layout(
+                                xaxis_title="Distance (km)",
+                                yaxis_title="Altitude (m)",
+                                height=400
+                            )
+                            st.plotly_chart(fig_course, use_container_width=True)
+                            
+                            splits_display = pd.DataFrame({
+                                'Point (km)': splits['checkpoint_km'].round(1),
+                                'Passage': splits['elapsed_s'].apply(format_time),
+                                'Tronçon': splits['split_s'].apply(format_time),
+                                'D+ (m)': splits['elevation_gain_m'].round(0),
+                                'D- (m)': splits['elevation_loss_m'].round(0),
+                                'Allure': splits['pace_s_km'].apply(format_pace)
+                            })
+                            st.dataframe(splits_display, use_container_width=True, hide_index=True)
+                            
+                            # Distribution des temps (Monte Carlo)
+                            with st.expander("🎲 Distribution des temps d'arrivée (Monte Carlo)"):
+                                col_mc1, col_mc2 = st.columns(2)
+                                
+                                with col_mc1:
+                                    pace_sd_pct = st.slider("Variabilité de la forme (%)", 0, 20, 5)
+                                    terrain_sd_pct = st.slider("Variabilité par type de terrain (%)", 0, 20, 8)
+                                    aid_minutes = st.slider("Arrêt moyen par ravitaillement (min)", 0, 30, 5)
+                                
+                                with col_mc2:
+                                    cutoffs_input = st.text_input(
+                                        "Barrières horaires (h, une par point de contrôle puis l'arrivée)",
+                                        placeholder="ex: 4, 9.5, -, 20 (- : pas de barrière)"
+                                    )
+                                    n_simulations = st.select_slider(
+                                        "Nombre de simulations", options=[1000, 5000, 10000, 20000, 50000], value=10000
+                                    )
+                                
+                                cutoffs_h = None
+                                if cutoffs_input.strip():
+                                    try:
+                                        cutoffs_h = [
+                                            None if c == '-' else float(c)
+                                            for c in re.split(r'[;,\s]+', cutoffs_input.strip()) if c
+                                        ]
+                                    except ValueError:
+                                        st.warning("Barrières invalides, ignorées")
+                                
+                                base_course = predictor.predict_course_times(gpx_data, fatigue_per_hour=0, **speed_model)
+                                terrain_seconds, ends_km = course_terrain_seconds(base_course, checkpoints_km)
+                                
+                                simulation = get_simulation(
+                                    st.session_state,
+                                    terrain_seconds,
+                                    ends_km,
+                                    cutoffs_h=cutoffs_h,
+                                    n_simulations=n_simulations,
+                                    pace_sd=pace_sd_pct / 100,
+                                    terrain_sd=terrain_sd_pct / 100,
+                                    fatigue_per_hour=fatigue_pct / 100,
+                                    aid_minutes=float(aid_minutes)
+                                )
+                                finish = simulation['checkpoints'].iloc[-1]
+                                
+                                col_q1, col_q2, col_q3, col_q4 = st.columns(4)
+                                col_q1.metric("Rapide (P10)", format_time(finish['p10_s']))
+                                col_q2.metric("Médian (P50)", format_time(finish['p50_s']))
+                                col_q3.metric("Lent (P90)", format_time(finish['p90_s']))
+                                if np.isfinite(simulation['miss_probability']):
+                                    col_q4.metric("Barrière manquée", f"{simulation['miss_probability'] * 100:.1f}%")
+                                
+                                fig_mc = go.Figure()
+                                fig_mc.add_trace(go.Histogram(
+                                    x=simulation['arrivals'] / 3600,
+                                    nbinsx=60,
+                                    marker_color='#FC4C02'
+                                ))
+                                if cutoffs_h and len(cutoffs_h) >= len(ends_km) and cutoffs_h[len(ends_km) - 1] is not None:
+                                    fig_mc.add_vline(
+                                        x=cutoffs_h[len(ends_km) - 1],
+                                        line_dash='dash',
+                                        line_color='red',
+                                        annotation_text="Barrière arrivée"
+                                    )
+                                fig_mc.update_layout(
+                                    xaxis_title="Temps d'arrivée (h)",
+                                    yaxis_title="Simulations",
+                                    height=350,
+                                    showlegend=False
+                                )
+                                st.plotly_chart(fig_mc, use_container_width=True)
+                                
+                                if len(ends_km) > 1:
+                                    checkpoints_mc = simulation['checkpoints']
+                                    st.dataframe(pd.DataFrame({
+                                        'Point (km)': checkpoints_mc['checkpoint_km'].round(1),
+                                        'P10': checkpoints_mc['p10_s'].apply(format_time),
+                                        'P50': checkpoints_mc['p50_s'].apply(format_time),
+                                        'P90': checkpoints_mc['p90_s'].apply(format_time),
+                                        'Barrière manquée (%)': (checkpoints_mc['miss_probability'] * 100).round(1)
+                                    }), use_container_width=True, hide_index=True)
+                        
                         st.divider()
                         
                         # NOUVELLE SECTION : Analyse de compatibilité
@@ -735,17 +997,18 @@ with tab4:
                         if 'df' in st.session_state and not st.session_state.df.empty:
                             df_training = st.session_state.df
                             
-                            # Stats des 8 dernières semaines
+                            # Stats des 8 dernières semaines (index à sommes cumulées)
+                            activity_index = get_shared_index(st.session_state, df_training)
                             cutoff_date = pd.Timestamp.now() - pd.Timedelta(weeks=8)
-                            df_recent = df_training[df_training['start_date'] >= cutoff_date]
+                            recent = activity_index.window_sums(cutoff_date).iloc[0]
                             
-                            if not df_recent.empty:
+                            if recent['count'] > 0:
                                 # Calculer les stats
-                                avg_distance_weekly = df_recent['distance_km'].sum() / 8
-                                avg_elevation_weekly = df_recent['elevation_gain_m'].sum() / 8
-                                max_distance = df_recent['distance_km'].max()
-                                max_elevation = df_recent['elevation_gain_m'].max()
-                                avg_deniv_percent = df_recent['deniv_percent'].mean()
+                                avg_distance_weekly = recent['distance_km'] / 8
+                                avg_elevation_weekly = recent['elevation_gain_m'] / 8
+                                max_distance = activity_index.window_max('distance_km', cutoff_date)
+                                max_elevation = activity_index.window_max('elevation_gain_m', cutoff_date)
+                                avg_deniv_percent = activity_index.window_means(cutoff_date)['deniv_percent'].iloc[0]
                                 
                                 # Distance de la course
                                 race_distance_km = distance_m / 1000
@@ -856,7 +1119,7 @@ with tab4:
                                     "⏰ Préparation minimale suggérée",
                                     f"{weeks_needed} semaines"
                                 )
-                                
+                            
                             else:
                                 st.info("📊 Pas assez de données récentes (8 dernières semaines)")
                         else:
@@ -865,6 +1128,89 @@ with tab4:
                 except Exception as e:
                     st.error(f"❌ Erreur lors de l'analyse : {str(e)}")
                     st.info("💡 Vérifie que le contenu GPX est complet et valide")
+    
+    # Comparaison de plusieurs courses candidates
+    st.divider()
+    st.markdown("### 🆚 Comparer plusieurs parcours")
+    st.caption("Importe les GPX/TCX des courses envisagées pour ta saison : ils sont analysés en parallèle, "
+               "et ajouter une course ne relit que celle-ci.")
+    
+    compare_files = st.file_uploader(
+        "📂 Parcours à comparer",
+        type=['gpx', 'tcx', 'gz'],
+        accept_multiple_files=True,
+        key='compare_gpx_files'
+    )
+    
+    if len(compare_files) >= 2:
+        compare_sources = {}
+        for uploaded in compare_files:
+            name = uploaded.name.split('.')[0]
+            compare_sources[name if name not in compare_sources else uploaded.name] = uploaded
+        
+        with st.spinner(f"Analyse de {len(compare_sources)} parcours..."):
+            compared = get_gpx_courses(st.session_state, compare_sources, predictor, resample_step_m=10)
+        
+        unreadable = [name for name, (gpx_data, _) in compared.items() if 'error' in gpx_data]
+        if unreadable:
+            st.warning(f"⚠️ Fichiers illisibles ignorés : {', '.join(unreadable)}")
+        
+        compare_model = get_pace_model(st.session_state, df)
+        comparison = compare_courses(
+            compared, predictor,
+            pace_model=None if compare_model.is_empty else compare_model,
+            vdot=st.session_state.get('calculated_vdot'),
+            fatigue_per_hour=0.01
+        )
+        
+        if not comparison.empty:
+            table = pd.DataFrame({
+                'Course': comparison['name'],
+                'Distance': comparison['distance_km'].map(lambda d: f"{d:.1f} km"),
+                'D+': comparison['elevation_gain_m'].map(lambda d: f"{d:.0f} m"),
+                'D-': comparison['elevation_loss_m'].map(lambda d: f"{d:.0f} m"),
+                'D+/km': comparison['gain_per_km'].map(lambda d: f"{d:.0f} m"),
+                'Alt. max': comparison['altitude_max_m'].map(lambda d: f"{d:.0f} m"),
+                'Plat': comparison['flat_pct'].map(lambda p: f"{p:.0f}%"),
+                'Montée': comparison['uphill_pct'].map(lambda p: f"{p:.0f}%"),
+                'Descente': comparison['downhill_pct'].map(lambda p: f"{p:.0f}%"),
+                'Pentes > 10%': comparison['steep_pct'].map(lambda p: f"{p:.0f}%"),
+                'Temps prédit': comparison['predicted_s'].map(lambda t: format_time(t) if pd.notna(t) else "—")
+            })
+            
+            st.dataframe(table, use_container_width=True, hide_index=True)
+            
+            if comparison['predicted_s'].isna().all():
+                st.caption("💡 Calcule ton VDOT ou télécharge des streams pour obtenir les temps prédits")
+            else:
+                st.caption("Temps prédits avec une dérive de fatigue de 1%/h, "
+                           + ("selon ton modèle allure / pente" if not compare_model.is_empty
+                              else "selon ton VDOT et le coût énergétique de la pente"))
+            
+            # Profils superposés
+            fig_compare = go.Figure()
+            for name in comparison['name']:
+                gpx_data = compared[name][0]
+                stride = max(1, len(gpx_data['distance']) // 2000)  # ~2000 points par tracé suffisent
+                fig_compare.add_trace(go.Scatter(
+                    x=gpx_data['distance'][::stride] / 1000,
+                    y=gpx_data['altitude'][::stride],
+                    mode='lines',
+                    name=name,
+                    hovertemplate=f'<b>{name}</b><br>%{{x:.1f}} km - %{{y:.0f}} m<extra></extra>'
+                ))
+            
+            fig_compare.update_layout(
+                title="Profils d'élévation",
+                xaxis_title="Distance (km)",
+                yaxis_title="Altitude (m)",
+                height=450,
+                hovermode='closest'
+            )
+            
+            st.plotly_chart(fig_compare, use_container_width=True)
+    elif compare_files:
+        st.info("Ajoute au moins un deuxième parcours pour lancer la comparaison")
 
 # ===== TAB 5: Mes performances =====
 with tab5:
@@ -872,6 +1218,196 @@ with tab5:
     
     st.markdown("Analyse automatique de tes meilleures performances Strava")
     
+    # Meilleurs efforts extraits des streams (y compris à l'intérieur d'une sortie plus longue)
+    if 'stream_cache' not in st.session_state:
+        st.session_state.stream_cache = StreamCache()
+    if 'best_effort_store' not in st.session_state:
+        st.session_state.best_effort_store = BestEffortStore()
+    
+    stream_cache = st.session_state.stream_cache
+    best_effort_store = st.session_state.best_effort_store
+    
+    runs = df.sort_values('start_date', ascending=False)
+    runs_missing = [
+        int(activity_id) for activity_id in runs['id']
+        if pd.notna(activity_id) and stream_cache.get(activity_id, ANALYSIS_STREAM_TYPES) is None
+    ] if 'id' in runs.columns else []
+    
+    col_info, col_button = st.columns([3, 1])
+    
+    with col_info:
+        st.caption(
+            f"⚡ Streams analysés : {len(runs) - len(runs_missing)}/{len(runs)} sorties. "
+            "Les records ci-dessous incluent les efforts réalisés au sein de sorties plus longues."
+        )
+    
+    with col_button:
+        if runs_missing and st.button(f"Télécharger {min(len(runs_missing), 50)} sorties"):
+            analyzer = ActivityAnalyzer(st.session_state.access_token, stream_cache)
+            progress = st.progress(0.0)
+            analyzer.prefetch_streams(
+                runs_missing, stream_types=ANALYSIS_STREAM_TYPES, progress_callback=progress.progress
+            )
+            st.rerun()
+    
+    best_effort_store.sync(stream_cache)
+    
+    if not best_effort_store.efforts.empty:
+        st.markdown("### ⚡ Meilleurs efforts")
+        
+        effort_period = st.radio(
+            "Période",
+            ["Tout", "12 derniers mois", "90 derniers jours"],
+            horizontal=True
+        )
+        effort_since = {
+            "Tout": None,
+            "12 derniers mois": pd.Timestamp.now() - pd.Timedelta(days=365),
+            "90 derniers jours": pd.Timestamp.now() - pd.Timedelta(days=90)
+        }[effort_period]
+        
+        effort_records = best_effort_store.personal_records(df, since=effort_since)
+        climb_records = best_effort_store.climb_records(df, since=effort_since)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if not effort_records.empty:
+                st.dataframe(pd.DataFrame({
+                    'Distance': effort_records['effort'],
+                    'Temps': effort_records['seconds'].apply(format_time),
+                    'Allure': effort_records['pace_s_km'].apply(format_pace),
+                    'Date': effort_records['start_date'].dt.strftime('%d/%m/%Y'),
+                    'Sortie': effort_records['name']
+                }), use_container_width=True, hide_index=True)
+        
+        with col2:
+            if not climb_records.empty:
+                st.dataframe(pd.DataFrame({
+                    'Fenêtre': climb_records['window_min'].astype(int).astype(str) + ' min',
+                    'D+': climb_records['elevation_gain_m'].round(0).astype(int).astype(str) + ' m',
+                    'Vitesse ascensionnelle': climb_records['vertical_speed_m_h'].round(0).astype(int).astype(str) + ' m/h',
+                    'Date': climb_records['start_date'].dt.strftime('%d/%m/%Y'),
+                    'Sortie': climb_records['name']
+                }), use_container_width=True, hide_index=True)
+        
+        # Courbe allure-durée personnelle (vitesse critique / D' et Riegel)
+        period_efforts = best_effort_store.dated_efforts(df, since=effort_since)
+        curve = predictor.fit_pace_duration_curve(period_efforts)
+        
+        if curve is not None:
+            st.markdown("### 📈 Courbe allure-durée personnelle")
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                if np.isfinite(curve['cs_m_s']):
+                    st.metric(
+                        "Vitesse critique",
+                        format_pace(1000 / curve['cs_m_s']),
+                        help="Allure soutenable ~30-40 min (modèle distance = CS × t + D')"
+                    )
+                else:
+                    st.metric("Vitesse critique", "N/A", help="Il faut au moins 2 efforts de 2 à 40 min")
+            
+            with col2:
+                st.metric(
+                    "D'",
+                    f"{curve['d_prime_m']:.0f} m" if np.isfinite(curve['d_prime_m']) else "N/A",
+                    help="Réserve anaérobie : distance courable au-dessus de la vitesse critique"
+                )
+            
+            with col3:
+                st.metric(
+                    "Exposant de Riegel",
+                    f"{curve['riegel_b']:.3f}" if np.isfinite(curve['riegel_b']) else "N/A",
+                    help="temps = a × distance^b ; 1.06 = valeur standard, plus élevé = moins endurant"
+                )
+            
+            best_by_distance = period_efforts.loc[period_efforts.groupby('distance_m')['seconds'].idxmin()]
+            curve_durations = np.geomspace(60, 6 * 3600, 120)
+            
+            fig_curve = go.Figure()
+            
+            fig_curve.add_trace(go.Scatter(
+                x=best_by_distance['seconds'] / 60,
+                y=best_by_distance['seconds'] / (best_by_distance['distance_m'] / 1000) / 60,
+                mode='markers+text',
+                name='Meilleurs efforts',
+                text=best_by_distance['effort'],
+                textposition='top center',
+                marker=dict(color='#FC4C02', size=10)
+            ))
+            
+            if np.isfinite(curve['riegel_b']):
+                # Riegel : t = a d^b  →  d = (t / a)^(1/b)
+                riegel_distance = (curve_durations / curve['riegel_a']) ** (1 / curve['riegel_b'])
+                fig_curve.add_trace(go.Scatter(
+                    x=curve_durations / 60,
+                    y=curve_durations / (riegel_distance / 1000) / 60,
+                    mode='lines',
+                    name='Riegel',
+                    line=dict(color='#00A8E8', width=2)
+                ))
+            
+            if np.isfinite(curve['cs_m_s']):
+                cs_durations = curve_durations[curve_durations <= predictor.CS_DURATION_RANGE_S[1]]
+                cs_distance = curve['cs_m_s'] * cs_durations + curve['d_prime_m']
+                fig_curve.add_trace(go.Scatter(
+                    x=cs_durations / 60,
+                    y=cs_durations / (cs_distance / 1000) / 60,
+                    mode='lines',
+                    name="Vitesse critique / D'",
+                    line=dict(color='green', width=2, dash='dash')
+                ))
+            
+            fig_curve.update_layout(
+                xaxis=dict(title="Durée (min)", type='log'),
+                yaxis=dict(title="Allure (min/km)", autorange='reversed'),
+                height=400,
+                hovermode='closest'
+            )
+            
+            st.plotly_chart(fig_curve, use_container_width=True)
+            
+            curve_predictions = predictor.predict_times_from_curve(curve)
+            st.dataframe(pd.DataFrame([
+                {
+                    'Distance': name,
+                    'Temps prédit': format_time(seconds),
+                    'Allure': format_pace(seconds / (predictor.PREDICTION_DISTANCES[name] / 1000))
+                }
+                for name, seconds in curve_predictions.items()
+            ]), use_container_width=True, hide_index=True)
+            
+            # Évolution de la vitesse critique sur 52 semaines (fenêtres de 90 jours)
+            all_efforts = best_effort_store.dated_efforts(df)
+            window_ends = pd.date_range(end=pd.Timestamp.now().normalize(), periods=52, freq='7D')
+            rolling_curve = predictor.fit_pace_duration_curve_rolling(all_efforts, window_ends, window_days=90)
+            rolling_curve = rolling_curve[np.isfinite(rolling_curve['cs_m_s'])]
+            
+            if len(rolling_curve) > 1:
+                fig_cs = go.Figure()
+                fig_cs.add_trace(go.Scatter(
+                    x=rolling_curve['window_end'],
+                    y=1000 / rolling_curve['cs_m_s'] / 60,
+                    mode='lines+markers',
+                    name='Allure critique',
+                    line=dict(color='green', width=2)
+                ))
+                fig_cs.update_layout(
+                    title="Allure critique (fenêtres glissantes de 90 jours)",
+                    xaxis_title="Date",
+                    yaxis=dict(title="Allure (min/km)", autorange='reversed'),
+                    height=300
+                )
+                st.plotly_chart(fig_cs, use_container_width=True)
+    
+    all_time_efforts = (
+        best_effort_store.personal_records(df).set_index('effort')
+        if not best_effort_store.efforts.empty else pd.DataFrame()
+    )
+    
     # Filtrer les courses "importantes" (> 5km)
     df_races = df[df['distance_km'] >= 5].copy()
     df_races = df_races.sort_values('start_date', ascending=False)
@@ -891,6 +1427,7 @@ with tab5:
         
         # Pour chaque catégorie, trouver le meilleur temps
         records = []
+        record_performances = []  # (distance m, temps s) de chaque record, pour le VDOT
         
         for cat_name, (min_km, max_km) in categories.items():
             cat_races = df_races[
@@ -898,9 +1435,25 @@ with tab5:
                 (df_races['distance_km'] < max_km)
             ]
             
-            if not cat_races.empty:
-                best_race = cat_races.loc[cat_races['duration_hours'].idxmin()]
-                
+            best_race = cat_races.loc[cat_races['duration_hours'].idxmin()] if not cat_races.empty else None
+            
+            # Un meilleur effort extrait d'une sortie plus longue peut battre la sortie complète
+            if cat_name in all_time_efforts.index:
+                effort = all_time_efforts.loc[cat_name]
+                if best_race is None or effort['seconds'] < best_race['duration_hours'] * 3600:
+                    record_performances.append((effort['distance_m'], effort['seconds']))
+                    records.append({
+                        'Catégorie': cat_name,
+                        'Distance': f"{effort['distance_m'] / 1000:.2f} km",
+                        'Temps': format_time(effort['seconds']),
+                        'Allure': format_pace(effort['pace_s_km']),
+                        'Date': effort['start_date'].strftime('%d/%m/%Y'),
+                        'Nom': f"{effort['name']} (meilleur effort)"
+                    })
+                    continue
+            
+            if best_race is not None:
+                record_performances.append((best_race['distance_km'] * 1000, best_race['duration_hours'] * 3600))
                 records.append({
                     'Catégorie': cat_name,
                     'Distance': f"{best_race['distance_km']:.2f} km",
@@ -917,28 +1470,12 @@ with tab5:
             # Calculer VDOT moyen de ces performances
             st.markdown("### 📊 Analyse VDOT")
             
-            vdots = []
-            for record in records:
-                # Extraire distance et temps
-                dist_km = float(record['Distance'].split()[0])
-                time_str = record['Temps']
-                
-                # Parser le temps
-                if 'h' in time_str:
-                    parts = time_str.replace('h', ':').replace("'", ':').replace('"', '').split(':')
-                    time_sec = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                else:
-                    parts = time_str.replace("'", ':').replace('"', '').split(':')
-                    time_sec = int(parts[0]) * 60 + int(parts[1])
-                
-                vdot = predictor.calculate_vdot_from_race(dist_km * 1000, time_sec)
-                vdots.append({
-                    'distance': record['Catégorie'],
-                    'vdot': vdot,
-                    'date': record['Date']
-                })
-            
-            df_vdots = pd.DataFrame(vdots)
+            record_distances, record_times = np.array(record_performances).T
+            df_vdots = pd.DataFrame({
+                'distance': [record['Catégorie'] for record in records],
+                'vdot': predictor.calculate_vdots(record_distances, record_times),
+                'date': [record['Date'] for record in records]
+            })
             avg_vdot = df_vdots['vdot'].mean()
             
             col1, col2 = st.columns(2)
@@ -977,6 +1514,67 @@ with tab5:
             st.info("Aucune course significative trouvée dans ton historique")
     else:
         st.info("Aucune activité de plus de 5 km trouvée")
+    
+    # Évolution du VDOT : toutes les sorties roulantes et tous les meilleurs efforts
+    if 'vdot_timeline' not in st.session_state:
+        st.session_state.vdot_timeline = VDOTTimeline()
+    
+    vdot_timeline = st.session_state.vdot_timeline
+    vdot_timeline.update(df, best_effort_store)
+    
+    if not vdot_timeline.efforts.empty:
+        st.markdown("### 📈 Évolution du VDOT")
+        
+        col_v1, col_v2, col_v3 = st.columns(3)
+        
+        with col_v1:
+            vdot_freq = st.radio("Période", ["Semaine", "Mois"], horizontal=True, key='vdot_freq')
+        
+        with col_v2:
+            vdot_window = st.select_slider("Fenêtre glissante (jours)", options=[30, 60, 90, 180], value=90)
+        
+        with col_v3:
+            vdot_statistic = st.radio("Statistique", ["Maximum", "90e percentile"], horizontal=True)
+        
+        vdot_trend = vdot_timeline.trend(
+            df,
+            freq='W' if vdot_freq == "Semaine" else 'M',
+            window_days=vdot_window,
+            percentile=100 if vdot_statistic == "Maximum" else 90
+        )
+        
+        if len(vdot_trend) > 1:
+            fig_vdot = go.Figure()
+            
+            fig_vdot.add_trace(go.Scatter(
+                x=vdot_trend.index,
+                y=vdot_trend['vdot_best'],
+                mode='markers',
+                name='Meilleur VDOT de la période',
+                marker=dict(color='#FC4C02', size=7, opacity=0.6),
+                customdata=vdot_trend['count'],
+                hovertemplate='%{x|%d/%m/%Y}<br>VDOT %{y:.1f} (%{customdata} efforts)<extra></extra>'
+            ))
+            
+            fig_vdot.add_trace(go.Scatter(
+                x=vdot_trend.index,
+                y=vdot_trend['vdot_trend'],
+                mode='lines',
+                name=f"VDOT glissant ({vdot_window} j)",
+                line=dict(color='green', width=3, shape='hv')
+            ))
+            
+            fig_vdot.update_layout(
+                xaxis_title="Date",
+                yaxis_title="VDOT",
+                height=350,
+                hovermode='x unified'
+            )
+            
+            st.plotly_chart(fig_vdot, use_container_width=True)
+            
+            st.caption(f"Calculé sur {len(vdot_timeline.efforts)} efforts : sorties roulantes "
+                       f"(D+ ≤ {vdot_timeline.max_deniv_percent:.0f}%) et meilleurs efforts extraits des streams.")
 
 # Footer
 st.divider()
@@ -1,10 +1,15 @@
 # Utils package
-from .training_load import TrainingLoadCalculator, add_training_load_metrics
+from .training_load import TrainingLoadCalculator, IncrementalLoadEngine, add_training_load_metrics
 from .activity_analysis import ActivityAnalyzer, get_similar_activities
+from .banister_model import BanisterModel
+from .team_load import TeamLoadEngine
 
 __all__ = [
     'TrainingLoadCalculator',
+    'IncrementalLoadEngine',
     'add_training_load_metrics',
     'ActivityAnalyzer',
-    'get_similar_activities'
+    'get_similar_activities',
+    'BanisterModel',
+    'TeamLoadEngine'
 ]
@@ -13,13 +13,22 @@ import plotly.express as px
 from datetime import datetime
 import requests
 
+from .gap import gap_stream, speed_to_pace
+
 
 class ActivityAnalyzer:
     """Analyse détaillée d'une activité"""
     
-    def __init__(self, access_token):
+    def __init__(self, access_token, stream_cache=None):
+        """
+        Args:
+            access_token: Token d'accès Strava
+            stream_cache: Instance de StreamCache (optionnel) pour éviter
+                          de retélécharger les streams déjà récupérés
+        """
         self.access_token = access_token
         self.base_url = "https://www.strava.com/api/v3"
+        self.stream_cache = stream_cache
     
     def get_activity_streams(self, activity_id, stream_types=None):
         """
@@ -38,6 +47,11 @@ class ActivityAnalyzer:
             stream_types = ['time', 'latlng', 'distance', 'altitude', 
                            'velocity_smooth', 'heartrate']
         
+        if self.stream_cache is not None:
+            cached = self.stream_cache.get(activity_id, stream_types)
+            if cached is not None:
+                return cached
+        
         url = f"{self.base_url}/activities/{activity_id}/streams"
         headers = {"Authorization": f"Bearer {self.access_token}"}
         params = {
@@ -48,18 +62,55 @@ class ActivityAnalyzer:
         try:
             response = requests.get(url, headers=headers, params=params, timeout=10)
             response.raise_for_status()
-            return response.json()
+            streams = response.json()
         except Exception as e:
             print(f"Erreur récupération streams: {e}")
             return None
+        
+        if self.stream_cache is not None:
+            self.stream_cache.put(activity_id, streams, requested_types=stream_types)
+            return self.stream_cache.get(activity_id)
+        
+        return streams
+    
+    def prefetch_streams(self, activity_ids, stream_types=None, max_activities=50, progress_callback=None):
+        """
+        Télécharge dans le cache les streams des activités qui n'y sont pas encore
+        
+        Args:
+            activity_ids: IDs des activités (par ordre de priorité)
+            stream_types: Types de streams à récupérer
+            max_activities: Nombre maximal de requêtes (quota de l'API Strava)
+            progress_callback: Fonction appelée avec la fraction effectuée (optionnel)
+        
+        Returns:
+            Nombre d'activités téléchargées
+        """
+        if self.stream_cache is None:
+            return 0
+        
+        missing = [
+            int(activity_id) for activity_id in activity_ids
+            if self.stream_cache.get(activity_id, stream_types) is None
+        ][:max_activities]
+        
+        fetched = 0
+        for i, activity_id in enumerate(missing):
+            if self.get_activity_streams(activity_id, stream_types=stream_types) is not None:
+                fetched += 1
+            if progress_callback:
+                progress_callback((i + 1) / len(missing))
+        
+        return fetched
     
-    def create_elevation_profile(self, streams, activity_info=None):
+    def create_elevation_profile(self, streams, activity_info=None, climbs=None):
         """
         Crée un profil d'élévation interactif
         
         Args:
             streams: Données streams de l'activité
             activity_info: Infos générales de l'activité (optionnel)
+            climbs: Montées/descentes détectées (voir utils.climbs.detect_climbs, optionnel)
         
         Returns:
             Figure Plotly
@@ -113,6 +164,19 @@ class ActivityAnalyzer:
             text=gradient[gradient > 8]
         ))
         
+        # Montées et descentes détectées
+        if climbs is not None:
+            for climb in climbs.itertuples():
+                fig.add_vrect(
+                    x0=climb.start_km,
+                    x1=climb.end_km,
+                    fillcolor='red' if climb.elevation_m > 0 else 'blue',
+                    opacity=0.08,
+                    line_width=0,
+                    annotation_text=f"{climb.elevation_m:+.0f} m",
+                    annotation_position='top left'
+                )
+        
         title = "Profil d'élévation"
         if activity_info:
             title += f" - {activity_info.get('name', '')}"
@@ -163,6 +227,26 @@ class ActivityAnalyzer:
                 hovertemplate='<b>Allure</b>: %{y:.2f} min/km<extra></extra>'
             ))
         
+        # Allure ajustée à la pente (GAP)
+        if 'time' in streams and 'altitude' in streams:
+            gap_speed = gap_stream(
+                streams['time']['data'],
+                streams['distance']['data'],
+                streams['altitude']['data'],
+                velocity=streams['velocity_smooth']['data'] if 'velocity_smooth' in streams else None
+            )
+            gap_pace = np.clip(np.nan_to_num(speed_to_pace(gap_speed)), 0, 20)
+            
+            fig.add_trace(go.Scatter(
+                x=distance_km[:len(gap_pace)],
+                y=gap_pace,
+                mode='lines',
+                name='GAP (allure ajustée)',
+                line=dict(color='#2E7D32', width=1.5, dash='dot'),
+                yaxis='y',
+                hovertemplate='<b>GAP</b>: %{y:.2f} min/km<extra></extra>'
+            ))
+        
         # Fréquence cardiaque
         if 'heartrate' in streams:
             hr = np.array(streams['heartrate']['data'])
@@ -315,13 +399,19 @@ class ActivityAnalyzer:
         
         return fig
     
-    def analyze_segments(self, streams, segment_distance_km=1.0):
+    def analyze_segments(self, streams, segment_distance_km=1.0, boundaries_km=None):
         """
-        Analyse l'activité par segments (ex: tous les 1 km)
+        Analyse l'activité par segments (ex: tous les 1 km, ou entre ravitaillements)
+        
+        Les bornes des segments sont placées sur le stream de distance avec
+        np.searchsorted, puis toutes les statistiques sont calculées en une
+        passe avec np.add.reduceat / np.maximum.reduceat.
         
         Args:
             streams: Données streams
             segment_distance_km: Taille des segments en km
+            boundaries_km: Bornes arbitraires en km (ex: ravitaillements) ;
+                           si fourni, remplace segment_distance_km
         
         Returns:
             DataFrame avec analyse par segment
@@ -329,63 +419,73 @@ class ActivityAnalyzer:
         if not streams or 'distance' not in streams:
             return None
         
-        distance = np.array(streams['distance']['data']) / 1000  # en km
-        time_data = np.array(streams['time']['data']) if 'time' in streams else None
-        altitude = np.array(streams['altitude']['data']) if 'altitude' in streams else None
-        hr = np.array(streams['heartrate']['data']) if 'heartrate' in streams else None
-        velocity = np.array(streams['velocity_smooth']['data']) if 'velocity_smooth' in streams else None
+        distance = np.array(streams['distance']['data'], dtype=float) / 1000  # en km
+        time_data = np.array(streams['time']['data'], dtype=float) if 'time' in streams else None
+        altitude = np.array(streams['altitude']['data'], dtype=float) if 'altitude' in streams else None
+        hr = np.array(streams['heartrate']['data'], dtype=float) if 'heartrate' in streams else None
+        velocity = np.array(streams['velocity_smooth']['data'], dtype=float) if 'velocity_smooth' in streams else None
+        
+        if len(distance) == 0:
+            return pd.DataFrame()
         
-        # Création des segments
         max_distance = distance[-1]
-        segments = []
         
-        current_dist = 0
-        while current_dist < max_distance:
-            next_dist = current_dist + segment_distance_km
-            
-            # Indices pour ce segment
-            mask = (distance >= current_dist) & (distance < next_dist)
-            
-            if not mask.any():
-                current_dist = next_dist
-                continue
-            
-            segment_data = {
-                'segment_start_km': current_dist,
-                'segment_end_km': min(next_dist, max_distance),
-                'distance_km': min(segment_distance_km, max_distance - current_dist)
-            }
-            
-            # Temps
-            if time_data is not None:
-                segment_time = time_data[mask][-1] - time_data[mask][0]
-                segment_data['time_min'] = segment_time / 60
-                segment_data['pace_min_km'] = (segment_time / 60) / segment_data['distance_km']
-            
-            # Dénivelé
-            if altitude is not None:
-                segment_alt = altitude[mask]
-                segment_data['elevation_gain_m'] = max(0, segment_alt[-1] - segment_alt[0])
-                segment_data['avg_altitude_m'] = segment_alt.mean()
-                segment_data['gradient_pct'] = (segment_data['elevation_gain_m'] / 
-                                               (segment_data['distance_km'] * 1000)) * 100
-            
-            # FC
-            if hr is not None:
-                segment_hr = hr[mask]
-                segment_data['avg_hr'] = segment_hr.mean()
-                segment_data['max_hr'] = segment_hr.max()
-            
-            # Vitesse
-            if velocity is not None:
-                segment_vel = velocity[mask]
-                segment_data['avg_speed_kmh'] = segment_vel.mean() * 3.6
-                segment_data['max_speed_kmh'] = segment_vel.max() * 3.6
-            
-            segments.append(segment_data)
-            current_dist = next_dist
+        # Bornes de début de segment (km)
+        if boundaries_km is None:
+            starts_km = np.arange(0, max_distance, segment_distance_km)
+        else:
+            starts_km = np.asarray(boundaries_km, dtype=float)
+            starts_km = np.unique(np.concatenate(([0.0], starts_km[(starts_km > 0) & (starts_km < max_distance)])))
+        
+        if len(starts_km) == 0:
+            return pd.DataFrame()
+        
+        ends_km = np.append(starts_km[1:], max_distance)
         
-        return pd.DataFrame(segments)
+        # Premier échantillon de chaque segment, segments vides écartés
+        first = np.searchsorted(distance, starts_km, side='left')
+        last = np.append(first[1:], len(distance)) - 1
+        non_empty = first <= last
+        starts_km, ends_km = starts_km[non_empty], ends_km[non_empty]
+        first, last = first[non_empty], last[non_empty]
+        
+        counts = last - first + 1
+        segment_km = ends_km - starts_km
+        
+        segments = pd.DataFrame({
+            'segment_start_km': starts_km,
+            'segment_end_km': ends_km,
+            'distance_km': segment_km
+        })
+        
+        # Temps
+        if time_data is not None:
+            segment_time = time_data[last] - time_data[first]
+            segments['time_min'] = segment_time / 60
+            segments['pace_min_km'] = (segment_time / 60) / segment_km
+        
+        # Dénivelé : cumul des montées/descentes échantillon par échantillon
+        # (la variation qui mène au premier point d'un segment lui est attribuée)
+        if altitude is not None:
+            alt_diff = np.diff(altitude, prepend=altitude[0])
+            segments['elevation_gain_m'] = np.add.reduceat(np.maximum(alt_diff, 0), first)
+            segments['elevation_loss_m'] = np.add.reduceat(np.maximum(-alt_diff, 0), first)
+            segments['avg_altitude_m'] = np.add.reduceat(altitude, first) / counts
+            segments['gradient_pct'] = (
+                (segments['elevation_gain_m'] - segments['elevation_loss_m']) / (segment_km * 1000)
+            ) * 100
+        
+        # FC
+        if hr is not None:
+            segments['avg_hr'] = np.add.reduceat(hr, first) / counts
+            segments['max_hr'] = np.maximum.reduceat(hr, first)
+        
+        # Vitesse
+        if velocity is not None:
+            segments['avg_speed_kmh'] = np.add.reduceat(velocity, first) / counts * 3.6
+            segments['max_speed_kmh'] = np.maximum.reduceat(velocity, first) * 3.6
+        
+        return segments
     
     def compare_similar_activities(self, activity1_streams, activity2_streams, 
                                    activity1_info, activity2_info):
@@ -0,0 +1,256 @@
+"""
+Module de modélisation impulsion-réponse (Banister)
+- Ajustement des constantes de temps forme/fatigue individuelles
+- Ajustement des gains à partir de marqueurs de performance (VDOT)
+- Conversion vers les spans ATL/CTL de TrainingLoadCalculator
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class BanisterModel:
+    """
+    Modèle impulsion-réponse de Banister
+    
+    p(t) = p0 + k1 × Σ w(s) e^(-(t-s)/τ1) - k2 × Σ w(s) e^(-(t-s)/τ2)   (s < t)
+    
+    w = TSS journalier, τ1/k1 = forme (fitness), τ2/k2 = fatigue
+    """
+    
+    # Grilles de recherche initiales (jours)
+    FITNESS_TAU_GRID = np.arange(20, 71, 2.0)
+    FATIGUE_TAU_GRID = np.arange(3, 21, 1.0)
+    
+    def __init__(self):
+        self.params = None
+    
+    @staticmethod
+    def impulse_responses(daily_tss, taus):
+        """
+        Réponses impulsionnelles pour plusieurs constantes de temps à la fois
+        
+        Filtrage récursif g[t] = e^(-1/τ) × (g[t-1] + w[t-1]),
+        vectorisé sur toutes les constantes de temps candidates.
+        
+        Args:
+            daily_tss: TSS journalier (array, n_jours)
+            taus: Constantes de temps candidates (array, n_taus)
+        
+        Returns:
+            Array (n_jours, n_taus)
+        """
+        daily_tss = np.asarray(daily_tss, dtype=float)
+        decay = np.exp(-1 / np.asarray(taus, dtype=float))
+        
+        responses = np.zeros((len(daily_tss), len(decay)))
+        for t in range(1, len(daily_tss)):
+            responses[t] = decay * (responses[t - 1] + daily_tss[t - 1])
+        
+        return responses
+    
+    def fit(self, daily_tss, marker_days, marker_values, refine=True):
+        """
+        Ajuste τ1, τ2, k1, k2 et p0 sur les marqueurs de performance
+        
+        Recherche sur grille des couples (τ1, τ2) puis raffinement local autour
+        du meilleur couple. Pour chaque couple, les gains sont obtenus par
+        moindres carrés en forme fermée, résolus pour tous les couples en un
+        seul appel batché.
+        
+        Args:
+            daily_tss: TSS journalier (array, n_jours)
+            marker_days: Index (en jours depuis le début de daily_tss) des marqueurs
+            marker_values: Valeurs de performance (ex: VDOT)
+            refine: Raffiner autour du meilleur couple de la grille
+        
+        Returns:
+            dict des paramètres ajustés (ou None si pas assez de marqueurs)
+        """
+        daily_tss = np.asarray(daily_tss, dtype=float)
+        marker_days = np.asarray(marker_days, dtype=int)
+        marker_values = np.asarray(marker_values, dtype=float)
+        
+        valid = (marker_days > 0) & (marker_days < len(daily_tss))
+        marker_days = marker_days[valid]
+        marker_values = marker_values[valid]
+        
+        if len(marker_values) < 4:
+            return None
+        
+        best = self._search(daily_tss, marker_days, marker_values,
+                            self.FITNESS_TAU_GRID, self.FATIGUE_TAU_GRID)
+        n_candidates = best['n_candidates']
+        
+        if refine:
+            fitness_grid = best['tau_fitness'] + np.arange(-2, 2.01, 0.25)
+            fatigue_grid = best['tau_fatigue'] + np.arange(-1, 1.01, 0.125)
+            refined = self._search(daily_tss, marker_days, marker_values,
+                                   fitness_grid[fitness_grid > 1], fatigue_grid[fatigue_grid > 0.5])
+            n_candidates += refined['n_candidates']
+            if refined['sse'] <= best['sse']:
+                best = refined
+        
+        total_ss = np.sum((marker_values - marker_values.mean()) ** 2)
+        
+        self.params = {
+            'tau_fitness': best['tau_fitness'],
+            'tau_fatigue': best['tau_fatigue'],
+            'k_fitness': best['k_fitness'],
+            'k_fatigue': best['k_fatigue'],
+            'p0': best['p0'],
+            'rmse': float(np.sqrt(best['sse'] / len(marker_values))),
+            'r2': float(1 - best['sse'] / total_ss) if total_ss > 0 else 0.0,
+            'n_markers': int(len(marker_values)),
+            'n_candidates': int(n_candidates),
+            'ctl_days': tau_to_span(best['tau_fitness']),
+            'atl_days': tau_to_span(best['tau_fatigue'])
+        }
+        
+        return self.params
+    
+    def predict(self, daily_tss):
+        """
+        Performance modélisée pour chaque jour
+        
+        Args:
+            daily_tss: TSS journalier (array)
+        
+        Returns:
+            Array de performance modélisée (même unité que les marqueurs)
+        """
+        if self.params is None:
+            raise ValueError("Le modèle doit être ajusté avant de prédire (appeler fit)")
+        
+        responses = self.impulse_responses(
+            daily_tss, [self.params['tau_fitness'], self.params['tau_fatigue']]
+        )
+        
+        return (self.params['p0']
+                + self.params['k_fitness'] * responses[:, 0]
+                - self.params['k_fatigue'] * responses[:, 1])
+    
+    def _search(self, daily_tss, marker_days, marker_values, fitness_taus, fatigue_taus):
+        """Évalue tous les couples (τ1 > τ2) d'une grille et retourne le meilleur"""
+        taus = np.unique(np.concatenate((fitness_taus, fatigue_taus)))
+        responses = self.impulse_responses(daily_tss, taus)[marker_days]  # (n_marqueurs, n_taus)
+        
+        fit_idx = np.searchsorted(taus, fitness_taus)
+        fat_idx = np.searchsorted(taus, fatigue_taus)
+        pair_fit, pair_fat = np.meshgrid(fit_idx, fat_idx, indexing='ij')
+        pair_fit, pair_fat = pair_fit.ravel(), pair_fat.ravel()
+        
+        keep = taus[pair_fit] > taus[pair_fat]
+        pair_fit, pair_fat = pair_fit[keep], pair_fat[keep]
+        
+        # Matrice de design pour chaque couple : [1, forme, -fatigue]
+        n_markers = len(marker_values)
+        design = np.empty((len(pair_fit), n_markers, 3))
+        design[:, :, 0] = 1.0
+        design[:, :, 1] = responses[:, pair_fit].T
+        design[:, :, 2] = -responses[:, pair_fat].T
+        
+        # Moindres carrés batchés via les équations normales (légère régularisation)
+        gram = np.einsum('pmi,pmj->pij', design, design) + 1e-9 * np.eye(3)
+        rhs = np.einsum('pmi,m->pi', design, marker_values)
+        coefs = np.linalg.solve(gram, rhs[..., np.newaxis])[..., 0]
+        
+        residuals = marker_values[np.newaxis, :] - np.einsum('pmi,pi->pm', design, coefs)
+        sse = np.sum(residuals ** 2, axis=1)
+        
+        # Gains négatifs = modèle non physiologique
+        physical = (coefs[:, 1] >= 0) & (coefs[:, 2] >= 0)
+        if physical.any():
+            sse = np.where(physical, sse, np.inf)
+        
+        best = int(np.argmin(sse))
+        
+        return {
+            'tau_fitness': float(taus[pair_fit[best]]),
+            'tau_fatigue': float(taus[pair_fat[best]]),
+            'p0': float(coefs[best, 0]),
+            'k_fitness': float(coefs[best, 1]),
+            'k_fatigue': float(coefs[best, 2]),
+            'sse': float(sse[best]),
+            'n_candidates': len(pair_fit)
+        }
+
+
+def tau_to_span(tau):
+    """
+    Convertit une constante de temps τ (jours) en span EWM équivalent
+    
+    Décroissance e^(-1/τ) = 1 - α, avec α = 2/(span+1)
+    """
+    alpha = 1 - np.exp(-1 / tau)
+    return float(2 / alpha - 1)
+
+
+def extract_performance_markers(df, predictor, min_distance_km=3.0, max_deniv_percent=2.0,
+                                window_days=60, tolerance=0.97):
+    """
+    Extrait des marqueurs de performance (VDOT) sur les efforts type course
+    
+    Sont retenues les sorties roulantes (D+ faible) dont le VDOT est proche
+    du meilleur VDOT des window_days jours précédents, ainsi que les courses
+    marquées comme telles sur Strava (workout_type = 1) si disponible.
+    
+    Args:
+        df: DataFrame des activités
+        predictor: Instance de PerformancePredictor
+        min_distance_km: Distance minimale d'un effort
+        max_deniv_percent: % D+ maximal (le VDOT n'a pas de sens en montagne)
+        window_days: Fenêtre glissante pour le meilleur VDOT récent
+        tolerance: Fraction du meilleur VDOT récent pour être retenu
+    
+    Returns:
+        DataFrame avec colonnes start_date et vdot
+    """
+    efforts = df[
+        (df['distance_km'] >= min_distance_km) &
+        (df['deniv_percent'] <= max_deniv_percent) &
+        (df['moving_time'] > 0)
+    ].sort_values('start_date')
+    
+    if efforts.empty:
+        return pd.DataFrame(columns=['start_date', 'vdot'])
+    
+    vdots = pd.Series(
+        predictor.calculate_vdots(efforts['distance_m'].to_numpy(), efforts['moving_time'].to_numpy()),
+        index=pd.DatetimeIndex(efforts['start_date'])
+    )
+    
+    recent_best = vdots.rolling(f'{window_days}D').max()
+    race_like = (vdots >= recent_best * tolerance).to_numpy()
+    
+    if 'workout_type' in efforts.columns:
+        race_like |= (efforts['workout_type'] == 1).to_numpy()
+    
+    return pd.DataFrame({
+        'start_date': efforts['start_date'].to_numpy()[race_like],
+        'vdot': vdots.to_numpy()[race_like]
+    })
+
+
+def fit_banister_from_history(df_with_load, predictor, calculator, tss_column='tss'):
+    """
+    Ajuste le modèle de Banister sur l'historique d'un athlète
+    
+    Args:
+        df_with_load: DataFrame des activités avec TSS
+        predictor: Instance de PerformancePredictor
+        calculator: Instance de TrainingLoadCalculator (agrégation journalière)
+        tss_column: Nom de la colonne TSS
+    
+    Returns:
+        dict des paramètres ajustés (ou None si pas assez de marqueurs)
+    """
+    daily_tss = calculator.daily_tss_series(df_with_load, tss_column)
+    markers = extract_performance_markers(df_with_load, predictor)
+    
+    if markers.empty:
+        return None
+    
+    marker_days = (pd.to_datetime(markers['start_date']).dt.normalize() - daily_tss.index[0]).dt.days
+    
+    return BanisterModel().fit(daily_tss.values, marker_days.to_numpy(), markers['vdot'].to_numpy())
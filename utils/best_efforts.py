@@ -0,0 +1,246 @@
+"""
+Module de meilleurs efforts extraits des streams
+- Temps le plus rapide sur des distances de référence (400 m → marathon),
+  y compris à l'intérieur d'une sortie plus longue
+- D+ maximal sur des fenêtres de temps fixes
+- Tableau des records (tout temps ou période glissante), mis à jour
+  au fil des streams téléchargés
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Distances de référence (m)
+BEST_EFFORT_DISTANCES = {
+    '400 m': 400,
+    '1 km': 1000,
+    '1 mile': 1609.34,
+    '5 km': 5000,
+    '10 km': 10000,
+    'Semi-marathon': 21097.5,
+    'Marathon': 42195
+}
+
+# Fenêtres de temps pour le D+ maximal (minutes)
+CLIMB_WINDOWS_MIN = [5, 10, 20, 30, 60]
+
+
+def fastest_times(time_s, distance_m, distances=None):
+    """
+    Temps le plus court pour couvrir chaque distance de référence
+    
+    Fenêtre glissante : pour chaque point d'arrivée, le point de départ est
+    le dernier échantillon situé au moins d mètres plus tôt. Les départs de
+    toutes les arrivées sont trouvés par recherche binaire (un searchsorted
+    par distance, O(n log n)), puis le départ exact est interpolé entre
+    deux échantillons.
+    
+    Args:
+        time_s: Stream 'time' (secondes)
+        distance_m: Stream 'distance' (mètres)
+        distances: dict {nom: distance en m} (défaut : BEST_EFFORT_DISTANCES)
+    
+    Returns:
+        dict {nom: (secondes, temps de départ dans l'activité)} pour les
+        distances couvertes par l'activité
+    """
+    distances = distances or BEST_EFFORT_DISTANCES
+    n = min(len(time_s), len(distance_m))
+    time_s = np.asarray(time_s[:n], dtype=float)
+    distance_m = np.asarray(distance_m[:n], dtype=float)
+    
+    if n < 2:
+        return {}
+    
+    # Distance strictement croissante : à l'arrêt, on garde le dernier échantillon
+    keep = np.append(distance_m[1:] > distance_m[:-1], True)
+    time_s, distance_m = time_s[keep], distance_m[keep]
+    
+    efforts = {}
+    for name, target in distances.items():
+        first_end = int(np.searchsorted(distance_m, distance_m[0] + target, side='left'))
+        if first_end == len(distance_m):
+            continue
+        
+        # Départ de chaque fenêtre : dernier échantillon au moins target mètres plus tôt
+        ends = np.arange(first_end, len(distance_m))
+        start_distance = distance_m[ends] - target
+        starts = np.searchsorted(distance_m, start_distance, side='right') - 1
+        
+        # Départ exact interpolé entre cet échantillon et le suivant
+        fraction = (start_distance - distance_m[starts]) / (distance_m[starts + 1] - distance_m[starts])
+        start_times = time_s[starts] + fraction * (time_s[starts + 1] - time_s[starts])
+        durations = time_s[ends] - start_times
+        best = int(np.argmin(durations))
+        
+        efforts[name] = (float(durations[best]), float(start_times[best]))
+    
+    return efforts
+
+
+def max_climbs(time_s, altitude_m, windows_min=None):
+    """
+    D+ cumulé maximal sur des fenêtres de temps fixes
+    
+    Args:
+        time_s: Stream 'time' (secondes)
+        altitude_m: Stream 'altitude' (mètres)
+        windows_min: Durées des fenêtres en minutes (défaut : CLIMB_WINDOWS_MIN)
+    
+    Returns:
+        dict {minutes: (D+ en m, temps de départ dans l'activité)} pour les
+        fenêtres plus courtes que l'activité
+    """
+    windows_min = windows_min or CLIMB_WINDOWS_MIN
+    n = min(len(time_s), len(altitude_m))
+    time_s = np.asarray(time_s[:n], dtype=float)
+    altitude_m = np.asarray(altitude_m[:n], dtype=float)
+    
+    if n < 2:
+        return {}
+    
+    # D+ cumulé depuis le départ
+    gain = np.concatenate(([0.0], np.cumsum(np.maximum(np.diff(altitude_m), 0))))
+    
+    climbs = {}
+    for minutes in windows_min:
+        window_s = minutes * 60
+        if time_s[-1] - time_s[0] < window_s:
+            continue
+        
+        starts = np.searchsorted(time_s, time_s - window_s, side='left')
+        climbed = gain - gain[starts]
+        best = int(np.argmax(climbed))
+        
+        climbs[minutes] = (float(climbed[best]), float(time_s[starts[best]]))
+    
+    return climbs
+
+
+class BestEffortStore:
+    """
+    Meilleurs efforts par activité, calculés une seule fois par stream
+    
+    Les résultats sont conservés sous forme de table longue (une ligne par
+    activité et par effort) ; seules les activités nouvelles ou modifiées
+    dans le cache sont recalculées.
+    """
+    
+    def __init__(self):
+        self._revisions = {}
+        self.efforts = pd.DataFrame(columns=['id', 'effort', 'distance_m', 'seconds', 'offset_s'])
+        self.climbs = pd.DataFrame(columns=['id', 'window_min', 'elevation_gain_m', 'offset_s'])
+    
+    def sync(self, stream_cache):
+        """
+        Calcule les meilleurs efforts des streams nouveaux ou modifiés
+        
+        Args:
+            stream_cache: Instance de StreamCache
+        
+        Returns:
+            Nombre d'activités (re)calculées
+        """
+        changed = [
+            activity_id for activity_id in stream_cache.activity_ids()
+            if self._revisions.get(activity_id) != stream_cache.revision(activity_id)
+        ]
+        
+        if not changed:
+            return 0
+        
+        effort_rows = []
+        climb_rows = []
+        
+        for activity_id in changed:
+            time_s = stream_cache.array(activity_id, 'time')
+            distance_m = stream_cache.array(activity_id, 'distance')
+            altitude_m = stream_cache.array(activity_id, 'altitude')
+            
+            if time_s is not None and distance_m is not None:
+                for name, (seconds, offset) in fastest_times(time_s, distance_m).items():
+                    effort_rows.append((activity_id, name, BEST_EFFORT_DISTANCES[name], seconds, offset))
+            
+            if time_s is not None and altitude_m is not None:
+                for minutes, (climbed, offset) in max_climbs(time_s, altitude_m).items():
+                    climb_rows.append((activity_id, minutes, climbed, offset))
+            
+            self._revisions[activity_id] = stream_cache.revision(activity_id)
+        
+        self.efforts = pd.concat([
+            self.efforts[~self.efforts['id'].isin(changed)],
+            pd.DataFrame(effort_rows, columns=self.efforts.columns)
+        ], ignore_index=True)
+        self.climbs = pd.concat([
+            self.climbs[~self.climbs['id'].isin(changed)],
+            pd.DataFrame(climb_rows, columns=self.climbs.columns)
+        ], ignore_index=True)
+        
+        return len(changed)
+    
+    def dated_efforts(self, df, since=None):
+        """
+        Tous les meilleurs efforts par activité, avec date et nom de la sortie
+        
+        Args:
+            df: DataFrame des activités (colonnes id, start_date, name)
+            since: Ne garder que les efforts depuis cette date
+        
+        Returns:
+            DataFrame long (une ligne par activité et par distance)
+        """
+        return self._with_activity_info(self.efforts, df, since)
+    
+    def personal_records(self, df, since=None):
+        """
+        Meilleur temps sur chaque distance de référence
+        
+        Args:
+            df: DataFrame des activités (colonnes id, start_date, name)
+            since: Ne garder que les efforts depuis cette date (records glissants)
+        
+        Returns:
+            DataFrame avec une ligne par distance (ordre croissant)
+        """
+        efforts = self.dated_efforts(df, since)
+        
+        if efforts.empty:
+            return efforts
+        
+        best = efforts.loc[efforts.groupby('effort')['seconds'].idxmin()]
+        best['pace_s_km'] = best['seconds'] / (best['distance_m'] / 1000)
+        
+        return best.sort_values('distance_m').reset_index(drop=True)
+    
+    def climb_records(self, df, since=None):
+        """
+        D+ maximal sur chaque fenêtre de temps
+        
+        Args:
+            df: DataFrame des activités (colonnes id, start_date, name)
+            since: Ne garder que les efforts depuis cette date
+        
+        Returns:
+            DataFrame avec une ligne par fenêtre (ordre croissant)
+        """
+        climbs = self._with_activity_info(self.climbs, df, since)
+        
+        if climbs.empty:
+            return climbs
+        
+        best = climbs.loc[climbs.groupby('window_min')['elevation_gain_m'].idxmax()]
+        best['vertical_speed_m_h'] = best['elevation_gain_m'] / best['window_min'] * 60
+        
+        return best.sort_values('window_min').reset_index(drop=True)
+    
+    @staticmethod
+    def _with_activity_info(results, df, since):
+        """Associe date et nom des activités, et filtre par date"""
+        activities = df[['id', 'start_date', 'name']].dropna(subset=['id']).astype({'id': int})
+        merged = results.infer_objects().astype({'id': int}).merge(activities, on='id', how='inner')
+        
+        if since is not None:
+            merged = merged[merged['start_date'] >= pd.Timestamp(since)]
+        
+        return merged.reset_index(drop=True)
@@ -0,0 +1,260 @@
+"""
+Module de détection des montées et descentes
+- Lissage du stream d'altitude sur une grille de distance régulière
+- Détection des montées/descentes soutenues par hystérésis (une passe O(n))
+- Longueur, D+, pente moyenne/max et VAM de chaque montée
+- Stockage par activité et recherche sur tout l'historique
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Colonnes décrivant une montée/descente
+CLIMB_COLUMNS = ['type', 'start_km', 'end_km', 'length_m', 'elevation_m',
+                 'avg_grade_pct', 'max_grade_pct', 'duration_s', 'vam_m_h']
+
+
+def smooth_altitude(distance_m, altitude_m, step_m=10, window_m=100):
+    """
+    Rééchantillonne l'altitude tous les step_m mètres puis la lisse
+    
+    Args:
+        distance_m: Stream 'distance' (mètres)
+        altitude_m: Stream 'altitude' (mètres)
+        step_m: Pas de la grille de distance
+        window_m: Largeur de la moyenne glissante
+    
+    Returns:
+        Tuple (grille de distance, altitude lissée)
+    """
+    grid = np.arange(distance_m[0], distance_m[-1], step_m)
+    altitude = np.interp(grid, distance_m, altitude_m)
+    
+    # Moyenne glissante centrée par sommes cumulées, fenêtre réduite aux bords
+    half = max(1, int(window_m / step_m / 2))
+    cumsum = np.concatenate(([0.0], np.cumsum(altitude)))
+    lo = np.clip(np.arange(len(grid)) - half, 0, len(grid))
+    hi = np.clip(np.arange(len(grid)) + half + 1, 0, len(grid))
+    
+    return grid, (cumsum[hi] - cumsum[lo]) / (hi - lo)
+
+
+def turning_points(altitude, hysteresis_m=10):
+    """
+    Sommets et creux du profil, en ignorant les variations < hysteresis_m
+    
+    Une seule passe : on suit l'extrême courant dans la direction en cours
+    et on ne valide un changement de direction qu'une fois revenu de
+    hysteresis_m mètres en arrière.
+    
+    Args:
+        altitude: Altitude lissée (array)
+        hysteresis_m: Amplitude minimale d'un changement de direction
+    
+    Returns:
+        Array des indices des points de retournement (début et fin inclus)
+    """
+    points = [0]
+    direction = 0
+    low = high = extreme = 0
+    
+    for i in range(1, len(altitude)):
+        if direction == 0:
+            # Direction initiale : on attend un écart de hysteresis_m entre min et max
+            low = i if altitude[i] < altitude[low] else low
+            high = i if altitude[i] > altitude[high] else high
+            if altitude[high] - altitude[low] >= hysteresis_m:
+                start, extreme = (low, high) if low < high else (high, low)
+                direction = 1 if low < high else -1
+                if start > 0:
+                    points.append(start)
+        elif direction * (altitude[i] - altitude[extreme]) >= 0:
+            extreme = i
+        elif direction * (altitude[extreme] - altitude[i]) >= hysteresis_m:
+            # Retournement confirmé : l'extrême courant devient un point de retournement
+            points.append(extreme)
+            direction = -direction
+            extreme = i
+    
+    for last in (extreme, len(altitude) - 1):
+        if last > points[-1]:
+            points.append(last)
+    
+    return np.array(points)
+
+
+def detect_climbs(distance_m, altitude_m, time_s=None, min_gain_m=30, min_grade_pct=3.0,
+                  hysteresis_m=10, step_m=10, max_grade_window_m=100):
+    """
+    Détecte les montées et descentes soutenues d'une activité
+    
+    Args:
+        distance_m: Stream 'distance' (mètres)
+        altitude_m: Stream 'altitude' (mètres)
+        time_s: Stream 'time' (secondes, optionnel, pour la durée et la VAM)
+        min_gain_m: Dénivelé minimal d'une montée/descente
+        min_grade_pct: Pente moyenne minimale (en valeur absolue)
+        hysteresis_m: Amplitude minimale d'un changement de direction
+        step_m: Pas de la grille de distance
+        max_grade_window_m: Longueur sur laquelle la pente maximale est mesurée
+    
+    Returns:
+        DataFrame avec une ligne par montée/descente : type, start_km, end_km,
+        length_m, elevation_m, avg_grade_pct, max_grade_pct, duration_s, vam_m_h
+    """
+    n = min(len(distance_m), len(altitude_m))
+    distance_m = np.asarray(distance_m[:n], dtype=float)
+    altitude_m = np.asarray(altitude_m[:n], dtype=float)
+    
+    if n < 2 or distance_m[-1] - distance_m[0] < 2 * step_m:
+        return pd.DataFrame(columns=CLIMB_COLUMNS)
+    
+    # Distance strictement croissante pour l'interpolation
+    keep = np.append(distance_m[1:] > distance_m[:-1], True)
+    grid, altitude = smooth_altitude(distance_m[keep], altitude_m[keep], step_m)
+    
+    points = turning_points(altitude, hysteresis_m)
+    starts, ends = points[:-1].copy(), points[1:].copy()
+    
+    # Le bruit d'un replat repousse l'extrême : on retire les replats aux deux bouts
+    tolerance = hysteresis_m / 2
+    for k, (s, e) in enumerate(zip(points[:-1], points[1:])):
+        relative = (altitude[s:e + 1] - altitude[s]) * np.sign(altitude[e] - altitude[s])
+        top = int(np.argmax(relative >= relative[-1] - tolerance))
+        ends[k] = s + top
+        starts[k] = s + top - int(np.argmax(relative[top::-1] <= tolerance))
+    
+    elevation = altitude[ends] - altitude[starts]
+    length = grid[ends] - grid[starts]
+    avg_grade = np.divide(elevation, length, out=np.zeros_like(elevation), where=length > 0) * 100
+    
+    sustained = (np.abs(elevation) >= min_gain_m) & (np.abs(avg_grade) >= min_grade_pct)
+    starts, ends = starts[sustained], ends[sustained]
+    elevation, length, avg_grade = elevation[sustained], length[sustained], avg_grade[sustained]
+    
+    if len(starts) == 0:
+        return pd.DataFrame(columns=CLIMB_COLUMNS)
+    
+    # Pente maximale sur max_grade_window_m, dans le sens de la montée/descente
+    lag = max(1, int(max_grade_window_m / step_m))
+    window_grade = np.full(len(grid), np.nan)
+    window_grade[lag:] = (altitude[lag:] - altitude[:-lag]) / (lag * step_m) * 100
+    
+    sign = np.sign(elevation)
+    max_grade = np.array([
+        np.nanmax(window_grade[min(s + lag, e):e + 1] * g) * g if e - s >= lag else a
+        for s, e, g, a in zip(starts, ends, sign, avg_grade)
+    ])
+    
+    if time_s is not None:
+        time_s = np.asarray(time_s[:n], dtype=float)[keep]
+        grid_time = np.interp(grid, distance_m[keep], time_s)
+        duration = grid_time[ends] - grid_time[starts]
+        vam = np.divide(elevation * 3600, duration, out=np.full_like(elevation, np.nan), where=duration > 0)
+    else:
+        duration = np.full(len(starts), np.nan)
+        vam = np.full(len(starts), np.nan)
+    
+    return pd.DataFrame({
+        'type': np.where(elevation > 0, 'montée', 'descente'),
+        'start_km': grid[starts] / 1000,
+        'end_km': grid[ends] / 1000,
+        'length_m': length,
+        'elevation_m': elevation,
+        'avg_grade_pct': avg_grade,
+        'max_grade_pct': max_grade,
+        'duration_s': duration,
+        'vam_m_h': vam
+    }, columns=CLIMB_COLUMNS)
+
+
+class ClimbStore:
+    """
+    Montées/descentes de toutes les activités en cache
+    
+    Chaque activité n'est analysée qu'une fois par version de ses streams ;
+    la table longue permet des recherches sur tout l'historique.
+    """
+    
+    def __init__(self):
+        self._revisions = {}
+        self.climbs = pd.DataFrame(columns=['id'] + CLIMB_COLUMNS)
+    
+    def sync(self, stream_cache):
+        """
+        Détecte les montées des streams nouveaux ou modifiés
+        
+        Args:
+            stream_cache: Instance de StreamCache
+        
+        Returns:
+            Nombre d'activités (re)analysées
+        """
+        changed = [
+            activity_id for activity_id in stream_cache.activity_ids()
+            if self._revisions.get(activity_id) != stream_cache.revision(activity_id)
+        ]
+        
+        if not changed:
+            return 0
+        
+        frames = [self.climbs[~self.climbs['id'].isin(changed)]]
+        for activity_id in changed:
+            distance_m = stream_cache.array(activity_id, 'distance')
+            altitude_m = stream_cache.array(activity_id, 'altitude')
+            
+            if distance_m is not None and altitude_m is not None:
+                climbs = detect_climbs(distance_m, altitude_m, stream_cache.array(activity_id, 'time'))
+                frames.append(climbs.assign(id=activity_id)[self.climbs.columns])
+            
+            self._revisions[activity_id] = stream_cache.revision(activity_id)
+        
+        self.climbs = pd.concat(
+            [frame for frame in frames if not frame.empty] or [frames[0]], ignore_index=True
+        ).infer_objects()
+        
+        return len(changed)
+    
+    def for_activity(self, activity_id):
+        """Montées/descentes d'une activité (DataFrame vide si inconnue)"""
+        return self.climbs[self.climbs['id'] == int(activity_id)].reset_index(drop=True)
+    
+    def search(self, df, kind='montée', min_elevation_m=None, min_grade_pct=None,
+               start_date=None, end_date=None):
+        """
+        Recherche dans l'historique (ex: toutes les montées > 500 m D+ en 2025)
+        
+        Args:
+            df: DataFrame des activités (colonnes id, start_date, name)
+            kind: 'montée', 'descente' ou None (les deux)
+            min_elevation_m: Dénivelé minimal (en valeur absolue)
+            min_grade_pct: Pente moyenne minimale (en valeur absolue)
+            start_date: Date de début (incluse)
+            end_date: Date de fin (exclue)
+        
+        Returns:
+            DataFrame des montées avec date et nom de la sortie, les plus grosses d'abord
+        """
+        if self.climbs.empty:
+            return self.climbs
+        
+        climbs = self.climbs
+        mask = np.ones(len(climbs), dtype=bool)
+        
+        if kind is not None:
+            mask &= (climbs['type'] == kind).to_numpy()
+        if min_elevation_m is not None:
+            mask &= (climbs['elevation_m'].abs() >= min_elevation_m).to_numpy()
+        if min_grade_pct is not None:
+            mask &= (climbs['avg_grade_pct'].abs() >= min_grade_pct).to_numpy()
+        
+        activities = df[['id', 'start_date', 'name']].dropna(subset=['id']).astype({'id': int})
+        results = climbs[mask].astype({'id': int}).merge(activities, on='id', how='inner')
+        
+        if start_date is not None:
+            results = results[results['start_date'] >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            results = results[results['start_date'] < pd.Timestamp(end_date)]
+        
+        return results.sort_values('elevation_m', key=np.abs, ascending=False).reset_index(drop=True)
@@ -0,0 +1,270 @@
+"""
+Module d'allure ajustée à la pente (GAP, Grade Adjusted Pace)
+- Pente lissée calculée depuis les streams altitude/distance
+- Coût énergétique de la course selon la pente (polynôme de Minetti)
+- Stream GAP pour les graphiques et GAP moyenne par activité
+- Calcul groupé sur tous les streams en cache pour la tendance GAP
+"""
+
+import numpy as np
+import pandas as pd
+
+from .training_load import TrainingLoadCalculator
+
+
+# Coût énergétique à plat (J/kg/m), Minetti et al. 2002
+FLAT_COST = 3.6
+
+# Domaine de validité du polynôme (pente en fraction)
+MAX_GRADE = 0.45
+
+# En dessous de cette vitesse (m/s), on considère l'athlète à l'arrêt
+MIN_MOVING_SPEED = 0.5
+
+
+def running_cost(grade):
+    """
+    Coût énergétique de la course selon la pente (Minetti et al. 2002)
+    
+    Args:
+        grade: Pente en fraction (0.1 = 10%), scalaire ou array
+    
+    Returns:
+        Coût en J/kg/m
+    """
+    i = np.clip(grade, -MAX_GRADE, MAX_GRADE)
+    return 155.4 * i**5 - 30.4 * i**4 - 43.3 * i**3 + 46.3 * i**2 + 19.5 * i + FLAT_COST
+
+
+def cost_factor(grade):
+    """
+    Rapport coût en pente / coût à plat : 1 m parcouru à cette pente
+    « vaut » cost_factor(grade) m à plat
+    
+    Args:
+        grade: Pente en fraction, scalaire ou array
+    
+    Returns:
+        Facteur multiplicatif (sans unité)
+    """
+    return running_cost(grade) / FLAT_COST
+
+
+def smoothed_grade(distance_m, altitude_m, window_m=50):
+    """
+    Pente lissée en chaque point, mesurée sur window_m mètres centrés
+    
+    Args:
+        distance_m: Stream 'distance' (mètres)
+        altitude_m: Stream 'altitude' (mètres)
+        window_m: Largeur de la fenêtre de calcul
+    
+    Returns:
+        Array de pentes (fraction), de même longueur que les streams
+    """
+    distance_m = np.asarray(distance_m, dtype=float)
+    altitude_m = np.asarray(altitude_m, dtype=float)
+    
+    if len(distance_m) < 2:
+        return np.zeros(len(distance_m))
+    
+    # Distance strictement croissante pour l'interpolation
+    keep = np.append(distance_m[1:] > distance_m[:-1], True)
+    d, a = distance_m[keep], altitude_m[keep]
+    
+    lo = np.clip(distance_m - window_m / 2, d[0], d[-1])
+    hi = np.clip(distance_m + window_m / 2, d[0], d[-1])
+    span = hi - lo
+    
+    return np.divide(
+        np.interp(hi, d, a) - np.interp(lo, d, a), span,
+        out=np.zeros(len(distance_m)), where=span > 0
+    )
+
+
+def gap_stream(time_s, distance_m, altitude_m, velocity=None):
+    """
+    Vitesse ajustée à la pente en chaque point
+    
+    Args:
+        time_s: Stream 'time' (secondes)
+        distance_m: Stream 'distance' (mètres)
+        altitude_m: Stream 'altitude' (mètres)
+        velocity: Stream 'velocity_smooth' (m/s, optionnel : sinon dérivé
+            de la distance et du temps)
+    
+    Returns:
+        Array de vitesses équivalentes à plat (m/s)
+    """
+    n = min(len(time_s), len(distance_m), len(altitude_m))
+    time_s = np.asarray(time_s[:n], dtype=float)
+    distance_m = np.asarray(distance_m[:n], dtype=float)
+    
+    if velocity is None:
+        dt = np.diff(time_s, prepend=time_s[0])
+        dd = np.diff(distance_m, prepend=distance_m[0])
+        velocity = np.divide(dd, dt, out=np.zeros(n), where=dt > 0)
+    else:
+        velocity = np.asarray(velocity[:n], dtype=float)
+    
+    return velocity * cost_factor(smoothed_grade(distance_m, altitude_m[:n]))
+
+
+def moving_increments(time_s, distance_m):
+    """Incréments de temps et de distance, à zéro pendant les pauses et trous de stream"""
+    dt = np.diff(time_s, prepend=time_s[0])
+    dd = np.diff(distance_m, prepend=distance_m[0])
+    
+    moving = (dt > 0) & (dt <= TrainingLoadCalculator.MAX_STREAM_GAP_S) & (dd >= MIN_MOVING_SPEED * dt)
+    
+    return np.where(moving, dt, 0.0), np.where(moving, dd, 0.0)
+
+
+def activity_gap(time_s, distance_m, altitude_m):
+    """
+    GAP moyenne d'une activité : distance équivalente à plat / temps en mouvement
+    
+    Args:
+        time_s: Stream 'time' (secondes)
+        distance_m: Stream 'distance' (mètres)
+        altitude_m: Stream 'altitude' (mètres)
+    
+    Returns:
+        dict avec speed_m_s, gap_speed_m_s, moving_time_s, flat_distance_m
+        (None si l'activité est trop courte)
+    """
+    n = min(len(time_s), len(distance_m), len(altitude_m))
+    time_s = np.asarray(time_s[:n], dtype=float)
+    distance_m = np.asarray(distance_m[:n], dtype=float)
+    
+    dt, dd = moving_increments(time_s, distance_m)
+    moving_time = dt.sum()
+    
+    if moving_time <= 0:
+        return None
+    
+    flat_distance = np.sum(dd * cost_factor(smoothed_grade(distance_m, altitude_m[:n])))
+    
+    return {
+        'speed_m_s': dd.sum() / moving_time,
+        'gap_speed_m_s': flat_distance / moving_time,
+        'moving_time_s': moving_time,
+        'flat_distance_m': flat_distance
+    }
+
+
+def speed_to_pace(speed_m_s):
+    """Convertit une vitesse (m/s) en allure (min/km), NaN à l'arrêt"""
+    speed = np.asarray(speed_m_s, dtype=float)
+    return np.divide(1000 / 60, speed, out=np.full(speed.shape, np.nan), where=speed > 0)
+
+
+class GAPStore:
+    """
+    GAP moyenne de toutes les activités en cache
+    
+    Les streams nouveaux ou modifiés sont concaténés pour appliquer pente
+    et coût énergétique en un seul passage vectorisé, puis réduits par
+    activité (np.add.reduceat).
+    """
+    
+    def __init__(self):
+        self._revisions = {}
+        self.activities = pd.DataFrame(
+            columns=['id', 'speed_m_s', 'gap_speed_m_s', 'moving_time_s', 'distance_m', 'flat_distance_m']
+        )
+    
+    def sync(self, stream_cache):
+        """
+        Calcule la GAP des streams nouveaux ou modifiés
+        
+        Args:
+            stream_cache: Instance de StreamCache
+        
+        Returns:
+            Nombre d'activités (re)calculées
+        """
+        changed = [
+            activity_id for activity_id in stream_cache.activity_ids()
+            if self._revisions.get(activity_id) != stream_cache.revision(activity_id)
+        ]
+        
+        if not changed:
+            return 0
+        
+        ids, dts, dds, grades = [], [], [], []
+        
+        for activity_id in changed:
+            time_s = stream_cache.array(activity_id, 'time')
+            distance_m = stream_cache.array(activity_id, 'distance')
+            altitude_m = stream_cache.array(activity_id, 'altitude')
+            self._revisions[activity_id] = stream_cache.revision(activity_id)
+            
+            if time_s is None or distance_m is None or altitude_m is None:
+                continue
+            
+            n = min(len(time_s), len(distance_m), len(altitude_m))
+            if n < 2:
+                continue
+            
+            dt, dd = moving_increments(time_s[:n], distance_m[:n])
+            ids.append(activity_id)
+            dts.append(dt)
+            dds.append(dd)
+            grades.append(smoothed_grade(distance_m[:n], altitude_m[:n]))
+        
+        rows = pd.DataFrame(columns=self.activities.columns)
+        
+        if ids:
+            # Un seul passage sur tous les échantillons, puis une somme par activité
+            offsets = np.cumsum([0] + [len(dt) for dt in dts[:-1]])
+            dt = np.concatenate(dts)
+            dd = np.concatenate(dds)
+            flat_dd = dd * cost_factor(np.concatenate(grades))
+            
+            moving_time = np.add.reduceat(dt, offsets)
+            distance = np.add.reduceat(dd, offsets)
+            flat_distance = np.add.reduceat(flat_dd, offsets)
+            valid = moving_time > 0
+            
+            rows = pd.DataFrame({
+                'id': np.array(ids)[valid],
+                'speed_m_s': distance[valid] / moving_time[valid],
+                'gap_speed_m_s': flat_distance[valid] / moving_time[valid],
+                'moving_time_s': moving_time[valid],
+                'distance_m': distance[valid],
+                'flat_distance_m': flat_distance[valid]
+            })
+        
+        kept = self.activities[~self.activities['id'].isin(changed)]
+        self.activities = pd.concat(
+            [frame for frame in (kept, rows) if not frame.empty] or [kept], ignore_index=True
+        ).infer_objects()
+        
+        return len(changed)
+    
+    def gap_trend(self, df, freq='W'):
+        """
+        Allure moyenne et GAP moyenne par période (pondérées par le temps en mouvement)
+        
+        Args:
+            df: DataFrame des activités (colonnes 'id' et 'start_date')
+            freq: Période d'agrégation ('W' semaine, 'M' mois)
+        
+        Returns:
+            DataFrame indexé par début de période : pace_min_km, gap_pace_min_km, count
+        """
+        if self.activities.empty:
+            return pd.DataFrame(columns=['pace_min_km', 'gap_pace_min_km', 'count'])
+        
+        activities = df[['id', 'start_date']].dropna(subset=['id']).astype({'id': int})
+        activities = activities.merge(self.activities.astype({'id': int}), on='id', how='inner')
+        periods = activities['start_date'].dt.to_period(freq).dt.start_time.rename('period')
+        
+        totals = activities.groupby(periods)[['moving_time_s', 'distance_m', 'flat_distance_m']].sum()
+        
+        return pd.DataFrame({
+            'pace_min_km': speed_to_pace(totals['distance_m'] / totals['moving_time_s']),
+            'gap_pace_min_km': speed_to_pace(totals['flat_distance_m'] / totals['moving_time_s']),
+            'count': activities.groupby(periods).size()
+        }, index=totals.index)
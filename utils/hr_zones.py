@@ -0,0 +1,152 @@
+"""
+Module de répartition du temps par zones de fréquence cardiaque
+- Histogramme FC (secondes par bpm) de chaque stream en cache
+- Regroupement en zones selon les paramètres FC du TrainingLoadCalculator
+- Agrégation par semaine / période
+"""
+
+import numpy as np
+import pandas as pd
+
+from .training_load import TrainingLoadCalculator
+
+
+class HRZoneEngine:
+    """
+    Temps passé dans chaque zone FC, pour toutes les activités en cache
+    
+    Chaque stream est réduit une seule fois en histogramme secondes/bpm,
+    indépendant des réglages de zones : changer de méthode ou de FC
+    seuil ne fait que regrouper ces histogrammes, sans retélécharger
+    ni relire les streams.
+    """
+    
+    MAX_BPM = 250
+    
+    def __init__(self):
+        self._histograms = {}
+    
+    @classmethod
+    def bpm_histogram(cls, time_s, heartrate):
+        """
+        Secondes passées à chaque valeur de FC (bpm entier)
+        
+        Args:
+            time_s: Stream 'time' (secondes)
+            heartrate: Stream 'heartrate' (bpm)
+        
+        Returns:
+            np.ndarray de longueur MAX_BPM + 1
+        """
+        n = min(len(time_s), len(heartrate))
+        time_s = np.asarray(time_s[:n], dtype=float)
+        heartrate = np.nan_to_num(np.asarray(heartrate[:n], dtype=float))
+        
+        # Même pondération que TrainingLoadCalculator.calculate_stream_loads
+        dt = np.diff(time_s, prepend=time_s[0]) if n else np.zeros(0)
+        dt[(dt < 0) | (dt > TrainingLoadCalculator.MAX_STREAM_GAP_S)] = 0
+        dt[heartrate <= 0] = 0  # Décrochages du capteur
+        
+        bpm = np.clip(np.round(heartrate), 0, cls.MAX_BPM).astype(int)
+        
+        return np.bincount(bpm, weights=dt, minlength=cls.MAX_BPM + 1)
+    
+    def sync(self, stream_cache):
+        """
+        Calcule l'histogramme des streams FC nouveaux ou modifiés
+        
+        Args:
+            stream_cache: Instance de StreamCache
+        
+        Returns:
+            Nombre d'activités (re)calculées
+        """
+        updated = 0
+        
+        for activity_id in stream_cache.activity_ids():
+            revision = stream_cache.revision(activity_id)
+            known = self._histograms.get(activity_id)
+            
+            if known is not None and known[0] == revision:
+                continue
+            
+            time_s = stream_cache.array(activity_id, 'time')
+            heartrate = stream_cache.array(activity_id, 'heartrate')
+            
+            if time_s is None or heartrate is None:
+                self._histograms.pop(activity_id, None)
+                continue
+            
+            self._histograms[activity_id] = (revision, self.bpm_histogram(time_s, heartrate))
+            updated += 1
+        
+        return updated
+    
+    def zone_index(self, calculator, method='seuil'):
+        """
+        Zone (0 à 4) de chaque valeur de bpm
+        
+        Args:
+            calculator: Instance de TrainingLoadCalculator (fc_max, fc_repos, seuil_fc)
+            method: Méthode de zones (voir TrainingLoadCalculator.HR_ZONE_METHODS)
+        
+        Returns:
+            np.ndarray d'indices de zone, de longueur MAX_BPM + 1
+        """
+        bounds = calculator.hr_zone_bounds(method)
+        return np.searchsorted(bounds, np.arange(self.MAX_BPM + 1), side='right')
+    
+    def zone_seconds(self, activity_ids, calculator, method='seuil'):
+        """
+        Secondes passées dans chaque zone, par activité
+        
+        Args:
+            activity_ids: IDs des activités
+            calculator: Instance de TrainingLoadCalculator
+            method: Méthode de zones
+        
+        Returns:
+            DataFrame indexé par ID d'activité (une colonne par zone),
+            limité aux activités dont l'histogramme est connu
+        """
+        zone_names = TrainingLoadCalculator.HR_ZONE_NAMES
+        ids = [int(a) for a in activity_ids if pd.notna(a) and int(a) in self._histograms]
+        
+        if not ids:
+            return pd.DataFrame(columns=zone_names, dtype=float)
+        
+        histograms = np.stack([self._histograms[a][1] for a in ids])
+        n_zones = len(zone_names)
+        
+        # Un seul bincount pour toutes les activités : zone décalée de n_zones par ligne
+        zones = self.zone_index(calculator, method)
+        flat_index = (zones[np.newaxis, :] + n_zones * np.arange(len(ids))[:, np.newaxis]).ravel()
+        seconds = np.bincount(
+            flat_index, weights=histograms.ravel(), minlength=n_zones * len(ids)
+        ).reshape(len(ids), n_zones)
+        
+        return pd.DataFrame(seconds, index=pd.Index(ids, name='id'), columns=zone_names)
+    
+    def zone_distribution(self, df, calculator, method='seuil', freq='W'):
+        """
+        Heures passées dans chaque zone, par période
+        
+        Args:
+            df: DataFrame des activités (colonnes 'id' et 'start_date')
+            calculator: Instance de TrainingLoadCalculator
+            method: Méthode de zones
+            freq: Période d'agrégation ('W' semaine, 'M' mois)
+        
+        Returns:
+            DataFrame indexé par début de période (une colonne par zone, en heures)
+        """
+        zone_seconds = self.zone_seconds(df['id'], calculator, method)
+        
+        if zone_seconds.empty:
+            return zone_seconds
+        
+        activities = df[['id', 'start_date']].dropna(subset=['id']).astype({'id': int})
+        activities = activities.join(zone_seconds, on='id', how='inner')
+        periods = activities['start_date'].dt.to_period(freq).dt.start_time.rename('period')
+        
+        return activities[zone_seconds.columns].groupby(periods).sum() / 3600
@@ -0,0 +1,266 @@
+"""
+Module de modèle personnel allure / pente
+- Échantillons (pente, vitesse, FC) de tous les streams en cache
+- Agrégation par classe de pente, une seule passe vectorisée (bincount)
+- Pondération des sorties récentes (demi-vie)
+- Courbe vitesse(pente) personnelle utilisable par le prédicteur de parcours
+"""
+
+import numpy as np
+import pandas as pd
+
+from .gap import moving_increments, cost_factor, smoothed_grade
+
+
+# Bornes des classes de pente (fraction) : -40% à +40% par pas de 2%
+GRADE_BINS = np.round(np.arange(-0.40, 0.401, 0.02), 2)
+
+# Vitesses retenues (m/s) : au-delà, pics GPS
+MAX_SAMPLE_SPEED = 7.0
+
+
+class PaceGradeModel:
+    """
+    Vitesse personnelle selon la pente
+    
+    Chaque classe de pente garde la vitesse moyenne observée (distance /
+    temps, pondérés par la récence). Les classes peu fournies sont tirées
+    vers la vitesse à plat corrigée par le coût énergétique de Minetti.
+    """
+    
+    # Temps (s) à partir duquel une classe compte autant que l'a priori
+    PRIOR_SECONDS = 300
+    
+    def __init__(self, seconds, distance_m, hr_seconds=None, hr_weighted=None):
+        """
+        Args:
+            seconds: Temps pondéré par classe de pente
+            distance_m: Distance pondérée par classe de pente
+            hr_seconds: Temps pondéré avec FC valide par classe (optionnel)
+            hr_weighted: Somme pondérée FC × temps par classe (optionnel)
+        """
+        self.centers = (GRADE_BINS[:-1] + GRADE_BINS[1:]) / 2
+        self.seconds = np.asarray(seconds, dtype=float)
+        self.distance_m = np.asarray(distance_m, dtype=float)
+        
+        total_seconds = self.seconds.sum()
+        observed = np.divide(self.distance_m, self.seconds,
+                             out=np.zeros_like(self.seconds), where=self.seconds > 0)
+        
+        # Vitesse à plat équivalente : distance ramenée à plat / temps total
+        self.flat_speed = (np.sum(self.distance_m * cost_factor(self.centers)) / total_seconds
+                           if total_seconds > 0 else np.nan)
+        
+        prior = self.flat_speed / cost_factor(self.centers)
+        self.speed = (self.seconds * observed + self.PRIOR_SECONDS * prior) / (self.seconds + self.PRIOR_SECONDS)
+        
+        if hr_seconds is not None and hr_weighted is not None:
+            hr_seconds = np.asarray(hr_seconds, dtype=float)
+            self.heartrate = np.divide(hr_weighted, hr_seconds,
+                                       out=np.full_like(hr_seconds, np.nan), where=hr_seconds > 0)
+        else:
+            self.heartrate = np.full(len(self.centers), np.nan)
+    
+    @property
+    def is_empty(self):
+        """Aucun échantillon exploitable"""
+        return not self.seconds.sum() > 0
+    
+    def speed_at(self, grade):
+        """
+        Vitesse prédite (m/s) pour une ou plusieurs pentes
+        
+        Args:
+            grade: Pente(s) en fraction
+        
+        Returns:
+            Vitesse(s) interpolée(s) entre les classes
+        """
+        return np.interp(np.clip(grade, GRADE_BINS[0], GRADE_BINS[-1]), self.centers, self.speed)
+    
+    def segment_times(self, distance_m, grade):
+        """
+        Temps prédit sur des tronçons
+        
+        Args:
+            distance_m: Longueur de chaque tronçon (mètres)
+            grade: Pente de chaque tronçon (fraction)
+        
+        Returns:
+            Array des temps (secondes)
+        """
+        return np.asarray(distance_m, dtype=float) / self.speed_at(grade)
+    
+    def climbing_penalty(self, grade=0.10):
+        """
+        Temps perdu par 100 m de D+ à une pente donnée, par rapport au plat
+        
+        Args:
+            grade: Pente de référence (fraction)
+        
+        Returns:
+            Pénalité en minutes par 100 m de D+
+        """
+        distance_for_100m = 100 / grade
+        return (distance_for_100m / self.speed_at(grade) - distance_for_100m / self.speed_at(0.0)) / 60
+    
+    def to_frame(self):
+        """
+        Courbe sous forme de tableau
+        
+        Returns:
+            DataFrame avec grade_pct, speed_m_s, pace_min_km, hours, heartrate
+        """
+        return pd.DataFrame({
+            'grade_pct': self.centers * 100,
+            'speed_m_s': self.speed,
+            'pace_min_km': 1000 / 60 / self.speed,
+            'hours': self.seconds / 3600,
+            'heartrate': self.heartrate
+        })
+
+
+class PaceGradeEngine:
+    """
+    Histogrammes pente → (temps, distance, FC) de chaque stream en cache
+    
+    Les histogrammes sont calculés une fois par version des streams, en une
+    seule passe sur les échantillons concaténés de toutes les activités
+    nouvelles. La pondération par récence, propre à chaque activité, ne fait
+    ensuite que combiner ces histogrammes.
+    """
+    
+    def __init__(self):
+        self._revisions = {}
+        self._histograms = {}
+    
+    def sync(self, stream_cache):
+        """
+        Calcule les histogrammes des streams nouveaux ou modifiés
+        
+        Args:
+            stream_cache: Instance de StreamCache
+        
+        Returns:
+            Nombre d'activités (re)calculées
+        """
+        changed = [
+            activity_id for activity_id in stream_cache.activity_ids()
+            if self._revisions.get(activity_id) != stream_cache.revision(activity_id)
+        ]
+        
+        if not changed:
+            return 0
+        
+        ids, dts, dds, grades, hrs = [], [], [], [], []
+        
+        for activity_id in changed:
+            self._revisions[activity_id] = stream_cache.revision(activity_id)
+            self._histograms.pop(activity_id, None)
+            
+            time_s = stream_cache.array(activity_id, 'time')
+            distance_m = stream_cache.array(activity_id, 'distance')
+            altitude_m = stream_cache.array(activity_id, 'altitude')
+            
+            if time_s is None or distance_m is None or altitude_m is None:
+                continue
+            
+            n = min(len(time_s), len(distance_m), len(altitude_m))
+            if n < 2:
+                continue
+            
+            heartrate = stream_cache.array(activity_id, 'heartrate')
+            heartrate = heartrate[:n] if heartrate is not None and len(heartrate) >= n else np.zeros(n)
+            
+            dt, dd = moving_increments(time_s[:n], distance_m[:n])
+            ids.append(activity_id)
+            dts.append(dt)
+            dds.append(dd)
+            grades.append(smoothed_grade(distance_m[:n], altitude_m[:n]))
+            hrs.append(np.nan_to_num(heartrate))
+        
+        if not ids:
+            return len(changed)
+        
+        # Tous les échantillons à la fois : classe de pente décalée de n_bins par activité
+        n_bins = len(GRADE_BINS) - 1
+        row = np.repeat(np.arange(len(ids)), [len(dt) for dt in dts])
+        dt = np.concatenate(dts)
+        dd = np.concatenate(dds)
+        hr = np.concatenate(hrs)
+        
+        valid = (dt > 0) & (dd <= MAX_SAMPLE_SPEED * dt)
+        grade_bin = np.clip(np.digitize(np.concatenate(grades), GRADE_BINS) - 1, 0, n_bins - 1)
+        flat_index = (row * n_bins + grade_bin)[valid]
+        dt, dd, hr = dt[valid], dd[valid], hr[valid]
+        hr_dt = np.where(hr > 0, dt, 0.0)
+        
+        sums = np.stack([
+            np.bincount(flat_index, weights=weights, minlength=n_bins * len(ids)).reshape(len(ids), n_bins)
+            for weights in (dt, dd, hr_dt, hr_dt * hr)
+        ], axis=1)
+        
+        for activity_id, histogram in zip(ids, sums):
+            self._histograms[activity_id] = histogram
+        
+        return len(changed)
+    
+    def fit(self, df, half_life_days=90, as_of=None):
+        """
+        Ajuste la courbe personnelle, sorties récentes pondérées plus fort
+        
+        Args:
+            df: DataFrame des activités (colonnes 'id' et 'start_date')
+            half_life_days: Demi-vie de la pondération (None : pas de pondération)
+            as_of: Date de référence (défaut : dernière sortie)
+        
+        Returns:
+            PaceGradeModel (vide si aucun stream exploitable)
+        """
+        activities = df[['id', 'start_date']].dropna(subset=['id']).astype({'id': int})
+        activities = activities[activities['id'].isin(self._histograms)]
+        n_bins = len(GRADE_BINS) - 1
+        
+        if activities.empty:
+            return PaceGradeModel(np.zeros(n_bins), np.zeros(n_bins))
+        
+        histograms = np.stack([self._histograms[a] for a in activities['id']])
+        
+        if half_life_days:
+            as_of = pd.Timestamp(as_of) if as_of is not None else activities['start_date'].max()
+            age_days = (as_of - activities['start_date']).dt.total_seconds().to_numpy() / 86400
+            weights = 0.5 ** (np.maximum(age_days, 0) / half_life_days)
+        else:
+            weights = np.ones(len(activities))
+        
+        seconds, distance, hr_seconds, hr_weighted = np.tensordot(weights, histograms, axes=1)
+        
+        return PaceGradeModel(seconds, distance, hr_seconds, hr_weighted)
+
+
+def get_pace_model(store, df, half_life_days=90):
+    """
+    Modèle allure / pente partagé, réajusté seulement quand les données changent
+    
+    Args:
+        store: Stockage persistant entre les reruns (st.session_state)
+        df: DataFrame complet des activités
+        half_life_days: Demi-vie de la pondération par récence
+    
+    Returns:
+        PaceGradeModel à jour
+    """
+    stream_cache = store.get('stream_cache')
+    engine = store.setdefault('pace_grade_engine', PaceGradeEngine())
+    
+    version = stream_cache.version if stream_cache is not None else 0
+    key = (version, len(df), df['start_date'].max() if len(df) else None, half_life_days)
+    entry = store.get('pace_model')
+    
+    if entry is None or entry[0] != key:
+        if stream_cache is not None:
+            engine.sync(stream_cache)
+        entry = (key, engine.fit(df, half_life_days))
+        store['pace_model'] = entry
+    
+    return entry[1]
@@ -6,31 +6,56 @@ Inclut VDOT, équivalences, prédictions selon D+
 import numpy as np
 import pandas as pd
 from typing import Dict, Tuple, Optional
-import gpxpy
-import gpxpy.gpx
+import gzip
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import xml.etree.ElementTree as ET
 from datetime import datetime
 
+from .climbs import smooth_altitude
+from .gap import cost_factor
+from .vdot import vdot_from_performance, time_from_vdot
+
+# Nombre maximal de parcours GPX gardés en cache (une saison de courses candidates)
+MAX_CACHED_COURSES = 12
+
+# En dessous de ce nombre de fichiers à lire, le pool coûte plus cher qu'il ne rapporte
+MIN_COURSES_FOR_POOL = 2
+
 class PerformancePredictor:
     """Classe pour les calculs de prédiction de performances"""
     
-    # Tables de référence VDOT (Daniels)
-    # Format: {VDOT: {distance_m: temps_secondes}}
-    VDOT_REFERENCE = {
-        30: {5000: 1560, 10000: 3300, 21097: 7380, 42195: 16200},
-        35: {5000: 1320, 10000: 2760, 21097: 6120, 42195: 13380},
-        40: {5000: 1140, 10000: 2400, 21097: 5280, 42195: 11400},
-        45: {5000: 1020, 10000: 2100, 21097: 4620, 42195: 9900},
-        50: {5000: 900, 10000: 1860, 21097: 4080, 42195: 8700},
-        55: {5000: 810, 10000: 1680, 21097: 3660, 42195: 7800},
-        60: {5000: 735, 10000: 1530, 21097: 3300, 42195: 7020},
-        65: {5000: 675, 10000: 1395, 21097: 3000, 42195: 6360},
-        70: {5000: 615, 10000: 1275, 21097: 2730, 42195: 5820},
-        75: {5000: 570, 10000: 1170, 21097: 2505, 42195: 5310},
-        80: {5000: 525, 10000: 1080, 21097: 2310, 42195: 4860}
+    # Distances de prédiction usuelles
+    PREDICTION_DISTANCES = {
+        '1 km': 1000,
+        '5 km': 5000,
+        '10 km': 10000,
+        'Semi-marathon': 21097.5,
+        'Marathon': 42195,
+        '50 km': 50000,
+        '100 km': 100000
     }
     
-    def __init__(self):
-        self.vdot_values = sorted(self.VDOT_REFERENCE.keys())
+    # Domaine de validité du modèle vitesse critique / D' (efforts de 2 à 40 min)
+    CS_DURATION_RANGE_S = (120, 2400)
+    
+    # Durée minimale des efforts pris en compte pour l'exposant de Riegel
+    RIEGEL_MIN_DURATION_S = 120
+    
+    # Catégories de pente, de la descente la plus raide à la montée la plus raide
+    SLOPE_CATEGORIES = [
+        'very_steep_downhill', 'steep_downhill', 'moderate_downhill', 'gentle_downhill',
+        'flat',
+        'gentle_uphill', 'moderate_uphill', 'steep_uphill', 'very_steep_uphill'
+    ]
+    
+    # Seuils de |pente| (%) séparant plat, léger, modéré, raide et très raide
+    SLOPE_THRESHOLDS = [3, 6, 10, 15]
+    
+    # Gain de vitesse maximal en descente pour le modèle générique (technique, freinage)
+    MAX_DOWNHILL_SPEEDUP = 1.25
     
     def calculate_vdot_from_race(self, distance_m: float, time_seconds: float) -> float:
         """
@@ -39,70 +64,41 @@ class PerformancePredictor:
         Args:
             distance_m: Distance en mètres
             time_seconds: Temps en secondes
-            
+        
         Returns:
             VDOT estimé
         """
-        # Interpolation pour trouver le VDOT correspondant
-        best_vdot = 30
-        min_diff = float('inf')
-        
-        for vdot in self.vdot_values:
-            predicted_time = self._predict_time_for_distance(distance_m, vdot)
-            diff = abs(predicted_time - time_seconds)
-            
-            if diff < min_diff:
-                min_diff = diff
-                best_vdot = vdot
-        
-        # Interpolation linéaire entre deux VDOT
-        if best_vdot < max(self.vdot_values):
-            vdot_low = best_vdot
-            vdot_high = vdot_low + 5
-            
-            time_low = self._predict_time_for_distance(distance_m, vdot_low)
-            time_high = self._predict_time_for_distance(distance_m, vdot_high)
-            
-            if time_low != time_high:
-                ratio = (time_seconds - time_high) / (time_low - time_high)
-                return vdot_low + ratio * 5
-        
-        return float(best_vdot)
+        return float(vdot_from_performance(distance_m, time_seconds))
     
-    def _predict_time_for_distance(self, distance_m: float, vdot: float) -> float:
-        """Prédit le temps pour une distance donnée avec un VDOT donné"""
-        
-        # Trouver les deux distances de référence encadrantes
-        ref_distances = sorted([5000, 10000, 21097, 42195])
+    def calculate_vdots(self, distances_m, times_s) -> np.ndarray:
+        """
+        VDOT de toutes les performances d'un historique en un seul appel
         
-        # Si distance exacte dans la table
-        if distance_m in ref_distances and vdot in self.VDOT_REFERENCE:
-            return self.VDOT_REFERENCE[vdot][distance_m]
+        Args:
+            distances_m: Distances en mètres (array)
+            times_s: Temps en secondes (array)
         
-        # Interpolation
-        if distance_m <= 5000:
-            # Extrapolation en dessous de 5km
-            ref_time = self.VDOT_REFERENCE.get(vdot, {}).get(5000, 1000)
-            return ref_time * (distance_m / 5000) ** 1.06
+        Returns:
+            Array de VDOT (NaN pour les performances sans temps ou distance)
+        """
+        return vdot_from_performance(distances_m, times_s)
+    
+    def predict_times(self, distances_m, vdot) -> np.ndarray:
+        """
+        Temps prédits pour plusieurs distances (et/ou plusieurs VDOT)
         
-        elif distance_m >= 42195:
-            # Extrapolation au-dessus du marathon
-            ref_time = self.VDOT_REFERENCE.get(vdot, {}).get(42195, 10000)
-            return ref_time * (distance_m / 42195) ** 1.06
+        Args:
+            distances_m: Distances en mètres (array)
+            vdot: VDOT, scalaire ou array diffusable avec distances_m
         
-        else:
-            # Interpolation entre deux distances
-            for i in range(len(ref_distances) - 1):
-                if ref_distances[i] <= distance_m <= ref_distances[i+1]:
-                    d1, d2 = ref_distances[i], ref_distances[i+1]
-                    t1 = self.VDOT_REFERENCE.get(vdot, {}).get(d1, 0)
-                    t2 = self.VDOT_REFERENCE.get(vdot, {}).get(d2, 0)
-                    
-                    # Interpolation logarithmique (plus précise pour les temps)
-                    ratio = np.log(distance_m / d1) / np.log(d2 / d1)
-                    return t1 + ratio * (t2 - t1)
-        
-        return 1000  # Valeur par défaut
+        Returns:
+            Array des temps en secondes
+        """
+        return time_from_vdot(distances_m, vdot)
+    
+    def _predict_time_for_distance(self, distance_m: float, vdot: float) -> float:
+        """Prédit le temps pour une distance donnée avec un VDOT donné"""
+        return float(time_from_vdot(distance_m, vdot))
     
     def predict_times_from_vdot(self, vdot: float) -> Dict[str, float]:
         """
@@ -110,25 +106,13 @@ class PerformancePredictor:
         
         Args:
             vdot: Valeur VDOT
-            
+        
         Returns:
             Dictionnaire {distance_name: temps_en_secondes}
         """
-        distances = {
-            '1 km': 1000,
-            '5 km': 5000,
-            '10 km': 10000,
-            'Semi-marathon': 21097.5,
-            'Marathon': 42195,
-            '50 km': 50000,
-            '100 km': 100000
-        }
-        
-        predictions = {}
-        for name, distance_m in distances.items():
-            predictions[name] = self._predict_time_for_distance(distance_m, vdot)
+        times = self.predict_times(list(self.PREDICTION_DISTANCES.values()), vdot)
         
-        return predictions
+        return dict(zip(self.PREDICTION_DISTANCES, times.tolist()))
     
     def calculate_race_equivalences(self, distance_m: float, time_seconds: float) -> Dict[str, float]:
         """
@@ -137,7 +121,7 @@ class PerformancePredictor:
         Args:
             distance_m: Distance de référence en mètres
             time_seconds: Temps de référence en secondes
-            
+        
         Returns:
             Dictionnaire des équivalences
         """
@@ -152,7 +136,8 @@ class PerformancePredictor:
         flat_time_seconds: float,
         elevation_gain_m: float,
         distance_m: float,
-        runner_level: str = 'intermediate'
+        runner_level: str = 'intermediate',
+        penalty_per_100m: Optional[float] = None
     ) -> float:
         """
         Ajuste le temps prédit en fonction du dénivelé
@@ -162,7 +147,9 @@ class PerformancePredictor:
             elevation_gain_m: Dénivelé positif en mètres
             distance_m: Distance totale en mètres
             runner_level: Niveau du coureur ('beginner', 'intermediate', 'advanced')
-            
+            penalty_per_100m: Pénalité personnelle en min / 100m D+ (ex: issue du
+                modèle allure/pente), remplace celle du niveau
+        
         Returns:
             Temps ajusté en secondes
         """
@@ -173,7 +160,8 @@ class PerformancePredictor:
             'advanced': 3.0       # 3 min/100m
         }
         
-        penalty_per_100m = penalties.get(runner_level, 4.5)
+        if penalty_per_100m is None:
+            penalty_per_100m = penalties.get(runner_level, 4.5)
         
         # Calcul de la pénalité
         elevation_penalty_seconds = (elevation_gain_m / 100) * penalty_per_100m * 60
@@ -199,7 +187,7 @@ class PerformancePredictor:
             current_time_seconds: Temps actuel
             target_time_seconds: Temps objectif
             weeks_available: Nombre de semaines disponibles
-            
+        
         Returns:
             Dictionnaire avec analyse de progression
         """
@@ -235,173 +223,450 @@ class PerformancePredictor:
             'difficulty': difficulty
         }
     
-    def analyze_gpx_elevation_profile(self, gpx_data: Dict) -> Dict[str, any]:
+    def fit_pace_duration_curves(self, distances_m: np.ndarray, best_times_s: np.ndarray) -> pd.DataFrame:
+        """
+        Ajuste vitesse critique / D' et loi de Riegel sur plusieurs jeux de records
+        
+        - Vitesse critique : distance = CS × temps + D' (efforts de 2 à 40 min)
+        - Riegel : temps = a × distance^b, soit log t = log a + b log d
+        
+        Les deux régressions linéaires sont résolues en forme fermée pour
+        toutes les lignes (fenêtres) à la fois.
+        
+        Args:
+            distances_m: Distances de référence (n_distances,)
+            best_times_s: Meilleurs temps (n_fenêtres, n_distances), NaN si absent
+        
+        Returns:
+            DataFrame avec une ligne par fenêtre : cs_m_s, d_prime_m, cs_r2, cs_points,
+            riegel_a, riegel_b, riegel_r2, riegel_points
+        """
+        distances = np.broadcast_to(np.asarray(distances_m, dtype=float), np.shape(best_times_s))
+        times = np.asarray(best_times_s, dtype=float)
+        has_time = np.isfinite(times) & (times > 0)
+        
+        cs_min, cs_max = self.CS_DURATION_RANGE_S
+        cs_weights = has_time & (times >= cs_min) & (times <= cs_max)
+        cs_slope, cs_intercept, cs_r2, cs_points = _batched_linear_fit(times, distances, cs_weights)
+        
+        riegel_weights = has_time & (times >= self.RIEGEL_MIN_DURATION_S)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_d = np.log(distances)
+            log_t = np.log(np.where(has_time, times, 1.0))
+        riegel_b, log_a, riegel_r2, riegel_points = _batched_linear_fit(log_d, log_t, riegel_weights)
+        
+        # Une vitesse critique ou un D' négatif n'a pas de sens physiologique
+        cs_valid = (cs_points >= 2) & (cs_slope > 0) & (cs_intercept >= 0)
+        riegel_valid = riegel_points >= 2
+        
+        return pd.DataFrame({
+            'cs_m_s': np.where(cs_valid, cs_slope, np.nan),
+            'd_prime_m': np.where(cs_valid, cs_intercept, np.nan),
+            'cs_r2': np.where(cs_valid, cs_r2, np.nan),
+            'cs_points': cs_points,
+            'riegel_a': np.where(riegel_valid, np.exp(log_a), np.nan),
+            'riegel_b': np.where(riegel_valid, riegel_b, np.nan),
+            'riegel_r2': np.where(riegel_valid, riegel_r2, np.nan),
+            'riegel_points': riegel_points
+        })
+    
+    def fit_pace_duration_curve(self, efforts: pd.DataFrame) -> Optional[Dict[str, float]]:
+        """
+        Courbe allure-durée personnelle à partir de meilleurs efforts
+        
+        Args:
+            efforts: DataFrame avec colonnes distance_m et seconds
+                     (plusieurs efforts par distance possibles : le meilleur est retenu)
+        
+        Returns:
+            Dictionnaire des paramètres ajustés (None si pas assez d'efforts)
+        """
+        if efforts.empty:
+            return None
+        
+        best = efforts.groupby('distance_m')['seconds'].min()
+        fit = self.fit_pace_duration_curves(
+            best.index.to_numpy(dtype=float), best.to_numpy(dtype=float)[np.newaxis, :]
+        ).iloc[0]
+        
+        if np.isnan(fit['riegel_b']) and np.isnan(fit['cs_m_s']):
+            return None
+        
+        return fit.to_dict()
+    
+    def fit_pace_duration_curve_rolling(
+        self,
+        efforts: pd.DataFrame,
+        window_ends: pd.DatetimeIndex,
+        window_days: int = 90
+    ) -> pd.DataFrame:
+        """
+        Courbe allure-durée réajustée sur des fenêtres glissantes
+        
+        Le meilleur temps de chaque distance dans chaque fenêtre est obtenu par
+        un masque (fenêtres × efforts) puis un minimum par distance, et toutes
+        les fenêtres sont ajustées en un seul appel à fit_pace_duration_curves.
+        
+        Args:
+            efforts: DataFrame avec colonnes start_date, distance_m et seconds
+            window_ends: Fins des fenêtres (incluses)
+            window_days: Longueur des fenêtres en jours
+        
+        Returns:
+            DataFrame des paramètres avec une colonne window_end
+        """
+        window_ends = pd.DatetimeIndex(window_ends)
+        distances = np.sort(efforts['distance_m'].astype(float).unique())
+        
+        dates = efforts['start_date'].to_numpy(dtype='datetime64[ns]')
+        ends = window_ends.to_numpy(dtype='datetime64[ns]')
+        starts = ends - np.timedelta64(window_days, 'D')
+        in_window = (dates[np.newaxis, :] > starts[:, np.newaxis]) & (dates[np.newaxis, :] <= ends[:, np.newaxis])
+        
+        times = np.where(in_window, efforts['seconds'].to_numpy(dtype=float)[np.newaxis, :], np.inf)
+        distance_index = np.searchsorted(distances, efforts['distance_m'].to_numpy(dtype=float))
+        
+        # Minimum par distance : réduction sur les efforts triés par distance
+        order = np.argsort(distance_index, kind='stable')
+        group_starts = np.searchsorted(distance_index[order], np.arange(len(distances)))
+        best_times = np.minimum.reduceat(times[:, order], group_starts, axis=1)
+        best_times[~np.isfinite(best_times)] = np.nan
+        
+        fits = self.fit_pace_duration_curves(distances, best_times)
+        fits.insert(0, 'window_end', window_ends)
+        
+        return fits
+    
+    def predict_times_from_curve(
+        self,
+        curve: Dict[str, float],
+        distances: Optional[Dict[str, float]] = None
+    ) -> Dict[str, float]:
+        """
+        Prédit les temps à partir de la courbe allure-durée personnelle
+        
+        Le modèle vitesse critique est utilisé dans son domaine de validité
+        (temps prédit ≤ 40 min), la loi de Riegel au-delà.
+        
+        Args:
+            curve: Paramètres retournés par fit_pace_duration_curve
+            distances: Dictionnaire {nom: distance_m} (défaut : PREDICTION_DISTANCES)
+        
+        Returns:
+            Dictionnaire {distance_name: temps_en_secondes}
+        """
+        distances = distances or self.PREDICTION_DISTANCES
+        predictions = {}
+        
+        for name, distance_m in distances.items():
+            cs_time = np.nan
+            if np.isfinite(curve.get('cs_m_s', np.nan)) and distance_m > curve['d_prime_m']:
+                cs_time = (distance_m - curve['d_prime_m']) / curve['cs_m_s']
+            
+            if np.isfinite(cs_time) and cs_time <= self.CS_DURATION_RANGE_S[1]:
+                predictions[name] = float(cs_time)
+            elif np.isfinite(curve.get('riegel_b', np.nan)):
+                predictions[name] = float(curve['riegel_a'] * distance_m ** curve['riegel_b'])
+        
+        return predictions
+    
+    def predict_course_times(
+        self,
+        gpx_data: Dict,
+        flat_speed_m_s: Optional[float] = None,
+        pace_model=None,
+        fatigue_per_hour: float = 0.01,
+        step_m: float = 20
+    ) -> pd.DataFrame:
+        """
+        Prédit le temps de passage en chaque point d'un parcours GPX
+        
+        Le tracé est rééchantillonné à pas fixe, la pente de chaque pas donne
+        une vitesse (modèle personnel, ou vitesse à plat corrigée par le coût
+        énergétique de Minetti), puis une dérive de fatigue ralentit
+        l'allure proportionnellement au temps écoulé :
+        dt = dτ (1 + k t), soit t = (exp(k τ) - 1) / k en forme fermée.
+        
+        Args:
+            gpx_data: Données retournées par parse_gpx_file
+            flat_speed_m_s: Vitesse sur plat (modèle générique)
+            pace_model: PaceGradeModel personnel (prioritaire sur flat_speed_m_s)
+            fatigue_per_hour: Ralentissement par heure de course (0.01 = +1%/h)
+            step_m: Pas de rééchantillonnage en mètres
+        
+        Returns:
+            DataFrame avec une ligne par point : distance_km, altitude_m,
+            grade_pct, elapsed_s (le temps final est elapsed_s.iloc[-1])
+        """
+        distance_m = np.asarray(gpx_data['distance'], dtype=float)
+        altitude_m = np.asarray(gpx_data['altitude'], dtype=float)
+        
+        # Grille régulière (le dernier point est ajouté pour couvrir tout le parcours)
+        grid, altitude = smooth_altitude(distance_m, altitude_m, step_m)
+        grid = np.append(grid, distance_m[-1])
+        altitude = np.append(altitude, altitude_m[-1])
+        
+        steps = np.diff(grid)
+        grade = np.divide(np.diff(altitude), steps, out=np.zeros_like(steps), where=steps > 0)
+        
+        if pace_model is not None:
+            speed = pace_model.speed_at(grade)
+        elif flat_speed_m_s:
+            speed = np.minimum(
+                flat_speed_m_s / cost_factor(grade), flat_speed_m_s * self.MAX_DOWNHILL_SPEEDUP
+            )
+        else:
+            raise ValueError("Il faut une vitesse sur plat ou un modèle allure/pente")
+        
+        base_elapsed = np.concatenate(([0.0], np.cumsum(steps / speed)))
+        
+        k = fatigue_per_hour / 3600
+        elapsed = np.expm1(k * base_elapsed) / k if k > 0 else base_elapsed
+        
+        return pd.DataFrame({
+            'distance_km': grid / 1000,
+            'altitude_m': altitude,
+            'grade_pct': np.append(grade, grade[-1] if len(grade) else 0.0) * 100,
+            'elapsed_s': elapsed
+        })
+    
+    def course_splits(self, course: pd.DataFrame, checkpoints_km) -> pd.DataFrame:
+        """
+        Temps de passage cumulés et intermédiaires aux points de contrôle
+        
+        Args:
+            course: DataFrame retourné par predict_course_times
+            checkpoints_km: Distances des points de contrôle (km) ; l'arrivée
+                est ajoutée automatiquement
+        
+        Returns:
+            DataFrame avec checkpoint_km, elapsed_s, split_s, elevation_gain_m,
+            elevation_loss_m et pace_s_km pour chaque tronçon
+        """
+        distance_km = course['distance_km'].to_numpy()
+        finish_km = distance_km[-1]
+        
+        checkpoints = np.asarray(sorted(checkpoints_km), dtype=float)
+        checkpoints = checkpoints[(checkpoints > 0) & (checkpoints < finish_km)]
+        checkpoints = np.append(checkpoints, finish_km)
+        
+        # D+ et D- cumulés sur la grille, lus aux points de contrôle
+        climb = np.diff(course['altitude_m'].to_numpy(), prepend=course['altitude_m'].iloc[0])
+        gain = np.interp(checkpoints, distance_km, np.cumsum(np.maximum(climb, 0)))
+        loss = np.interp(checkpoints, distance_km, np.cumsum(np.maximum(-climb, 0)))
+        
+        elapsed = np.interp(checkpoints, distance_km, course['elapsed_s'].to_numpy())
+        split = np.diff(elapsed, prepend=0.0)
+        
+        return pd.DataFrame({
+            'checkpoint_km': checkpoints,
+            'elapsed_s': elapsed,
+            'split_s': split,
+            'elevation_gain_m': np.diff(gain, prepend=0.0),
+            'elevation_loss_m': np.diff(loss, prepend=0.0),
+            'pace_s_km': split / np.diff(checkpoints, prepend=0.0)
+        })
+    
+    def analyze_gpx_elevation_profile(
+        self,
+        gpx_data: Dict,
+        resample_step_m: Optional[float] = None
+    ) -> Dict[str, any]:
         """
         Analyse le profil d'élévation d'un parcours GPX
         
+        Les pentes sont calculées tronçon par tronçon et chaque catégorie
+        reçoit la longueur exacte des tronçons qui la composent.
+        
         Args:
             gpx_data: Données GPX avec latitudes, longitudes, altitudes
-            
+            resample_step_m: Pas de rééchantillonnage en mètres (optionnel) :
+                rend le résultat indépendant de la densité de points du GPX
+        
         Returns:
             Analyse détaillée du profil
         """
         if 'altitude' not in gpx_data or len(gpx_data['altitude']) < 2:
             return {}
         
-        altitudes = np.array(gpx_data['altitude'])
-        distances = np.array(gpx_data.get('distance', range(len(altitudes))))
+        altitudes = np.asarray(gpx_data['altitude'], dtype=float)
+        distances = np.asarray(gpx_data.get('distance', np.arange(len(altitudes))), dtype=float)
         
-        # Calculer les pentes
-        slopes = []
-        for i in range(1, len(altitudes)):
-            delta_alt = altitudes[i] - altitudes[i-1]
-            delta_dist = distances[i] - distances[i-1]
-            
-            if delta_dist > 0:
-                slope = (delta_alt / delta_dist) * 100  # en pourcentage
-                slopes.append(slope)
-        
-        slopes = np.array(slopes)
-        
-        # Catégorisation des pentes
-        flat = np.sum((slopes >= -3) & (slopes <= 3))
-        gentle_uphill = np.sum((slopes > 3) & (slopes <= 6))
-        moderate_uphill = np.sum((slopes > 6) & (slopes <= 10))
-        steep_uphill = np.sum((slopes > 10) & (slopes <= 15))
-        very_steep_uphill = np.sum(slopes > 15)
+        if resample_step_m:
+            grid = np.append(np.arange(distances[0], distances[-1], resample_step_m), distances[-1])
+            altitudes = np.interp(grid, distances, altitudes)
+            distances = grid
         
-        gentle_downhill = np.sum((slopes < -3) & (slopes >= -6))
-        moderate_downhill = np.sum((slopes < -6) & (slopes >= -10))
-        steep_downhill = np.sum((slopes < -10) & (slopes >= -15))
-        very_steep_downhill = np.sum(slopes < -15)
+        # Pentes des tronçons de longueur non nulle (en pourcentage)
+        delta_alt = np.diff(altitudes)
+        delta_dist = np.diff(distances)
+        moving = delta_dist > 0
+        lengths = delta_dist[moving]
+        slopes = delta_alt[moving] / lengths * 100
         
-        total_segments = len(slopes)
+        # Catégorie : intensité selon |pente| (bornes incluses côté plat), côté selon le signe
+        # 0 = D- très raide ... 4 = plat ... 8 = D+ très raide
+        intensity = np.digitize(np.abs(slopes), self.SLOPE_THRESHOLDS, right=True)
+        category = 4 + np.sign(slopes).astype(int) * intensity
         
-        # Calcul des distances par catégorie
-        segment_distance = (distances[-1] - distances[0]) / total_segments
-        
-        # Dénivelé positif et négatif
-        positive_elevation = np.sum(np.maximum(0, altitudes[1:] - altitudes[:-1]))
-        negative_elevation = np.sum(np.maximum(0, altitudes[:-1] - altitudes[1:]))
+        counts = np.bincount(category, minlength=len(self.SLOPE_CATEGORIES))
+        category_distances = np.bincount(category, weights=lengths, minlength=len(self.SLOPE_CATEGORIES))
+        total_length = lengths.sum()
         
         return {
             'total_distance_m': distances[-1] - distances[0],
-            'positive_elevation_m': positive_elevation,
-            'negative_elevation_m': negative_elevation,
+            'positive_elevation_m': np.sum(np.maximum(delta_alt, 0)),
+            'negative_elevation_m': np.sum(np.maximum(-delta_alt, 0)),
             'altitude_min': np.min(altitudes),
             'altitude_max': np.max(altitudes),
             'altitude_avg': np.mean(altitudes),
             'slope_distribution': {
-                'flat': {
-                    'count': flat,
-                    'percent': (flat / total_segments) * 100,
-                    'distance_m': flat * segment_distance
-                },
-                'gentle_uphill': {
-                    'count': gentle_uphill,
-                    'percent': (gentle_uphill / total_segments) * 100,
-                    'distance_m': gentle_uphill * segment_distance
-                },
-                'moderate_uphill': {
-                    'count': moderate_uphill,
-                    'percent': (moderate_uphill / total_segments) * 100,
-                    'distance_m': moderate_uphill * segment_distance
-                },
-                'steep_uphill': {
-                    'count': steep_uphill,
-                    'percent': (steep_uphill / total_segments) * 100,
-                    'distance_m': steep_uphill * segment_distance
-                },
-                'very_steep_uphill': {
-                    'count': very_steep_uphill,
-                    'percent': (very_steep_uphill / total_segments) * 100,
-                    'distance_m': very_steep_uphill * segment_distance
-                },
-                'gentle_downhill': {
-                    'count': gentle_downhill,
-                    'percent': (gentle_downhill / total_segments) * 100,
-                    'distance_m': gentle_downhill * segment_distance
-                },
-                'moderate_downhill': {
-                    'count': moderate_downhill,
-                    'percent': (moderate_downhill / total_segments) * 100,
-                    'distance_m': moderate_downhill * segment_distance
-                },
-                'steep_downhill': {
-                    'count': steep_downhill,
-                    'percent': (steep_downhill / total_segments) * 100,
-                    'distance_m': steep_downhill * segment_distance
-                },
-                'very_steep_downhill': {
-                    'count': very_steep_downhill,
-                    'percent': (very_steep_downhill / total_segments) * 100,
-                    'distance_m': very_steep_downhill * segment_distance
+                name: {
+                    'count': int(counts[idx]),
+                    'percent': (category_distances[idx] / total_length) * 100 if total_length > 0 else 0.0,
+                    'distance_m': category_distances[idx]
                 }
+                for idx, name in enumerate(self.SLOPE_CATEGORIES)
             },
-            'average_slope': np.mean(slopes),
-            'max_slope': np.max(slopes),
-            'min_slope': np.min(slopes)
+            'average_slope': np.average(slopes, weights=lengths) if total_length > 0 else 0.0,
+            'max_slope': np.max(slopes) if len(slopes) else 0.0,
+            'min_slope': np.min(slopes) if len(slopes) else 0.0
         }
     
-    def parse_gpx_file(self, gpx_content: str) -> Dict:
+    def parse_gpx_file(self, gpx_content) -> Dict:
         """
-        Parse un fichier GPX et extrait les données d'élévation
+        Parse un fichier GPX ou TCX et extrait les données d'élévation
+        
+        Lecture incrémentale du XML (iterparse) : chaque point est copié dans
+        des arrays préalloués puis l'élément est libéré, sans construire
+        l'arbre complet. Les points sans altitude sont ignorés ; tous les
+        tracks et segments sont mis bout à bout.
         
         Args:
-            gpx_content: Contenu du fichier GPX en string
-            
+            gpx_content: Contenu du fichier GPX/TCX (str, bytes ou fichier
+                binaire, éventuellement compressé en gzip)
+        
         Returns:
-            Dictionnaire avec les données extraites
+            Dictionnaire avec les données extraites (arrays numpy), dont
+            'time' (secondes depuis le premier point) si le tracé est horodaté
         """
+        if isinstance(gpx_content, str):
+            gpx_content = gpx_content.encode('utf-8')
+        if isinstance(gpx_content, bytes):
+            gpx_content = io.BytesIO(gpx_content)
+        
         try:
-            # Parser avec gpxpy (beaucoup plus robuste)
-            gpx = gpxpy.parse(gpx_content)
+            latitudes, longitudes, altitudes, timestamps = self._parse_track_points(gpx_content)
+        except (ET.ParseError, gzip.BadGzipFile, EOFError) as e:
+            return {'error': f'Fichier GPX invalide: {str(e)}'}
+        except Exception as e:
+            return {'error': f'Erreur lors de la lecture: {str(e)}'}
+        
+        if len(altitudes) < 2:
+            return {'error': 'Pas assez de points avec altitude trouvés (minimum 2 requis)'}
+        
+        # Distance cumulée : un seul haversine vectorisé sur tout le tracé
+        steps = self._haversine_distance(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:])
+        
+        gpx_data = {
+            'latitude': latitudes,
+            'longitude': longitudes,
+            'altitude': altitudes,
+            'distance': np.concatenate(([0.0], np.cumsum(steps)))
+        }
+        
+        times = pd.to_datetime(pd.Series(timestamps), utc=True, errors='coerce', format='ISO8601')
+        if times.notna().any():
+            gpx_data['time'] = (times - times.dropna().iloc[0]).dt.total_seconds().to_numpy()
+        
+        return gpx_data
+    
+    @staticmethod
+    def _parse_track_points(stream) -> Tuple[np.ndarray, ...]:
+        """
+        Lit les points de trace (GPX trkpt ou TCX Trackpoint) au fil de l'eau
+        
+        Args:
+            stream: Fichier binaire positionné au début (décompressé à la
+                volée s'il est au format gzip)
+        
+        Returns:
+            Tuple (latitudes, longitudes, altitudes, horodatages ISO ou None)
+        """
+        start = stream.tell()
+        size = stream.seek(0, io.SEEK_END) - start
+        stream.seek(start)
+        
+        if stream.read(2) == b'\x1f\x8b':
+            stream.seek(start)
+            stream = gzip.GzipFile(fileobj=stream)
+            size *= 8  # Taux de compression typique d'un GPX
+        else:
+            stream.seek(start)
+        
+        # Capacité initiale estimée d'après la taille (~100 octets par point), doublée si besoin
+        capacity = max(size // 100, 16)
+        latitudes = np.empty(capacity)
+        longitudes = np.empty(capacity)
+        altitudes = np.empty(capacity)
+        timestamps = np.empty(capacity, dtype=object)
+        n = 0
+        
+        local_names = {}  # Balise avec namespace -> nom local
+        parents = []      # Éléments ouverts, de la racine à l'élément courant
+        in_point = 0      # Profondeur dans un point en cours de lecture
+        
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            tag = local_names.get(elem.tag)
+            if tag is None:
+                tag = local_names.setdefault(elem.tag, elem.tag.rsplit('}', 1)[-1])
+            is_point = tag == 'trkpt' or tag == 'Trackpoint'
             
-            latitudes = []
-            longitudes = []
-            altitudes = []
-            distances = [0]
+            if event == 'start':
+                parents.append(elem)
+                in_point += is_point
+                continue
             
-            prev_lat, prev_lon = None, None
-            cumulative_distance = 0
+            parents.pop()
             
-            # Parcourir tous les tracks et segments
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        if point.elevation is not None:
-                            latitudes.append(point.latitude)
-                            longitudes.append(point.longitude)
-                            altitudes.append(point.elevation)
-                            
-                            # Calcul distance
-                            if prev_lat is not None and prev_lon is not None:
-                                dist = self._haversine_distance(
-                                    prev_lat, prev_lon, 
-                                    point.latitude, point.longitude
-                                )
-                                cumulative_distance += dist
-                            
-                            distances.append(cumulative_distance)
-                            prev_lat, prev_lon = point.latitude, point.longitude
+            # Sous-arbre terminé (hors point en cours) : détaché de son parent,
+            # la mémoire reste constante quelle que soit la taille du tracé
+            if is_point:
+                in_point -= 1
+            if in_point == 0 and parents:
+                parents[-1].remove(elem)
             
-            if len(altitudes) < 2:
-                return {'error': 'Pas assez de points avec altitude trouvés (minimum 2 requis)'}
+            if not is_point:
+                continue
             
-            return {
-                'latitude': latitudes,
-                'longitude': longitudes,
-                'altitude': altitudes,
-                'distance': distances[1:]  # Remove initial 0
-            }
-        
-        except gpxpy.gpx.GPXException as e:
-            return {'error': f'Fichier GPX invalide: {str(e)}'}
-        except Exception as e:
-            return {'error': f'Erreur lors de la lecture: {str(e)}'}
+            if tag == 'trkpt':
+                lat, lon = elem.get('lat'), elem.get('lon')
+                values = {local_names.get(child.tag): child.text for child in elem}
+                ele, time = values.get('ele'), values.get('time')
+            else:
+                values = {local_names.get(child.tag): child.text for child in elem.iter()}
+                lat, lon = values.get('LatitudeDegrees'), values.get('LongitudeDegrees')
+                ele, time = values.get('AltitudeMeters'), values.get('Time')
+            
+            if lat is None or lon is None or ele is None or not ele.strip():
+                continue
+            
+            if n == capacity:
+                capacity *= 2
+                latitudes, longitudes, altitudes, timestamps = (
+                    np.resize(array, capacity) for array in (latitudes, longitudes, altitudes, timestamps)
+                )
+            
+            latitudes[n] = float(lat)
+            longitudes[n] = float(lon)
+            altitudes[n] = float(ele)
+            timestamps[n] = time
+            n += 1
+        
+        return latitudes[:n], longitudes[:n], altitudes[:n], timestamps[:n]
     
-    def _haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calcule la distance entre deux points GPS (en mètres)"""
+    def _haversine_distance(self, lat1, lon1, lat2, lon2):
+        """Calcule la distance entre deux points GPS (en mètres), scalaires ou arrays"""
         R = 6371000  # Rayon de la Terre en mètres
         
         phi1 = np.radians(lat1)
@@ -414,6 +679,244 @@ class PerformancePredictor:
         
         return R * c
 
+def _batched_linear_fit(x: np.ndarray, y: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Régressions linéaires pondérées y = pente × x + ordonnée, une par ligne
+    
+    Returns:
+        Tuple (pente, ordonnée, r2, nombre de points) d'arrays (n_lignes,)
+    """
+    w = weights.astype(float)
+    x = np.where(weights, x, 0.0)
+    y = np.where(weights, y, 0.0)
+    
+    n = w.sum(axis=1)
+    sx, sy = (w * x).sum(axis=1), (w * y).sum(axis=1)
+    sxx, sxy, syy = (w * x * x).sum(axis=1), (w * x * y).sum(axis=1), (w * y * y).sum(axis=1)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_x = sxx - sx ** 2 / n
+        var_y = syy - sy ** 2 / n
+        cov = sxy - sx * sy / n
+        slope = cov / var_x
+        intercept = (sy - slope * sx) / n
+        r2 = np.where(var_y > 0, cov ** 2 / (var_x * var_y), 1.0)
+    
+    degenerate = (n < 2) | ~(np.abs(var_x) > 1e-12)
+    slope[degenerate] = np.nan
+    intercept[degenerate] = np.nan
+    r2 = np.where(degenerate, np.nan, r2)
+    
+    return slope, intercept, r2, n.astype(int)
+
+
+def course_content_hash(source) -> str:
+    """
+    Empreinte SHA-256 du contenu d'un fichier de parcours, lu par blocs
+    
+    Args:
+        source: Contenu (str ou bytes) ou fichier binaire (ex: fichier importé)
+    
+    Returns:
+        Empreinte hexadécimale
+    """
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    
+    digest = hashlib.sha256()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(1 << 20), b''):
+        digest.update(chunk)
+    source.seek(0)
+    
+    return digest.hexdigest()
+
+
+def get_gpx_course(
+    store,
+    source,
+    predictor: PerformancePredictor,
+    resample_step_m: Optional[float] = 10,
+    course_hash: Optional[str] = None
+) -> Tuple[Dict, Dict]:
+    """
+    Parcours parsé et analysé, mis en cache par empreinte du contenu
+    
+    Un même fichier (importé ou collé) n'est lu et analysé qu'une fois,
+    quels que soient les reruns et changements d'onglet.
+    
+    Args:
+        store: Stockage persistant entre les reruns (st.session_state)
+        source: Contenu (str ou bytes) ou fichier binaire GPX/TCX (gzip accepté)
+        predictor: Instance de PerformancePredictor
+        resample_step_m: Pas de rééchantillonnage de l'analyse de pentes
+        course_hash: Empreinte déjà calculée (optionnel)
+    
+    Returns:
+        Tuple (données parsées, analyse du profil) ; l'analyse est vide et
+        les données contiennent 'error' si le fichier est illisible
+    """
+    course_hash = course_hash or course_content_hash(source)
+    courses = store.setdefault('gpx_courses', {})
+    key = (course_hash, resample_step_m)
+    
+    if key not in courses:
+        if not isinstance(source, (str, bytes)):
+            source.seek(0)
+        _cache_course(courses, key, _load_course((source, resample_step_m), predictor))
+    
+    return courses[key]
+
+
+def get_gpx_courses(
+    store,
+    sources: Dict,
+    predictor: PerformancePredictor,
+    resample_step_m: Optional[float] = 10,
+    max_workers: Optional[int] = None
+) -> Dict:
+    """
+    Plusieurs parcours parsés et analysés, les nouveaux en parallèle
+    
+    Seuls les fichiers absents du cache sont lus, dans un pool de processus
+    s'il y en a plusieurs : ajouter une course à la comparaison ne coûte
+    que cette course.
+    
+    Args:
+        store: Stockage persistant entre les reruns (st.session_state)
+        sources: dict {nom: contenu (str ou bytes) ou fichier binaire GPX/TCX}
+        predictor: Instance de PerformancePredictor (lecture séquentielle)
+        resample_step_m: Pas de rééchantillonnage de l'analyse de pentes
+        max_workers: Nombre de processus (None = nombre de CPU)
+    
+    Returns:
+        dict {nom: (données parsées, analyse du profil)}, dans l'ordre de sources
+    """
+    courses = store.setdefault('gpx_courses', {})
+    keys = {name: (course_content_hash(source), resample_step_m) for name, source in sources.items()}
+    
+    # Un même fichier importé deux fois n'est lu qu'une fois
+    missing = {}
+    for name, key in keys.items():
+        if key not in courses and key not in missing:
+            source = sources[name]
+            missing[key] = source.read() if hasattr(source, 'read') else source
+    
+    jobs = [(content, resample_step_m) for content in missing.values()]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    
+    if len(jobs) >= MIN_COURSES_FOR_POOL and max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_load_course, jobs))
+    else:
+        results = [_load_course(job, predictor) for job in jobs]
+    
+    # Entrées relevées avant insertion : l'éviction ne touche pas la comparaison en cours
+    entries = {key: courses[key] for key in keys.values() if key in courses}
+    entries.update(zip(missing, results))
+    for key in missing:
+        _cache_course(courses, key, entries[key])
+    
+    return {name: entries[key] for name, key in keys.items()}
+
+
+def compare_courses(
+    courses: Dict,
+    predictor: PerformancePredictor,
+    pace_model=None,
+    vdot: Optional[float] = None,
+    fatigue_per_hour: float = 0.01
+) -> pd.DataFrame:
+    """
+    Tableau comparatif de plusieurs parcours
+    
+    Args:
+        courses: dict {nom: (données parsées, analyse du profil)} (get_gpx_courses)
+        predictor: Instance de PerformancePredictor
+        pace_model: PaceGradeModel personnel (prioritaire sur vdot)
+        vdot: VDOT donnant la vitesse à plat sur la distance de chaque parcours
+        fatigue_per_hour: Ralentissement par heure de course
+    
+    Returns:
+        DataFrame avec une ligne par parcours lisible : name, distance_km,
+        elevation_gain_m, elevation_loss_m, gain_per_km, altitude_max_m,
+        part de plat / montée / descente / pente raide (%) et predicted_s
+        (NaN sans modèle d'allure)
+    """
+    downhill = [c for c in predictor.SLOPE_CATEGORIES if c.endswith('downhill')]
+    uphill = [c for c in predictor.SLOPE_CATEGORIES if c.endswith('uphill')]
+    steep = [c for c in predictor.SLOPE_CATEGORIES if c.startswith(('steep', 'very_steep'))]
+    
+    rows = []
+    for name, (gpx_data, profile) in courses.items():
+        if 'error' in gpx_data:
+            continue
+        
+        slopes = profile['slope_distribution']
+        distance_km = profile['total_distance_m'] / 1000
+        
+        if pace_model is not None:
+            speed_model = {'pace_model': pace_model}
+        elif vdot:
+            flat_time = predictor._predict_time_for_distance(profile['total_distance_m'], vdot)
+            speed_model = {'flat_speed_m_s': profile['total_distance_m'] / flat_time}
+        else:
+            speed_model = None
+        
+        rows.append({
+            'name': name,
+            'distance_km': distance_km,
+            'elevation_gain_m': profile['positive_elevation_m'],
+            'elevation_loss_m': profile['negative_elevation_m'],
+            'gain_per_km': profile['positive_elevation_m'] / distance_km if distance_km > 0 else np.nan,
+            'altitude_max_m': profile['altitude_max'],
+            'flat_pct': slopes['flat']['percent'],
+            'uphill_pct': sum(slopes[c]['percent'] for c in uphill),
+            'downhill_pct': sum(slopes[c]['percent'] for c in downhill),
+            'steep_pct': sum(slopes[c]['percent'] for c in steep),
+            'predicted_s': (
+                predictor.predict_course_times(gpx_data, fatigue_per_hour=fatigue_per_hour, **speed_model)
+                ['elapsed_s'].iloc[-1] if speed_model else np.nan
+            )
+        })
+    
+    return pd.DataFrame(rows, columns=[
+        'name', 'distance_km', 'elevation_gain_m', 'elevation_loss_m', 'gain_per_km',
+        'altitude_max_m', 'flat_pct', 'uphill_pct', 'downhill_pct', 'steep_pct', 'predicted_s'
+    ])
+
+
+def _load_course(job, predictor: Optional[PerformancePredictor] = None) -> Tuple[Dict, Dict]:
+    """
+    Lit et analyse un parcours (exécuté dans un processus du pool)
+    
+    Args:
+        job: Tuple (contenu ou fichier GPX/TCX, pas de rééchantillonnage)
+        predictor: Instance de PerformancePredictor (créée si absente)
+    
+    Returns:
+        Tuple (données parsées, analyse du profil ; vide si le fichier est illisible)
+    """
+    source, resample_step_m = job
+    predictor = predictor or PerformancePredictor()
+    
+    gpx_data = predictor.parse_gpx_file(source)
+    profile = (predictor.analyze_gpx_elevation_profile(gpx_data, resample_step_m)
+               if 'error' not in gpx_data else {})
+    
+    return gpx_data, profile
+
+
+def _cache_course(courses: Dict, key, entry: Tuple[Dict, Dict]):
+    """Ajoute un parcours au cache, en évinçant le plus ancien au-delà de MAX_CACHED_COURSES"""
+    # Quelques parcours seulement : ce sont de gros arrays
+    if len(courses) >= MAX_CACHED_COURSES:
+        courses.pop(next(iter(courses)))
+    courses[key] = entry
+
+
 def format_time(seconds: float) -> str:
     """Formate un temps en secondes vers HH:MM:SS"""
     hours = int(seconds // 3600)
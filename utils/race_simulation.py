@@ -0,0 +1,198 @@
+"""
+Module de simulation Monte Carlo des temps de course
+- Temps de base par tronçon et par type de terrain (parcours GPX ou objectif)
+- Variabilité de l'allure (forme du jour, aisance selon la pente),
+  de la fatigue et des arrêts aux ravitaillements
+- Toutes les simulations en une opération matricielle NumPy
+- Percentiles de temps d'arrivée et probabilité de barrière horaire manquée
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+# Types de terrain (bornes de pente en %)
+TERRAIN_EDGES = np.array([-15.0, -5.0, 5.0, 15.0])
+TERRAIN_NAMES = ['Descente raide', 'Descente', 'Plat', 'Montée', 'Montée raide']
+
+# Nombre maximal de simulations gardées en cache
+MAX_CACHED_SIMULATIONS = 20
+
+
+def course_terrain_seconds(course, checkpoints_km=None):
+    """
+    Temps de base (sans fatigue) par tronçon et par type de terrain
+    
+    Args:
+        course: DataFrame de PerformancePredictor.predict_course_times,
+            calculé avec fatigue_per_hour=0
+        checkpoints_km: Points de contrôle (km) délimitant les tronçons
+    
+    Returns:
+        Tuple (array n_tronçons × n_terrains de secondes, distances de fin de tronçon en km)
+    """
+    distance_km = course['distance_km'].to_numpy()
+    step_seconds = np.diff(course['elapsed_s'].to_numpy())
+    step_grade = course['grade_pct'].to_numpy()[:-1]
+    
+    checkpoints = np.asarray(sorted(checkpoints_km or []), dtype=float)
+    checkpoints = checkpoints[(checkpoints > 0) & (checkpoints < distance_km[-1])]
+    ends_km = np.append(checkpoints, distance_km[-1])
+    
+    # Tronçon et terrain de chaque pas, puis un seul bincount 2D
+    segment = np.searchsorted(checkpoints, distance_km[:-1], side='right')
+    terrain = np.digitize(step_grade, TERRAIN_EDGES)
+    n_terrains = len(TERRAIN_NAMES)
+    
+    seconds = np.bincount(
+        segment * n_terrains + terrain, weights=step_seconds, minlength=len(ends_km) * n_terrains
+    ).reshape(len(ends_km), n_terrains)
+    
+    return seconds, ends_km
+
+
+def goal_terrain_seconds(distance_km, elevation_m, pace_min_km, elevation_penalty_min_per_100m):
+    """
+    Temps de base d'un objectif sans tracé (un seul tronçon)
+    
+    Le temps à plat est attribué au terrain plat, la pénalité de D+ aux montées,
+    comme dans l'estimation des objectifs de saison.
+    
+    Args:
+        distance_km: Distance en km
+        elevation_m: Dénivelé positif en mètres
+        pace_min_km: Allure de base en min/km
+        elevation_penalty_min_per_100m: Temps supplémentaire par 100m D+
+    
+    Returns:
+        Tuple (array 1 × n_terrains de secondes, distances de fin de tronçon en km)
+    """
+    seconds = np.zeros((1, len(TERRAIN_NAMES)))
+    seconds[0, TERRAIN_NAMES.index('Plat')] = distance_km * pace_min_km * 60
+    seconds[0, TERRAIN_NAMES.index('Montée')] = elevation_m / 100 * elevation_penalty_min_per_100m * 60
+    
+    return seconds, np.array([float(distance_km)])
+
+
+def simulate_finish_times(terrain_seconds, n_simulations=10000, seed=42, pace_sd=0.05,
+                          terrain_sd=0.08, fatigue_per_hour=0.01, fatigue_sd=0.005,
+                          aid_minutes=3.0, aid_sd_minutes=2.0):
+    """
+    Simule les temps de passage à chaque point de contrôle
+    
+    Pour chaque simulation : un facteur de forme global et un facteur par
+    type de terrain (log-normaux) multiplient les temps de base, une dérive
+    de fatigue tirée au hasard est intégrée en forme fermée
+    (t = (exp(k τ) - 1) / k), et un arrêt de durée aléatoire (loi gamma)
+    est ajouté à chaque point de contrôle intermédiaire.
+    
+    Args:
+        terrain_seconds: Temps de base n_tronçons × n_terrains (secondes)
+        n_simulations: Nombre de simulations
+        seed: Graine du générateur aléatoire (reproductibilité)
+        pace_sd: Écart-type du facteur de forme global (log)
+        terrain_sd: Écart-type du facteur propre à chaque terrain (log)
+        fatigue_per_hour: Dérive de fatigue moyenne (0.01 = +1%/h)
+        fatigue_sd: Écart-type de la dérive de fatigue
+        aid_minutes: Durée moyenne d'un arrêt au ravitaillement
+        aid_sd_minutes: Écart-type de la durée d'arrêt
+    
+    Returns:
+        Array n_simulations × n_tronçons des temps de passage cumulés (secondes)
+    """
+    rng = np.random.default_rng(seed)
+    terrain_seconds = np.atleast_2d(np.asarray(terrain_seconds, dtype=float))
+    n_segments, n_terrains = terrain_seconds.shape
+    
+    # Allure : forme du jour (commune) × aisance par terrain
+    log_factors = (rng.normal(0, pace_sd, (n_simulations, 1))
+                   + rng.normal(0, terrain_sd, (n_simulations, n_terrains)))
+    base_elapsed = np.cumsum(np.exp(log_factors) @ terrain_seconds.T, axis=1)
+    
+    # Fatigue : dérive proportionnelle au temps écoulé
+    k = rng.normal(fatigue_per_hour, fatigue_sd, (n_simulations, 1)) / 3600
+    safe_k = np.where(np.abs(k) > 1e-12, k, 1.0)
+    running = np.where(np.abs(k) > 1e-12, np.expm1(k * base_elapsed) / safe_k, base_elapsed)
+    
+    # Arrêts aux points de contrôle intermédiaires
+    stops = np.zeros((n_simulations, n_segments))
+    if n_segments > 1 and aid_minutes > 0:
+        shape = (aid_minutes / max(aid_sd_minutes, 1e-6)) ** 2
+        scale = aid_minutes * 60 / shape
+        stops[:, 1:] = np.cumsum(rng.gamma(shape, scale, (n_simulations, n_segments - 1)), axis=1)
+    
+    return running + stops
+
+
+def summarize_simulation(arrivals, ends_km, cutoffs_h=None, percentiles=(10, 50, 90)):
+    """
+    Percentiles de passage et probabilité de barrière manquée
+    
+    Args:
+        arrivals: Array n_simulations × n_tronçons (simulate_finish_times)
+        ends_km: Distance de chaque point de contrôle (km)
+        cutoffs_h: Barrières horaires en heures, une par point (None si absente)
+        percentiles: Percentiles à calculer
+    
+    Returns:
+        dict avec 'checkpoints' (DataFrame : km, percentiles en secondes,
+        probabilité de dépasser la barrière) et 'miss_probability'
+        (probabilité de manquer au moins une barrière, NaN si aucune)
+    """
+    quantiles = np.percentile(arrivals, percentiles, axis=0)
+    
+    checkpoints = pd.DataFrame({'checkpoint_km': ends_km})
+    for p, values in zip(percentiles, quantiles):
+        checkpoints[f'p{p}_s'] = values
+    
+    cutoffs = np.full(len(ends_km), np.nan)
+    if cutoffs_h is not None:
+        cutoffs[:len(cutoffs_h)] = np.asarray(cutoffs_h, dtype=float)[:len(ends_km)] * 3600
+    
+    has_cutoff = np.isfinite(cutoffs)
+    late = arrivals[:, has_cutoff] > cutoffs[has_cutoff]
+    
+    checkpoints['cutoff_s'] = cutoffs
+    checkpoints['miss_probability'] = np.nan
+    checkpoints.loc[has_cutoff, 'miss_probability'] = late.mean(axis=0)
+    
+    return {
+        'checkpoints': checkpoints,
+        'miss_probability': float(late.any(axis=1).mean()) if has_cutoff.any() else np.nan
+    }
+
+
+def get_simulation(store, terrain_seconds, ends_km, cutoffs_h=None, **params):
+    """
+    Simulation mise en cache par empreinte du parcours et paramètres
+    
+    Args:
+        store: Stockage persistant entre les reruns (st.session_state)
+        terrain_seconds: Temps de base n_tronçons × n_terrains
+        ends_km: Distance de chaque point de contrôle (km)
+        cutoffs_h: Barrières horaires en heures (optionnel)
+        **params: Paramètres de simulate_finish_times
+    
+    Returns:
+        dict retourné par summarize_simulation, plus 'arrivals' (temps d'arrivée simulés)
+    """
+    terrain_seconds = np.ascontiguousarray(terrain_seconds, dtype=float)
+    course_hash = hashlib.sha1(
+        terrain_seconds.tobytes() + np.ascontiguousarray(ends_km, dtype=float).tobytes()
+    ).hexdigest()
+    key = (course_hash, tuple(cutoffs_h or ()), tuple(sorted(params.items())))
+    
+    simulations = store.setdefault('race_simulations', {})
+    
+    if key not in simulations:
+        arrivals = simulate_finish_times(terrain_seconds, **params)
+        result = summarize_simulation(arrivals, ends_km, cutoffs_h)
+        result['arrivals'] = arrivals[:, -1]
+        
+        if len(simulations) >= MAX_CACHED_SIMULATIONS:
+            simulations.pop(next(iter(simulations)))
+        simulations[key] = result
+    
+    return simulations[key]
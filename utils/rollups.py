@@ -0,0 +1,411 @@
+"""
+Module d'agrégats d'activités partagés entre les pages
+- Cumuls journaliers, hebdomadaires (semaine ISO) et mensuels
+- Distance, D+, temps, TSS, TRIMP et nombre de sorties
+- Mise à jour incrémentale quand de nouvelles activités arrivent
+- Index à sommes cumulées pour les totaux sur fenêtre quelconque
+"""
+
+import numpy as np
+import pandas as pd
+
+from .training_load import add_training_load_metrics
+
+
+class ActivityRollup:
+    """
+    Agrégats jour / semaine / mois des activités
+    
+    Les périodes sont indexées par leur date de début (datetime) :
+    jour à minuit, lundi de la semaine ISO, 1er du mois. Toutes les
+    métriques étant des sommes, un ajout d'activités (même antidatées)
+    s'additionne aux périodes existantes sans tout recalculer.
+    """
+    
+    METRICS = ['distance_km', 'elevation_gain_m', 'duration_hours', 'tss', 'trimp']
+    LEVELS = {'day': 'D', 'week': 'W-MON', 'month': 'MS'}
+    
+    # Colonnes dont une modification (correction sur Strava) invalide les agrégats
+    SIGNATURE_COLUMNS = ['id', 'start_date', 'moving_time', 'average_heartrate', 'max_heartrate'] + METRICS
+    
+    def __init__(self, df, source=None):
+        """
+        Args:
+            df: DataFrame des activités (start_date et colonnes de METRICS ;
+                les métriques absentes valent 0)
+            source: DataFrame d'origine avant préparation (empreinte des
+                activités ; défaut : df)
+        """
+        source = df if source is None else source
+        
+        self.levels = self._aggregate(df)
+        self.activity_ids = self._ids(source)
+        self.row_hashes = self._row_hashes(source)
+        self._hashed_ids = source['id'].astype(int).to_numpy() if self.activity_ids is not None else None
+        self.signature = self._signature(source, self.row_hashes)
+    
+    @staticmethod
+    def _ids(df):
+        """IDs des activités agrégées (None si certaines n'ont pas d'ID)"""
+        if 'id' not in df.columns or df['id'].isna().any():
+            return None
+        return set(df['id'].astype(int))
+    
+    @classmethod
+    def _row_hashes(cls, df):
+        """Empreinte du contenu de chaque activité (colonnes de SIGNATURE_COLUMNS présentes)"""
+        columns = [column for column in cls.SIGNATURE_COLUMNS if column in df.columns]
+        return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    
+    @classmethod
+    def _signature(cls, df, row_hashes=None):
+        """Empreinte du DataFrame : change si une activité est ajoutée, supprimée ou modifiée"""
+        row_hashes = cls._row_hashes(df) if row_hashes is None else row_hashes
+        return len(df), int(row_hashes.sum())
+    
+    @classmethod
+    def period_starts(cls, dates):
+        """
+        Début de la journée, de la semaine ISO et du mois de chaque date
+        
+        Args:
+            dates: Series de datetimes
+        
+        Returns:
+            dict {niveau: Series de datetimes}
+        """
+        days = dates.dt.normalize()
+        
+        return {
+            'day': days,
+            'week': days - pd.to_timedelta(days.dt.weekday, unit='D'),
+            'month': pd.Series(
+                days.to_numpy().astype('datetime64[M]').astype('datetime64[ns]'),
+                index=dates.index
+            )
+        }
+    
+    @classmethod
+    def _aggregate(cls, df):
+        """Agrège les activités à chaque niveau"""
+        values = pd.DataFrame(
+            {
+                metric: df[metric].to_numpy(dtype=float) if metric in df.columns else 0.0
+                for metric in cls.METRICS
+            },
+            index=df.index
+        ).fillna(0)
+        values['count'] = 1.0
+        
+        return {
+            level: values.groupby(keys.rename('period')).sum()
+            for level, keys in cls.period_starts(df['start_date']).items()
+        }
+    
+    def append(self, df_new):
+        """
+        Ajoute de nouvelles activités aux agrégats existants
+        
+        Args:
+            df_new: DataFrame des nouvelles activités
+        """
+        if df_new.empty:
+            return
+        
+        for level, aggregate in self._aggregate(df_new).items():
+            self.levels[level] = self.levels[level].add(aggregate, fill_value=0).sort_index()
+        
+        if self.activity_ids is not None:
+            new_ids = self._ids(df_new)
+            self.activity_ids = self.activity_ids | new_ids if new_ids is not None else None
+    
+    def update(self, df, prepare=None):
+        """
+        Met les agrégats en phase avec le DataFrame courant
+        
+        Si seules de nouvelles activités sont apparues, elles sont ajoutées ;
+        sinon (suppression, activité modifiée, données sans ID) tout est
+        reconstruit.
+        
+        Args:
+            df: DataFrame complet des activités
+            prepare: Fonction appliquée aux lignes à agréger (ex: calcul du TSS)
+        
+        Returns:
+            True si quelque chose a changé
+        """
+        prepare = prepare or (lambda d: d)
+        row_hashes = self._row_hashes(df)
+        signature = self._signature(df, row_hashes)
+        
+        if signature == self.signature:
+            return False
+        
+        ids = self._ids(df)
+        
+        if ids is not None and self.activity_ids is not None and self.activity_ids <= ids:
+            # Ajout pur si les activités déjà agrégées n'ont pas changé
+            current = pd.Series(row_hashes, index=df['id'].astype(int).to_numpy())
+            previous = pd.Series(self.row_hashes, index=self._hashed_ids)
+            
+            if not current.index.has_duplicates and current.reindex(previous.index).equals(previous):
+                self.append(prepare(df[~current.index.isin(previous.index)]))
+                self.row_hashes = row_hashes
+                self._hashed_ids = current.index.to_numpy()
+                self.signature = signature
+                return True
+        
+        self.__init__(prepare(df), source=df)
+        return True
+    
+    def get(self, level='week', start=None, end=None, fill=True):
+        """
+        Agrégats d'un niveau, éventuellement restreints à une période
+        
+        Args:
+            level: 'day', 'week' ou 'month'
+            start: Début (inclus) de la période (optionnel)
+            end: Fin (incluse) de la période (optionnel)
+            fill: Inclure les périodes sans activité (valeurs à 0)
+        
+        Returns:
+            DataFrame indexé par début de période
+        """
+        aggregate = self.levels[level]
+        
+        if fill and not aggregate.empty:
+            full_range = pd.date_range(
+                aggregate.index.min(), aggregate.index.max(), freq=self.LEVELS[level]
+            )
+            aggregate = aggregate.reindex(full_range, fill_value=0)
+            aggregate.index.name = 'period'
+        
+        if start is not None:
+            aggregate = aggregate[aggregate.index >= pd.Timestamp(start)]
+        if end is not None:
+            aggregate = aggregate[aggregate.index <= pd.Timestamp(end)]
+        
+        return aggregate
+
+
+class ActivityIndex:
+    """
+    Totaux sur fenêtres de dates arbitraires en O(log n)
+    
+    Les activités sont triées par date et chaque métrique est stockée sous
+    forme de somme cumulée : le total d'une fenêtre [début, fin[ se lit avec
+    deux searchsorted et une soustraction, pour autant de fenêtres que voulu
+    en un seul appel. Les valeurs manquantes ou infinies sont exclues des
+    sommes et comptées à part, pour que les moyennes les ignorent.
+    """
+    
+    COLUMNS = ['distance_km', 'elevation_gain_m', 'duration_hours', 'tss', 'deniv_percent']
+    
+    def __init__(self, df):
+        """
+        Args:
+            df: DataFrame des activités (start_date et colonnes de COLUMNS ;
+                les colonnes absentes valent 0)
+        """
+        df = df.sort_values('start_date')
+        
+        self.times = df['start_date'].to_numpy(dtype='datetime64[ns]')
+        self.values = {
+            column: df[column].to_numpy(dtype=float) if column in df.columns else np.zeros(len(df))
+            for column in self.COLUMNS
+        }
+        finite = {column: np.isfinite(values) for column, values in self.values.items()}
+        self.cumsums = {
+            column: np.concatenate(([0.0], np.cumsum(np.where(finite[column], values, 0.0))))
+            for column, values in self.values.items()
+        }
+        self.finite_counts = {
+            column: np.concatenate(([0], np.cumsum(mask)))
+            for column, mask in finite.items()
+        }
+    
+    def __len__(self):
+        return len(self.times)
+    
+    def bounds(self, starts=None, ends=None):
+        """
+        Positions (début inclus, fin exclue) des fenêtres dans l'index trié
+        
+        Args:
+            starts: Début(s) des fenêtres, inclus (None = depuis le début)
+            ends: Fin(s) des fenêtres, exclue(s) (None = jusqu'à la fin)
+        
+        Returns:
+            Tuple (lo, hi) d'arrays de positions
+        """
+        lo = (np.searchsorted(self.times, _as_datetimes(starts), side='left')
+              if starts is not None else np.zeros(1, dtype=int))
+        hi = (np.searchsorted(self.times, _as_datetimes(ends), side='left')
+              if ends is not None else np.full(1, len(self.times)))
+        
+        return np.broadcast_arrays(lo, hi)
+    
+    def window_sums(self, starts=None, ends=None):
+        """
+        Totaux de chaque fenêtre [début, fin[
+        
+        Args:
+            starts: Début(s) des fenêtres (scalaire ou liste de dates)
+            ends: Fin(s) des fenêtres (scalaire ou liste de dates)
+        
+        Returns:
+            DataFrame avec une ligne par fenêtre : une colonne par métrique
+            (somme) et 'count' (nombre de sorties)
+        """
+        lo, hi = self.bounds(starts, ends)
+        
+        sums = pd.DataFrame({
+            column: cumsum[hi] - cumsum[lo]
+            for column, cumsum in self.cumsums.items()
+        })
+        sums['count'] = hi - lo
+        
+        return sums
+    
+    def window_means(self, starts=None, ends=None):
+        """
+        Moyennes de chaque fenêtre [début, fin[ sur les seules valeurs finies
+        
+        Args:
+            starts: Début(s) des fenêtres (scalaire ou liste de dates)
+            ends: Fin(s) des fenêtres (scalaire ou liste de dates)
+        
+        Returns:
+            DataFrame avec une ligne par fenêtre et une colonne par métrique
+            (NaN si la fenêtre ne contient aucune valeur finie)
+        """
+        lo, hi = self.bounds(starts, ends)
+        
+        means = {}
+        for column, cumsum in self.cumsums.items():
+            counts = self.finite_counts[column][hi] - self.finite_counts[column][lo]
+            totals = cumsum[hi] - cumsum[lo]
+            means[column] = np.divide(
+                totals, counts, out=np.full(len(totals), np.nan), where=counts > 0
+            )
+        
+        return pd.DataFrame(means)
+    
+    def window_max(self, column, start=None, end=None):
+        """
+        Maximum d'une métrique sur une fenêtre (lecture d'une tranche contiguë)
+        
+        Args:
+            column: Métrique (une des COLUMNS)
+            start: Début de la fenêtre, inclus
+            end: Fin de la fenêtre, exclue
+        
+        Returns:
+            Maximum (NaN si la fenêtre est vide)
+        """
+        lo, hi = self.bounds(start, end)
+        window = self.values[column][lo[0]:hi[0]]
+        
+        return float(np.nanmax(window)) if len(window) else np.nan
+
+
+def _as_datetimes(dates):
+    """Convertit une date ou une liste de dates en array datetime64[ns]"""
+    return np.atleast_1d(pd.to_datetime(dates)).astype('datetime64[ns]')
+
+
+def get_activity_rollup(store, df, name='activities', version=None, prepare=None):
+    """
+    Retourne les agrégats partagés, construits une fois par version de données
+    
+    Args:
+        store: Stockage persistant entre les reruns (st.session_state)
+        df: DataFrame complet des activités
+        name: Nom des agrégats (un jeu par calcul de charge différent)
+        version: Clé de paramétrage (ex: réglages FC) : reconstruit si elle change
+        prepare: Fonction appliquée aux lignes à agréger (ex: calcul du TSS)
+    
+    Returns:
+        ActivityRollup à jour
+    """
+    rollups = store.setdefault('activity_rollups', {})
+    entry = rollups.get(name)
+    
+    if entry is None or entry[0] != version:
+        rollup = ActivityRollup(prepare(df) if prepare else df, source=df)
+        rollups[name] = (version, rollup)
+        return rollup
+    
+    rollup = entry[1]
+    rollup.update(df, prepare)
+    return rollup
+
+
+def get_shared_rollup(store, df):
+    """
+    Agrégats par défaut partagés par toutes les pages
+    
+    Le TSS/TRIMP utilise les réglages FC par défaut et les streams FC en cache
+    (store['stream_cache']) ; les agrégats sont reconstruits quand le cache change.
+    
+    Args:
+        store: Stockage persistant entre les reruns (st.session_state)
+        df: DataFrame complet des activités
+    
+    Returns:
+        ActivityRollup à jour
+    """
+    stream_cache = store.get('stream_cache')
+    
+    return get_activity_rollup(
+        store,
+        df,
+        version=stream_cache.version if stream_cache is not None else 0,
+        prepare=lambda rows: add_training_load_metrics(rows, stream_cache=stream_cache)
+    )
+
+
+def get_activity_index(store, df, name='activities', version=None, prepare=None):
+    """
+    Index à sommes cumulées, reconstruit seulement quand les données changent
+    
+    Args:
+        store: Stockage persistant entre les reruns (st.session_state)
+        df: DataFrame complet des activités
+        name: Nom de l'index (un par calcul de charge différent)
+        version: Clé de paramétrage (ex: réglages FC) : reconstruit si elle change
+        prepare: Fonction appliquée aux activités avant indexation (ex: calcul du TSS)
+    
+    Returns:
+        ActivityIndex à jour
+    """
+    indexes = store.setdefault('activity_indexes', {})
+    key = (version, ActivityRollup._signature(df))
+    entry = indexes.get(name)
+    
+    if entry is None or entry[0] != key:
+        entry = (key, ActivityIndex(prepare(df) if prepare else df))
+        indexes[name] = entry
+    
+    return entry[1]
+
+
+def get_shared_index(store, df):
+    """
+    Index par défaut partagé par toutes les pages (mêmes réglages que get_shared_rollup)
+    
+    Args:
+        store: Stockage persistant entre les reruns (st.session_state)
+        df: DataFrame complet des activités
+    
+    Returns:
+        ActivityIndex à jour
+    """
+    stream_cache = store.get('stream_cache')
+    
+    return get_activity_index(
+        store,
+        df,
+        version=stream_cache.version if stream_cache is not None else 0,
+        prepare=lambda rows: add_training_load_metrics(rows, stream_cache=stream_cache)
+    )
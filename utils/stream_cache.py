@@ -0,0 +1,116 @@
+"""
+Module de cache des streams Strava
+- Conservation en mémoire des streams déjà téléchargés (par activité)
+- Accès direct aux streams sous forme d'arrays numpy
+- Numéro de version pour invalider les calculs dérivés
+"""
+
+import numpy as np
+
+
+# Streams utiles aux analyses sur tout l'historique (charge, zones, efforts, pentes)
+ANALYSIS_STREAM_TYPES = ['time', 'distance', 'altitude', 'heartrate', 'velocity_smooth']
+
+
+class StreamCache:
+    """Cache mémoire des streams d'activités (à conserver dans st.session_state)"""
+    
+    def __init__(self):
+        self._streams = {}
+        self._arrays = {}
+        self._unavailable = {}
+        self._revisions = {}
+        self.version = 0
+    
+    def __contains__(self, activity_id):
+        return int(activity_id) in self._streams
+    
+    def __len__(self):
+        return len(self._streams)
+    
+    def activity_ids(self):
+        """Liste des IDs d'activités en cache"""
+        return list(self._streams)
+    
+    def get(self, activity_id, stream_types=None):
+        """
+        Retourne les streams en cache d'une activité
+        
+        Args:
+            activity_id: ID de l'activité Strava
+            stream_types: Types de streams requis (None = aucun prérequis)
+        
+        Returns:
+            dict des streams (format Strava key_by_type) ou None si absent
+            ou incomplet
+        """
+        streams = self._streams.get(int(activity_id))
+        
+        if streams is None:
+            return None
+        
+        # Strava n'envoie pas les streams indisponibles (ex: pas de ceinture) :
+        # une clé absente après un téléchargement complet reste absente
+        if stream_types is not None:
+            missing = set(stream_types) - set(streams) - self._unavailable.get(int(activity_id), set())
+            if missing:
+                return None
+        
+        return streams
+    
+    def put(self, activity_id, streams, requested_types=None):
+        """
+        Ajoute (ou complète) les streams d'une activité
+        
+        Args:
+            activity_id: ID de l'activité Strava
+            streams: dict des streams (format Strava key_by_type)
+            requested_types: Types demandés à l'API (pour mémoriser les absents)
+        """
+        activity_id = int(activity_id)
+        merged = dict(self._streams.get(activity_id, {}))
+        merged.update(streams)
+        
+        if requested_types is not None:
+            unavailable = self._unavailable.get(activity_id, set()) | set(requested_types)
+            self._unavailable[activity_id] = unavailable - set(merged)
+        
+        self._streams[activity_id] = merged
+        self._arrays.pop(activity_id, None)
+        self.version += 1
+        self._revisions[activity_id] = self.version
+    
+    def revision(self, activity_id):
+        """Version du cache lors de la dernière modification des streams d'une activité"""
+        return self._revisions.get(int(activity_id))
+    
+    def array(self, activity_id, stream_type):
+        """
+        Stream d'une activité sous forme d'array numpy (converti une seule fois)
+        
+        Args:
+            activity_id: ID de l'activité Strava
+            stream_type: Type de stream ('time', 'heartrate', ...)
+        
+        Returns:
+            np.ndarray ou None si le stream n'est pas en cache
+        """
+        activity_id = int(activity_id)
+        streams = self._streams.get(activity_id)
+        
+        if streams is None or stream_type not in streams:
+            return None
+        
+        arrays = self._arrays.setdefault(activity_id, {})
+        if stream_type not in arrays:
+            arrays[stream_type] = np.asarray(streams[stream_type]['data'], dtype=float)
+        
+        return arrays[stream_type]
+    
+    def clear(self):
+        """Vide le cache"""
+        self._streams.clear()
+        self._arrays.clear()
+        self._unavailable.clear()
+        self._revisions.clear()
+        self.version += 1
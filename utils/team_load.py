@@ -0,0 +1,196 @@
+"""
+Module de charge d'entraînement multi-athlètes (usage club / coach)
+- Calcul du TSS de chaque athlète en parallèle (pool de processus)
+- Matrice dates × athlètes du TSS journalier
+- ATL/CTL/TSB de tous les athlètes en une seule passe EWM
+- Tableau de synthèse de l'équipe
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .training_load import (
+    TrainingLoadCalculator,
+    add_training_load_metrics,
+    find_overreaching_episodes
+)
+
+
+def _daily_tss_chunk(job):
+    """
+    Calcule le TSS journalier d'un lot d'athlètes partageant les mêmes
+    paramètres FC (exécuté dans un processus du pool)
+    
+    Args:
+        job: Tuple (df, fc_max, fc_repos, gender), df contenant une colonne 'athlete'
+    
+    Returns:
+        Series de TSS indexée par (athlete, date)
+    """
+    df, fc_max, fc_repos, gender = job
+    
+    df_with_load = add_training_load_metrics(df, fc_max, fc_repos, gender)
+    days = df_with_load['start_date'].dt.normalize().rename('date')
+    
+    return df_with_load.groupby([df_with_load['athlete'], days])['tss'].sum()
+
+
+class TeamLoadEngine:
+    """Calcule ATL/CTL/TSB pour tout un groupe d'athlètes à la fois"""
+    
+    # En dessous de ce nombre d'athlètes, le pool coûte plus cher qu'il ne rapporte
+    MIN_ATHLETES_FOR_POOL = 8
+    
+    def __init__(self, atl_days=7, ctl_days=42, max_workers=None):
+        """
+        Args:
+            atl_days: Span EWM de l'ATL
+            ctl_days: Span EWM de la CTL
+            max_workers: Nombre de processus (None = nombre de CPU)
+        """
+        self.calculator = TrainingLoadCalculator(atl_days=atl_days, ctl_days=ctl_days)
+        self.max_workers = max_workers or os.cpu_count() or 1
+    
+    def daily_tss_matrix(self, activities_by_athlete, athlete_settings=None, end_date=None):
+        """
+        Aligne le TSS journalier de tous les athlètes dans une matrice dates × athlètes
+        
+        Args:
+            activities_by_athlete: dict {athlete_id: DataFrame des activités}
+            athlete_settings: dict {athlete_id: {'fc_max', 'fc_repos', 'gender'}} (optionnel)
+            end_date: Dernier jour de la matrice (défaut : dernière activité du groupe)
+        
+        Returns:
+            DataFrame (dates × athlètes) : NaN avant la première activité
+            de chaque athlète, 0 les jours sans activité ensuite
+        """
+        athlete_settings = athlete_settings or {}
+        
+        # Regroupement des athlètes par paramètres FC : un seul calcul vectorisé par groupe
+        groups = {}
+        for athlete_id, df in activities_by_athlete.items():
+            if df is None or df.empty:
+                continue
+            settings = athlete_settings.get(athlete_id, {})
+            key = (
+                settings.get('fc_max', 190),
+                settings.get('fc_repos', 50),
+                settings.get('gender', 'M')
+            )
+            groups.setdefault(key, []).append(df.assign(athlete=athlete_id))
+        
+        if not groups:
+            return pd.DataFrame()
+        
+        n_athletes = sum(len(frames) for frames in groups.values())
+        use_pool = n_athletes >= self.MIN_ATHLETES_FOR_POOL and self.max_workers > 1
+        
+        # Découpage en lots : au moins un lot par processus quand le pool est utilisé
+        jobs = []
+        for (fc_max, fc_repos, gender), frames in groups.items():
+            n_chunks = min(len(frames), self.max_workers) if use_pool else 1
+            for chunk in np.array_split(np.arange(len(frames)), n_chunks):
+                chunk_df = pd.concat([frames[i] for i in chunk], ignore_index=True)
+                jobs.append((chunk_df, fc_max, fc_repos, gender))
+        
+        if use_pool:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                results = list(pool.map(_daily_tss_chunk, jobs))
+        else:
+            results = [_daily_tss_chunk(job) for job in jobs]
+        
+        matrix = pd.concat(results).unstack(level='athlete')
+        matrix.columns.name = None
+        
+        last_date = pd.Timestamp(end_date).normalize() if end_date is not None else matrix.index.max()
+        matrix = matrix.reindex(pd.date_range(matrix.index.min(), last_date, freq='D'))
+        
+        # 0 entre les activités, NaN tant que l'athlète n'a pas commencé
+        started = matrix.notna().cummax()
+        return matrix.fillna(0).where(started)
+    
+    def compute(self, activities_by_athlete, athlete_settings=None, end_date=None):
+        """
+        Calcule ATL/CTL/TSB de tous les athlètes
+        
+        La récursion EWM est appliquée à toutes les colonnes de la matrice
+        en une seule fois.
+        
+        Args:
+            activities_by_athlete: dict {athlete_id: DataFrame des activités}
+            athlete_settings: dict {athlete_id: {'fc_max', 'fc_repos', 'gender'}} (optionnel)
+            end_date: Dernier jour du calcul (défaut : dernière activité du groupe)
+        
+        Returns:
+            dict avec 'daily_tss', 'ATL', 'CTL', 'TSB' (DataFrames dates × athlètes)
+            et 'overview' (tableau de synthèse, une ligne par athlète)
+        """
+        daily_tss = self.daily_tss_matrix(activities_by_athlete, athlete_settings, end_date)
+        
+        if daily_tss.empty:
+            return None
+        
+        atl = daily_tss.ewm(alpha=self.calculator.atl_alpha, adjust=False).mean()
+        ctl = daily_tss.ewm(alpha=self.calculator.ctl_alpha, adjust=False).mean()
+        tsb = ctl - atl
+        
+        return {
+            'daily_tss': daily_tss,
+            'ATL': atl,
+            'CTL': ctl,
+            'TSB': tsb,
+            'overview': self.team_overview(daily_tss, atl, ctl, tsb)
+        }
+    
+    def team_overview(self, daily_tss, atl, ctl, tsb, recent_days=28, threshold_days=7, tsb_threshold=-30):
+        """
+        Tableau de synthèse : état actuel de chaque athlète
+        
+        Args:
+            daily_tss, atl, ctl, tsb: DataFrames dates × athlètes
+            recent_days: Fenêtre de recherche des épisodes de surcharge récents
+            threshold_days: Nombre minimal de jours consécutifs d'un épisode
+            tsb_threshold: Seuil de TSB d'un épisode (mêmes valeurs que la page Charge)
+        
+        Returns:
+            DataFrame avec une ligne par athlète
+        """
+        last_activity = daily_tss.where(daily_tss > 0).apply(pd.Series.last_valid_index)
+        
+        overview = pd.DataFrame({
+            'athlete': daily_tss.columns,
+            'last_activity': last_activity.to_numpy(),
+            'ATL': atl.iloc[-1].round(1).to_numpy(),
+            'CTL': ctl.iloc[-1].round(1).to_numpy(),
+            'TSB': tsb.iloc[-1].round(1).to_numpy(),
+            'tss_7d': daily_tss.tail(7).sum().round(0).to_numpy(),
+            'ramp_rate': (ctl.iloc[-1] - ctl.iloc[-8]).round(2).to_numpy() if len(ctl) > 7 else np.nan
+        })
+        
+        overview['status'] = [
+            self.calculator.interpret_tsb(value)['status'] if pd.notna(value) else None
+            for value in overview['TSB']
+        ]
+        
+        # Épisodes de surcharge récents, détectés pour tous les athlètes en une passe
+        long_load = pd.DataFrame({
+            'athlete': np.repeat(daily_tss.columns.to_numpy(), len(daily_tss)),
+            'date': np.tile(daily_tss.index.to_numpy(), daily_tss.shape[1]),
+            'ATL': atl.to_numpy().T.ravel(),
+            'TSB': tsb.to_numpy().T.ravel()
+        }).dropna()
+        
+        episodes = find_overreaching_episodes(
+            long_load, threshold_days=threshold_days, tsb_threshold=tsb_threshold, athlete_column='athlete'
+        )
+        recent_cutoff = daily_tss.index[-1] - pd.Timedelta(days=recent_days)
+        recent_episodes = episodes[episodes['end'] >= recent_cutoff]
+        
+        overview['recent_overreaching'] = overview['athlete'].map(
+            recent_episodes.groupby('athlete').size()
+        ).fillna(0).astype(int)
+        
+        return overview.sort_values('TSB').reset_index(drop=True)
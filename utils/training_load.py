@@ -5,6 +5,8 @@ Module de calcul de charge d'entraînement
 - ATL/CTL/TSB (Acute/Chronic Training Load, Training Stress Balance)
 """
 
+import time
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -13,17 +15,51 @@ from datetime import datetime, timedelta
 class TrainingLoadCalculator:
     """Calcule les métriques de charge d'entraînement"""
     
-    def __init__(self, fc_max=190, fc_repos=50, seuil_fc=None):
+    # Facteurs d'intensité standards
+    INTENSITY_FACTORS = {
+        'easy': 0.65,       # IF ~ 0.65 → 42 TSS/h
+        'moderate': 0.75,   # IF ~ 0.75 → 56 TSS/h
+        'hard': 0.85,       # IF ~ 0.85 → 72 TSS/h
+        'very_hard': 0.95,  # IF ~ 0.95 → 90 TSS/h
+        'max': 1.05         # IF ~ 1.05 → 110 TSS/h
+    }
+    
+    # Au-delà de cet écart entre deux échantillons de stream, on considère une pause
+    MAX_STREAM_GAP_S = 30
+    
+    # Zones FC (bornes basses, en fraction de la référence de chaque méthode)
+    HR_ZONE_NAMES = ['Z1 Récupération', 'Z2 Endurance', 'Z3 Tempo', 'Z4 Seuil', 'Z5 VO2max']
+    HR_ZONE_METHODS = {
+        'seuil': [0.81, 0.90, 0.94, 1.00],     # % FC seuil (Friel)
+        'reserve': [0.60, 0.70, 0.80, 0.90],   # % FC de réserve (Karvonen)
+        'fc_max': [0.60, 0.70, 0.80, 0.90]     # % FC max
+    }
+    
+    def __init__(self, fc_max=190, fc_repos=50, seuil_fc=None, atl_days=7, ctl_days=42):
         """
         Args:
             fc_max: Fréquence cardiaque maximale
             fc_repos: Fréquence cardiaque au repos
             seuil_fc: FC au seuil lactique (si None, estimée à 85% FCmax)
+            atl_days: Constante de temps de l'ATL en jours (span EWM)
+            ctl_days: Constante de temps de la CTL en jours (span EWM)
         """
         self.fc_max = fc_max
         self.fc_repos = fc_repos
         self.seuil_fc = seuil_fc or int(fc_max * 0.85)
         self.fc_reserve = fc_max - fc_repos
+        self.atl_days = atl_days
+        self.ctl_days = ctl_days
+    
+    @property
+    def atl_alpha(self):
+        """Coefficient de lissage EWM de l'ATL : α = 2/(span+1)"""
+        return 2 / (self.atl_days + 1)
+    
+    @property
+    def ctl_alpha(self):
+        """Coefficient de lissage EWM de la CTL : α = 2/(span+1)"""
+        return 2 / (self.ctl_days + 1)
     
     def calculate_trimp(self, duration_minutes, avg_hr, gender='M'):
         """
@@ -94,26 +130,90 @@ class TrainingLoadCalculator:
         Returns:
             TSS estimé
         """
-        # Facteurs d'intensité standards
-        intensity_factors = {
-            'easy': 0.65,       # IF ~ 0.65 → 42 TSS/h
-            'moderate': 0.75,   # IF ~ 0.75 → 56 TSS/h
-            'hard': 0.85,       # IF ~ 0.85 → 72 TSS/h
-            'very_hard': 0.95,  # IF ~ 0.95 → 90 TSS/h
-            'max': 1.05         # IF ~ 1.05 → 110 TSS/h
-        }
-        
         # Si on a la FC, on calcule l'IF réel
         if avg_hr and avg_hr > 0:
             if_value = avg_hr / self.seuil_fc
         else:
-            if_value = intensity_factors.get(intensity, 0.75)
+            if_value = self.INTENSITY_FACTORS.get(intensity, 0.75)
         
         duration_hours = duration_minutes / 60
         tss = duration_hours * (if_value ** 2) * 100
         
         return round(tss, 1)
     
+    def hr_zone_bounds(self, method='seuil'):
+        """
+        Bornes basses des zones 2 à 5 en bpm
+        
+        Args:
+            method: 'seuil' (% FC seuil), 'reserve' (% FC de réserve) ou 'fc_max' (% FC max)
+        
+        Returns:
+            np.ndarray de 4 bornes croissantes (bpm)
+        """
+        fractions = np.array(self.HR_ZONE_METHODS[method])
+        
+        if method == 'seuil':
+            return fractions * self.seuil_fc
+        if method == 'reserve':
+            return self.fc_repos + fractions * self.fc_reserve
+        return fractions * self.fc_max
+    
+    def calculate_stream_loads(self, time_streams, hr_streams, gender='M'):
+        """
+        TRIMP et hrTSS intégrés seconde par seconde sur les streams FC
+        
+        Chaque échantillon est pondéré par l'intervalle de temps qui le précède ;
+        les trous supérieurs à MAX_STREAM_GAP_S (pauses) ne sont pas comptés.
+        Tous les streams sont concaténés et intégrés en une seule passe
+        (np.add.reduceat).
+        
+        Args:
+            time_streams: Liste des streams 'time' (secondes), un par activité
+            hr_streams: Liste des streams 'heartrate' correspondants
+            gender: 'M' ou 'F' (facteur de pondération du TRIMP)
+        
+        Returns:
+            Tuple (trimp, tss) d'arrays, un élément par activité
+            (NaN si le stream est inexploitable)
+        """
+        n_activities = len(time_streams)
+        trimp = np.full(n_activities, np.nan)
+        tss = np.full(n_activities, np.nan)
+        
+        lengths = np.array([
+            min(len(t), len(hr)) if t is not None and hr is not None else 0
+            for t, hr in zip(time_streams, hr_streams)
+        ], dtype=int)
+        usable = np.flatnonzero(lengths >= 2)
+        
+        if len(usable) == 0:
+            return trimp, tss
+        
+        time_s = np.concatenate([np.asarray(time_streams[i], dtype=float)[:lengths[i]] for i in usable])
+        hr = np.concatenate([np.asarray(hr_streams[i], dtype=float)[:lengths[i]] for i in usable])
+        starts = np.concatenate(([0], np.cumsum(lengths[usable])[:-1]))
+        
+        # Intervalle précédant chaque échantillon (0 au début de chaque activité)
+        dt = np.diff(time_s, prepend=time_s[0])
+        dt[starts] = 0
+        dt[(dt < 0) | (dt > self.MAX_STREAM_GAP_S)] = 0
+        hr = np.nan_to_num(hr)
+        
+        # TRIMP : Σ dt_min × HR ratio × 0.64 × e^(y × HR ratio)
+        hr_ratio = np.clip((hr - self.fc_repos) / self.fc_reserve, 0, 1)
+        y_factor = 1.92 if gender == 'M' else 1.67
+        trimp_samples = dt / 60 * hr_ratio * 0.64 * np.exp(y_factor * hr_ratio)
+        
+        # hrTSS : Σ dt_h × IF² × 100 (IF instantané = FC / FC seuil)
+        intensity_factor = np.clip(hr / self.seuil_fc, 0, 2)
+        tss_samples = dt / 3600 * intensity_factor ** 2 * 100
+        
+        trimp[usable] = np.round(np.add.reduceat(trimp_samples, starts), 1)
+        tss[usable] = np.round(np.add.reduceat(tss_samples, starts), 1)
+        
+        return trimp, tss
+    
     def calculate_atl_ctl_tsb(self, df, tss_column='tss'):
         """
         Calcule ATL (Acute Training Load), CTL (Chronic Training Load) et TSB
@@ -132,41 +232,60 @@ class TrainingLoadCalculator:
         Returns:
             DataFrame avec colonnes ATL, CTL, TSB ajoutées
         """
-        df = df.copy()
-        df = df.sort_values('start_date')
+        daily_tss = self.daily_tss_series(df, tss_column)
         
-        # Création d'un index journalier complet (pour gérer les jours sans activité)
-        date_range = pd.date_range(
-            start=df['start_date'].min().date(),
-            end=df['start_date'].max().date(),
-            freq='D'
-        )
+        # Calcul des EWM (Exponentially Weighted Moving Average)
+        # ATL (7 jours) → α = 2/(7+1) ≈ 0.25
+        # CTL (42 jours) → α = 2/(42+1) ≈ 0.047
+        atl = ewm_from_state(daily_tss.values, self.atl_alpha)
+        ctl = ewm_from_state(daily_tss.values, self.ctl_alpha)
+        
+        return self.build_load_frame(daily_tss, atl, ctl)
+    
+    def daily_tss_series(self, df, tss_column='tss'):
+        """
+        Agrège le TSS par jour sur un index journalier complet
+        (les jours sans activité valent 0)
+        
+        Args:
+            df: DataFrame avec colonnes 'start_date' et tss_column
+            tss_column: Nom de la colonne TSS
+        
+        Returns:
+            Series de TSS journalier indexée par date (DatetimeIndex)
+        """
+        dates = df['start_date'].dt.normalize()
+        date_range = pd.date_range(start=dates.min(), end=dates.max(), freq='D')
         
-        # Agrégation du TSS par jour
-        df['date'] = df['start_date'].dt.date
-        daily_tss = df.groupby('date')[tss_column].sum().reindex(
-            date_range.date, 
+        daily_tss = df[tss_column].groupby(dates).sum().reindex(
+            date_range,
             fill_value=0
         )
         
-        # Calcul des EWM (Exponentially Weighted Moving Average)
-        # ATL (7 jours) → α = 2/(7+1) ≈ 0.25
-        # CTL (42 jours) → α = 2/(42+1) ≈ 0.047
+        return daily_tss.astype(float)
+    
+    def build_load_frame(self, daily_tss, atl, ctl):
+        """
+        Construit le DataFrame de charge à partir des séries non arrondies
         
-        atl = daily_tss.ewm(span=7, adjust=False).mean()
-        ctl = daily_tss.ewm(span=42, adjust=False).mean()
-        tsb = ctl - atl
+        Args:
+            daily_tss: Series de TSS journalier (index journalier)
+            atl: Valeurs ATL (array)
+            ctl: Valeurs CTL (array)
         
-        # Création du DataFrame de résultats
-        load_df = pd.DataFrame({
-            'date': date_range,
+        Returns:
+            DataFrame avec colonnes date, daily_tss, ATL, CTL, TSB
+        """
+        atl = np.asarray(atl, dtype=float)
+        ctl = np.asarray(ctl, dtype=float)
+        
+        return pd.DataFrame({
+            'date': daily_tss.index,
             'daily_tss': daily_tss.values,
-            'ATL': atl.round(1),
-            'CTL': ctl.round(1),
-            'TSB': tsb.round(1)
+            'ATL': np.round(atl, 1),
+            'CTL': np.round(ctl, 1),
+            'TSB': np.round(ctl - atl, 1)
         })
-        
-        return load_df
     
     def interpret_tsb(self, tsb_value):
         """
@@ -209,45 +328,38 @@ class TrainingLoadCalculator:
                 'recommendation': '⚠️ Risque de surcharge, repos nécessaire !'
             }
     
-    def detect_overreaching(self, load_df, threshold_days=7, tsb_threshold=-30):
+    def detect_overreaching(self, load_df, threshold_days=7, tsb_threshold=-30, atl_percentile=0.9,
+                            critical_margin=10):
         """
-        Détecte les périodes de surcharge potentielle
+        Détecte les épisodes de surcharge potentielle
+        
+        Un épisode est une suite d'au moins threshold_days jours consécutifs
+        avec un TSB sous tsb_threshold et une ATL au-dessus de son percentile
+        atl_percentile. Un seul avertissement est émis par épisode.
         
         Args:
             load_df: DataFrame avec ATL/CTL/TSB
-            threshold_days: Nombre de jours consécutifs de TSB négatif
+            threshold_days: Nombre minimal de jours consécutifs
             tsb_threshold: Seuil de TSB considéré comme critique
+            atl_percentile: Percentile d'ATL au-dessus duquel la charge est élevée
+            critical_margin: Un épisode est critique si son TSB min descend
+                plus de critical_margin points sous tsb_threshold
         
         Returns:
-            Liste des périodes à risque
+            Liste des épisodes à risque (début, fin, durée, profondeur)
         """
-        warnings = []
+        episodes = find_overreaching_episodes(
+            load_df, threshold_days, tsb_threshold, atl_percentile
+        )
         
-        # Détection de TSB très négatif
-        critical_periods = load_df[load_df['TSB'] < tsb_threshold]
-        
-        if len(critical_periods) > 0:
-            for _, row in critical_periods.iterrows():
-                warnings.append({
-                    'date': row['date'],
-                    'tsb': row['TSB'],
-                    'type': 'critical',
-                    'message': f"TSB critique ({row['TSB']:.1f}) - Risque de surcharge"
-                })
-        
-        # Détection de pics d'ATL (fatigue aiguë)
-        atl_90th = load_df['ATL'].quantile(0.9)
-        high_atl = load_df[load_df['ATL'] > atl_90th]
-        
-        for _, row in high_atl.iterrows():
-            if row['TSB'] < -10:
-                warnings.append({
-                    'date': row['date'],
-                    'atl': row['ATL'],
-                    'tsb': row['TSB'],
-                    'type': 'high_load',
-                    'message': f"Charge élevée (ATL: {row['ATL']:.1f})"
-                })
+        warnings = []
+        for episode in episodes.to_dict('records'):
+            episode['type'] = 'critical' if episode['depth'] < tsb_threshold - critical_margin else 'high_load'
+            episode['message'] = (
+                f"{episode['duration_days']} jours de surcharge "
+                f"(TSB min : {episode['depth']:.1f}, ATL max : {episode['peak_atl']:.1f})"
+            )
+            warnings.append(episode)
         
         return warnings
     
@@ -269,6 +381,581 @@ class TrainingLoadCalculator:
         load_df['ramp_rate'] = (load_df['ctl_change'] / window * 7).round(2)
         
         return load_df
+    
+    def calculate_acwr(self, load_df, acute_days=7, chronic_days=28):
+        """
+        Ratio charge aiguë / charge chronique (ACWR)
+        
+        Deux variantes sur le TSS journalier :
+        - moyennes glissantes (fenêtres calculées par sommes cumulées)
+        - moyennes exponentielles, α = 2/(N+1)
+        
+        Zone optimale ~0.8-1.3, risque de blessure accru au-delà de 1.5
+        
+        Args:
+            load_df: DataFrame avec colonnes date et daily_tss (journalier complet)
+            acute_days: Fenêtre aiguë en jours
+            chronic_days: Fenêtre chronique en jours
+        
+        Returns:
+            DataFrame avec colonnes date, acute_load, chronic_load,
+            acwr_rolling et acwr_ewma
+        """
+        daily_tss = load_df['daily_tss'].to_numpy(dtype=float)
+        
+        acute = rolling_sum(daily_tss, acute_days) / acute_days
+        chronic = rolling_sum(daily_tss, chronic_days) / chronic_days
+        
+        acute_ewma = ewm_from_state(daily_tss, 2 / (acute_days + 1))
+        chronic_ewma = ewm_from_state(daily_tss, 2 / (chronic_days + 1))
+        
+        # Pas de ratio tant que la fenêtre chronique n'est pas complète
+        chronic_ewma = np.where(np.arange(len(daily_tss)) >= chronic_days - 1, chronic_ewma, np.nan)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            acwr_rolling = np.where(chronic > 0, acute / chronic, np.nan)
+            acwr_ewma = np.where(chronic_ewma > 0, acute_ewma / chronic_ewma, np.nan)
+        
+        return pd.DataFrame({
+            'date': load_df['date'].to_numpy(),
+            'acute_load': np.round(acute, 1),
+            'chronic_load': np.round(chronic, 1),
+            'acwr_rolling': np.round(acwr_rolling, 2),
+            'acwr_ewma': np.round(acwr_ewma, 2)
+        })
+    
+    def calculate_monotony_strain(self, load_df, window=7):
+        """
+        Monotonie et contrainte (strain) de Foster
+        
+        Monotonie = moyenne / écart-type du TSS journalier sur la fenêtre
+        Strain = TSS cumulé sur la fenêtre × monotonie
+        
+        Moyenne et variance sont obtenues par sommes cumulées de x et x².
+        Une monotonie > 2 signale un entraînement trop uniforme.
+        
+        Args:
+            load_df: DataFrame avec colonnes date et daily_tss (journalier complet)
+            window: Fenêtre en jours
+        
+        Returns:
+            DataFrame avec colonnes date, weekly_tss, monotony et strain
+        """
+        daily_tss = load_df['daily_tss'].to_numpy(dtype=float)
+        
+        total = rolling_sum(daily_tss, window)
+        total_sq = rolling_sum(daily_tss ** 2, window)
+        
+        # Écart-type échantillon (ddof=1), comme pandas rolling().std()
+        variance = np.maximum(total_sq - total ** 2 / window, 0) / (window - 1)
+        std = np.sqrt(variance)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            monotony = np.where(std > 1e-9, total / window / std, np.nan)
+        
+        return pd.DataFrame({
+            'date': load_df['date'].to_numpy(),
+            'weekly_tss': np.round(total, 1),
+            'monotony': np.round(monotony, 2),
+            'strain': np.round(total * monotony, 0)
+        })
+    
+    def project_load_batch(self, atl0, ctl0, planned_tss):
+        """
+        Projette ATL/CTL/TSB pour un ou plusieurs plans de TSS journalier
+        
+        Propagation EWM sous forme fermée (aucune boucle jour par jour) :
+        y[t] = (1-α)^(t+1) × y0 + Σ_{k≤t} α × (1-α)^(t-k) × x[k]
+        Tous les plans sont évalués en un seul produit matriciel.
+        
+        Args:
+            atl0: ATL la veille du premier jour planifié (scalaire ou array (n_plans,))
+            ctl0: CTL la veille du premier jour planifié (scalaire ou array (n_plans,))
+            planned_tss: TSS planifié, array (n_jours,) ou (n_plans, n_jours)
+        
+        Returns:
+            dict avec 'ATL', 'CTL', 'TSB' : arrays (n_plans, n_jours) non arrondis
+        """
+        plans = np.atleast_2d(np.asarray(planned_tss, dtype=float))
+        n_days = plans.shape[1]
+        
+        atl0 = np.asarray(atl0, dtype=float).reshape(-1, 1)
+        ctl0 = np.asarray(ctl0, dtype=float).reshape(-1, 1)
+        
+        atl_kernel, atl_decay = _ewm_propagation(self.atl_alpha, n_days)
+        ctl_kernel, ctl_decay = _ewm_propagation(self.ctl_alpha, n_days)
+        
+        atl = plans @ atl_kernel.T + atl0 * atl_decay
+        ctl = plans @ ctl_kernel.T + ctl0 * ctl_decay
+        
+        return {
+            'ATL': atl,
+            'CTL': ctl,
+            'TSB': ctl - atl
+        }
+    
+    def project_load(self, atl0, ctl0, planned_tss, start_date):
+        """
+        Projette ATL/CTL/TSB pour un plan de TSS journalier
+        
+        Args:
+            atl0: ATL la veille de start_date
+            ctl0: CTL la veille de start_date
+            planned_tss: TSS planifié par jour (array ou liste)
+            start_date: Premier jour du plan
+        
+        Returns:
+            DataFrame avec colonnes date, planned_tss, ATL, CTL, TSB
+        """
+        planned_tss = np.asarray(planned_tss, dtype=float)
+        projection = self.project_load_batch(atl0, ctl0, planned_tss)
+        
+        return pd.DataFrame({
+            'date': pd.date_range(start=pd.Timestamp(start_date).normalize(), periods=len(planned_tss), freq='D'),
+            'planned_tss': planned_tss,
+            'ATL': np.round(projection['ATL'][0], 1),
+            'CTL': np.round(projection['CTL'][0], 1),
+            'TSB': np.round(projection['TSB'][0], 1)
+        })
+    
+    def optimize_taper(self, atl0, ctl0, base_daily_tss, target_tsb=(5, 25),
+                       taper_days_range=(4, 21), volume_reduction_range=(0.2, 0.7),
+                       intensity_range=(0.9, 1.1), time_budget_s=1.0,
+                       batch_size=2000, seed=0):
+        """
+        Recherche le plan d'affûtage qui maximise la CTL le jour de course
+        tout en arrivant avec un TSB dans la bande cible
+        
+        Un candidat est défini par sa durée d'affûtage, sa réduction de volume
+        (appliquée progressivement jusqu'à la veille de la course) et un facteur
+        d'intensité (TSS ∝ IF²). Les candidats sont tirés par lots et chaque lot
+        est évalué en une seule projection EWM vectorisée, jusqu'à épuisement
+        du budget de temps.
+        
+        Args:
+            atl0: ATL la veille du premier jour du plan
+            ctl0: CTL la veille du premier jour du plan
+            base_daily_tss: TSS journalier prévu sans affûtage, jusqu'à la veille de la course
+            target_tsb: Bande de TSB visée le jour de course (min, max)
+            taper_days_range: Durée d'affûtage possible en jours (min, max)
+            volume_reduction_range: Réduction de volume en fin d'affûtage (min, max)
+            intensity_range: Facteur d'intensité pendant l'affûtage (min, max)
+            time_budget_s: Budget de temps de recherche en secondes
+            batch_size: Nombre de candidats évalués par lot
+            seed: Graine du générateur aléatoire
+        
+        Returns:
+            dict avec les paramètres du meilleur plan, son TSS journalier,
+            sa projection et l'état le jour de course
+        """
+        base_daily_tss = np.asarray(base_daily_tss, dtype=float)
+        n_days = len(base_daily_tss)
+        
+        if n_days == 0:
+            return None
+        
+        rng = np.random.default_rng(seed)
+        min_days = min(taper_days_range[0], n_days)
+        max_days = min(taper_days_range[1], n_days)
+        tsb_low, tsb_high = target_tsb
+        day_index = np.arange(n_days)
+        
+        best = None
+        n_evaluated = 0
+        deadline = time.perf_counter() + time_budget_s
+        
+        while best is None or time.perf_counter() < deadline:
+            taper_days = rng.integers(min_days, max_days + 1, batch_size)
+            reduction = rng.uniform(*volume_reduction_range, batch_size)
+            intensity = rng.uniform(*intensity_range, batch_size)
+            
+            # Progression de l'affûtage : 0 avant, puis linéaire jusqu'à 1 la veille de la course
+            taper_start = n_days - taper_days
+            progress = (day_index[np.newaxis, :] - taper_start[:, np.newaxis] + 1) / taper_days[:, np.newaxis]
+            in_taper = progress > 0
+            
+            multipliers = np.where(
+                in_taper,
+                (1 - reduction[:, np.newaxis] * progress) * intensity[:, np.newaxis] ** 2,
+                1.0
+            )
+            plans = base_daily_tss[np.newaxis, :] * multipliers
+            
+            projection = self.project_load_batch(atl0, ctl0, plans)
+            race_ctl = projection['CTL'][:, -1]
+            race_tsb = projection['TSB'][:, -1]
+            
+            # Pénalité proportionnelle à l'écart à la bande de TSB visée
+            band_gap = np.maximum(tsb_low - race_tsb, 0) + np.maximum(race_tsb - tsb_high, 0)
+            scores = race_ctl - 10 * band_gap
+            
+            best_idx = int(np.argmax(scores))
+            n_evaluated += batch_size
+            
+            if best is None or scores[best_idx] > best['score']:
+                best = {
+                    'score': float(scores[best_idx]),
+                    'taper_days': int(taper_days[best_idx]),
+                    'volume_reduction': float(reduction[best_idx]),
+                    'intensity': float(intensity[best_idx]),
+                    'planned_tss': plans[best_idx],
+                    'race_ctl': float(race_ctl[best_idx]),
+                    'race_atl': float(projection['ATL'][best_idx, -1]),
+                    'race_tsb': float(race_tsb[best_idx]),
+                    'in_band': bool(band_gap[best_idx] == 0)
+                }
+        
+        best['n_evaluated'] = n_evaluated
+        
+        return best
+
+
+def find_overreaching_episodes(load_df, threshold_days=7, tsb_threshold=-30,
+                               atl_percentile=0.9, athlete_column=None):
+    """
+    Détecte les épisodes de surcharge par encodage des séries (run-length)
+    
+    Entièrement vectorisé : fonctionne sur des historiques journaliers de
+    plusieurs années et sur plusieurs athlètes à la fois (format long avec
+    une colonne identifiant l'athlète, lignes triées par athlète puis date).
+    
+    Args:
+        load_df: DataFrame avec colonnes date, ATL, TSB (index journalier complet)
+        threshold_days: Nombre minimal de jours consécutifs
+        tsb_threshold: Seuil de TSB
+        atl_percentile: Percentile d'ATL (calculé par athlète)
+        athlete_column: Colonne identifiant l'athlète (None = un seul athlète)
+    
+    Returns:
+        DataFrame avec une ligne par épisode : (athlete,) start, end,
+        duration_days, depth (TSB min), peak_atl
+    """
+    columns = ['start', 'end', 'duration_days', 'depth', 'peak_atl']
+    if athlete_column is not None:
+        columns = [athlete_column] + columns
+    
+    if load_df.empty:
+        return pd.DataFrame(columns=columns)
+    
+    tsb = load_df['TSB'].to_numpy(dtype=float)
+    atl = load_df['ATL'].to_numpy(dtype=float)
+    dates = load_df['date'].to_numpy()
+    
+    if athlete_column is None:
+        groups = np.zeros(len(load_df), dtype=int)
+        atl_limit = np.quantile(atl, atl_percentile)
+    else:
+        groups = pd.factorize(load_df[athlete_column], sort=True)[0]
+        atl_limit = load_df.groupby(athlete_column)['ATL'].quantile(atl_percentile).to_numpy()[groups]
+    
+    at_risk = (tsb < tsb_threshold) & (atl > atl_limit)
+    
+    # Début de série : jour à risque dont la veille ne l'est pas (ou autre athlète)
+    previous = np.concatenate(([False], at_risk[:-1]))
+    same_group = np.concatenate(([False], groups[1:] == groups[:-1]))
+    run_start = at_risk & ~(previous & same_group)
+    
+    risk_idx = np.flatnonzero(at_risk)
+    if risk_idx.size == 0:
+        return pd.DataFrame(columns=columns)
+    
+    # Bornes des séries dans le tableau des jours à risque
+    bounds = np.flatnonzero(run_start[risk_idx])
+    lengths = np.diff(np.append(bounds, risk_idx.size))
+    
+    first = risk_idx[bounds]
+    last = risk_idx[bounds + lengths - 1]
+    depth = np.minimum.reduceat(tsb[risk_idx], bounds)
+    peak_atl = np.maximum.reduceat(atl[risk_idx], bounds)
+    
+    keep = lengths >= threshold_days
+    
+    episodes = pd.DataFrame({
+        'start': dates[first[keep]],
+        'end': dates[last[keep]],
+        'duration_days': lengths[keep],
+        'depth': depth[keep],
+        'peak_atl': peak_atl[keep]
+    })
+    
+    if athlete_column is not None:
+        episodes.insert(0, athlete_column, load_df[athlete_column].to_numpy()[first[keep]])
+    
+    return episodes
+
+
+# Modèles de plans (semaines de charge + semaines de récupération)
+PLAN_TEMPLATES = {
+    '3 semaines charge + 1 récupération': {'build_weeks': 3, 'recovery_weeks': 1},
+    '2 semaines charge + 1 récupération': {'build_weeks': 2, 'recovery_weeks': 1},
+    'Maintien': {'build_weeks': 1, 'recovery_weeks': 0}
+}
+
+# Répartition du TSS hebdomadaire du lundi au dimanche (repos lundi, sortie longue dimanche)
+DEFAULT_WEEK_PATTERN = [0.0, 0.15, 0.15, 0.10, 0.15, 0.15, 0.30]
+
+
+def build_plan_from_template(n_days, weekly_tss, template='3 semaines charge + 1 récupération',
+                             start_date=None, build_increase=0.08, recovery_factor=0.6,
+                             week_pattern=None):
+    """
+    Génère un plan de TSS journalier à partir d'un modèle de périodisation
+    
+    Chaque cycle enchaîne des semaines de charge progressives (+build_increase
+    par semaine) puis des semaines de récupération (× recovery_factor).
+    Les cycles suivants repartent du niveau atteint au cycle précédent.
+    
+    Args:
+        n_days: Nombre de jours à planifier
+        weekly_tss: TSS hebdomadaire de base (scalaire ou array (n_plans,))
+        template: Nom du modèle (clé de PLAN_TEMPLATES)
+        start_date: Premier jour du plan (pour aligner les jours de la semaine)
+        build_increase: Augmentation hebdomadaire pendant les semaines de charge
+        recovery_factor: Facteur appliqué aux semaines de récupération
+        week_pattern: Répartition du TSS sur les 7 jours (lundi → dimanche)
+    
+    Returns:
+        Array (n_jours,) ou (n_plans, n_jours) de TSS journalier
+    """
+    params = PLAN_TEMPLATES.get(template, PLAN_TEMPLATES['Maintien'])
+    build_weeks = params['build_weeks']
+    cycle_weeks = build_weeks + params['recovery_weeks']
+    
+    pattern = np.asarray(week_pattern or DEFAULT_WEEK_PATTERN, dtype=float)
+    pattern = pattern / pattern.sum()
+    
+    first_weekday = pd.Timestamp(start_date).weekday() if start_date is not None else 0
+    day_offsets = np.arange(n_days)
+    weekdays = (first_weekday + day_offsets) % 7
+    
+    # Les semaines commencent le lundi : la première semaine peut être partielle
+    weeks = (first_weekday + day_offsets) // 7
+    position = weeks % cycle_weeks
+    cycle = weeks // cycle_weeks
+    
+    if build_weeks == 1 and cycle_weeks == 1:
+        # Maintien : charge constante
+        multipliers = np.ones(n_days)
+    else:
+        build_increase = np.asarray(build_increase, dtype=float)
+        multipliers = np.where(
+            position < build_weeks,
+            (1 + build_increase) ** (cycle + np.minimum(position, build_weeks - 1)),
+            (1 + build_increase) ** cycle * recovery_factor
+        )
+    
+    weekly_tss = np.asarray(weekly_tss, dtype=float)
+    plan = weekly_tss[..., np.newaxis] * multipliers * pattern[weekdays]
+    
+    return plan
+
+
+def _ewm_propagation(alpha, n_days):
+    """
+    Matrices de propagation EWM sur n_days jours
+    
+    Returns:
+        (kernel, decay) : kernel[t, k] = α (1-α)^(t-k) pour k ≤ t, decay[t] = (1-α)^(t+1)
+    """
+    return _ewm_propagation_cached(round(alpha, 12), n_days)
+
+
+@lru_cache(maxsize=16)
+def _ewm_propagation_cached(alpha, n_days):
+    """Matrices de _ewm_propagation, en lecture seule car partagées entre sessions"""
+    lags = np.arange(n_days)[:, np.newaxis] - np.arange(n_days)[np.newaxis, :]
+    kernel = np.where(lags >= 0, alpha * (1 - alpha) ** np.maximum(lags, 0), 0.0)
+    decay = (1 - alpha) ** np.arange(1, n_days + 1)
+    
+    kernel.setflags(write=False)
+    decay.setflags(write=False)
+    
+    return kernel, decay
+
+
+def ewm_from_state(values, alpha, initial_state=None):
+    """
+    Moyenne mobile exponentielle (adjust=False) reprise depuis un état connu
+    
+    y[t] = (1 - α) × y[t-1] + α × x[t]
+    
+    Args:
+        values: Valeurs journalières à intégrer (array)
+        alpha: Coefficient de lissage
+        initial_state: Valeur de l'EWM la veille du premier jour
+                       (si None, la récursion démarre sur la première valeur)
+    
+    Returns:
+        Array des valeurs EWM pour chaque jour de values
+    """
+    values = np.asarray(values, dtype=float)
+    
+    if initial_state is None:
+        return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    
+    # On préfixe l'état connu : l'EWM pandas repart exactement de cette valeur
+    seeded = np.concatenate(([initial_state], values))
+    return pd.Series(seeded).ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+def rolling_sum(values, window):
+    """
+    Somme glissante sur window jours par différence de sommes cumulées
+    
+    Args:
+        values: Valeurs journalières (array)
+        window: Taille de la fenêtre
+    
+    Returns:
+        Array de même longueur (NaN tant que la fenêtre n'est pas complète)
+    """
+    values = np.asarray(values, dtype=float)
+    cumsum = np.concatenate(([0.0], np.cumsum(values)))
+    
+    sums = np.full(len(values), np.nan)
+    if len(values) >= window:
+        sums[window - 1:] = cumsum[window:] - cumsum[:-window]
+    
+    return sums
+
+
+class IncrementalLoadEngine:
+    """
+    Moteur ATL/CTL/TSB incrémental
+    
+    Conserve, par athlète et par jeu de paramètres, le TSS journalier et les
+    états ATL/CTL de chaque jour. Une mise à jour ne fait avancer la récursion
+    EWM que sur les nouveaux jours ; une activité antidatée ne relance le calcul
+    qu'à partir du jour modifié.
+    """
+    
+    def __init__(self):
+        self._states = {}
+    
+    @staticmethod
+    def state_key(athlete_id, calculator, tss_column='tss', variant=None):
+        """
+        Clé d'état : athlète + paramètres influant sur le TSS et les EWM
+        
+        Args:
+            athlete_id: Identifiant de l'athlète (ex: strava_id)
+            calculator: Instance de TrainingLoadCalculator
+            tss_column: Colonne de TSS utilisée
+            variant: Paramètre supplémentaire du calcul de TSS (ex: genre)
+        """
+        return (
+            athlete_id, tss_column, variant,
+            calculator.fc_max, calculator.fc_repos, calculator.seuil_fc,
+            calculator.atl_days, calculator.ctl_days
+        )
+    
+    def update(self, athlete_id, df, calculator, tss_column='tss', variant=None):
+        """
+        Met à jour l'état de l'athlète et retourne la charge journalière
+        
+        Args:
+            athlete_id: Identifiant de l'athlète
+            df: DataFrame des activités avec 'start_date' et tss_column
+            calculator: Instance de TrainingLoadCalculator
+            tss_column: Nom de la colonne TSS
+            variant: Paramètre supplémentaire du calcul de TSS (ex: genre)
+        
+        Returns:
+            DataFrame identique à TrainingLoadCalculator.calculate_atl_ctl_tsb
+            (à ne pas modifier : il est renvoyé tel quel si rien n'a changé)
+        """
+        key = self.state_key(athlete_id, calculator, tss_column, variant)
+        state = self._states.get(key)
+        
+        # Activités inchangées depuis le dernier appel : ni agrégation ni comparaison
+        signature = self._signature(df, tss_column)
+        if state is not None and state['signature'] == signature:
+            state['recomputed_days'] = 0
+            return state['frame']
+        
+        daily_tss = calculator.daily_tss_series(df, tss_column)
+        new_values = daily_tss.values
+        
+        start_pos = self._first_changed_day(state, daily_tss)
+        
+        if state is not None and start_pos >= len(new_values):
+            # Rien de nouveau (ou historique simplement tronqué en fin)
+            atl = state['atl'][:len(new_values)]
+            ctl = state['ctl'][:len(new_values)]
+        else:
+            prev_atl = state['atl'][start_pos - 1] if start_pos > 0 else None
+            prev_ctl = state['ctl'][start_pos - 1] if start_pos > 0 else None
+            
+            new_atl = ewm_from_state(new_values[start_pos:], calculator.atl_alpha, prev_atl)
+            new_ctl = ewm_from_state(new_values[start_pos:], calculator.ctl_alpha, prev_ctl)
+            
+            if start_pos > 0:
+                atl = np.concatenate((state['atl'][:start_pos], new_atl))
+                ctl = np.concatenate((state['ctl'][:start_pos], new_ctl))
+            else:
+                atl, ctl = new_atl, new_ctl
+        
+        frame = calculator.build_load_frame(daily_tss, atl, ctl)
+        
+        self._states[key] = {
+            'signature': signature,
+            'frame': frame,
+            'daily_tss': daily_tss,
+            'atl': atl,
+            'ctl': ctl,
+            'last_date': daily_tss.index[-1],
+            'last_atl': float(atl[-1]),
+            'last_ctl': float(ctl[-1]),
+            'recomputed_days': max(0, len(new_values) - start_pos)
+        }
+        
+        return frame
+    
+    def get_state(self, athlete_id, calculator, tss_column='tss', variant=None):
+        """
+        Retourne le dernier état connu (last_date, last_atl, last_ctl, ...)
+        ou None si l'athlète n'a jamais été calculé avec ces paramètres
+        """
+        key = self.state_key(athlete_id, calculator, tss_column, variant)
+        return self._states.get(key)
+    
+    def invalidate(self, athlete_id=None):
+        """Supprime les états d'un athlète (ou de tous si athlete_id est None)"""
+        if athlete_id is None:
+            self._states.clear()
+        else:
+            self._states = {
+                key: state for key, state in self._states.items()
+                if key[0] != athlete_id
+            }
+    
+    @staticmethod
+    def _signature(df, tss_column):
+        """Empreinte des dates et TSS des activités (indépendante de l'ordre des lignes)"""
+        hashes = pd.util.hash_pandas_object(df[['start_date', tss_column]], index=False)
+        return len(df), int(hashes.to_numpy().sum())
+    
+    @staticmethod
+    def _first_changed_day(state, daily_tss):
+        """Position du premier jour dont le TSS diffère de l'état stocké"""
+        if state is None:
+            return 0
+        
+        old_tss = state['daily_tss']
+        
+        # Nouvelle date de début (activité antérieure à tout l'historique) → tout recalculer
+        if old_tss.index[0] != daily_tss.index[0]:
+            return 0
+        
+        n_common = min(len(old_tss), len(daily_tss))
+        changed = np.flatnonzero(
+            ~np.isclose(old_tss.values[:n_common], daily_tss.values[:n_common])
+        )
+        
+        if changed.size > 0:
+            return int(changed[0])
+        
+        return n_common
 
 
 def estimate_intensity_from_data(row, calculator):
@@ -313,8 +1000,84 @@ def estimate_intensity_from_data(row, calculator):
     return 'moderate'
 
 
+def estimate_intensity_series(df, calculator):
+    """
+    Version vectorisée de estimate_intensity_from_data
+    
+    Args:
+        df: DataFrame des activités
+        calculator: Instance de TrainingLoadCalculator
+    
+    Returns:
+        Series d'intensités estimées ('easy', 'moderate', 'hard', 'very_hard')
+    """
+    conditions = []
+    choices = []
+    
+    # Si on a la FC
+    if 'average_heartrate' in df.columns:
+        avg_hr = df['average_heartrate'].to_numpy(dtype=float)
+        has_hr = ~np.isnan(avg_hr) & (avg_hr > 0)
+        hr_percent = avg_hr / calculator.fc_max
+        
+        conditions += [
+            has_hr & (hr_percent < 0.70),
+            has_hr & (hr_percent < 0.80),
+            has_hr & (hr_percent < 0.90),
+            has_hr
+        ]
+        choices += ['easy', 'moderate', 'hard', 'very_hard']
+    
+    # Sinon, basé sur la vitesse et le D+
+    if 'speed_kmh' in df.columns and 'deniv_percent' in df.columns:
+        distance_km = df['distance_km'].to_numpy(dtype=float)
+        speed_kmh = df['speed_kmh'].to_numpy(dtype=float)
+        deniv_percent = df['deniv_percent'].to_numpy(dtype=float)
+        
+        conditions += [
+            (distance_km > 20) & (speed_kmh < 8),
+            deniv_percent > 10,
+            (distance_km < 10) & (speed_kmh > 11)
+        ]
+        choices += ['easy', 'hard', 'hard']
+    
+    if not conditions:
+        return pd.Series('moderate', index=df.index)
+    
+    return pd.Series(np.select(conditions, choices, default='moderate'), index=df.index)
+
+
 # Fonctions utilitaires pour Streamlit
-def add_training_load_metrics(df, fc_max=190, fc_repos=50, gender='M'):
+def compute_stream_loads(df, stream_cache, calculator, gender='M'):
+    """
+    TRIMP et hrTSS issus des streams FC en cache, pour toutes les activités du DataFrame
+    
+    Args:
+        df: DataFrame des activités (colonne 'id')
+        stream_cache: Instance de StreamCache
+        calculator: Instance de TrainingLoadCalculator
+        gender: Genre pour le TRIMP
+    
+    Returns:
+        DataFrame avec colonnes trimp et tss, aligné sur l'index de df
+        (NaN pour les activités sans stream FC en cache)
+    """
+    if 'id' not in df.columns:
+        return pd.DataFrame({'trimp': np.nan, 'tss': np.nan}, index=df.index)
+    
+    time_streams = []
+    hr_streams = []
+    for activity_id in df['id']:
+        cached = pd.notna(activity_id) and activity_id in stream_cache
+        time_streams.append(stream_cache.array(activity_id, 'time') if cached else None)
+        hr_streams.append(stream_cache.array(activity_id, 'heartrate') if cached else None)
+    
+    trimp, tss = calculator.calculate_stream_loads(time_streams, hr_streams, gender)
+    
+    return pd.DataFrame({'trimp': trimp, 'tss': tss}, index=df.index)
+
+
+def add_training_load_metrics(df, fc_max=190, fc_repos=50, gender='M', stream_cache=None):
     """
     Ajoute toutes les métriques de charge d'entraînement au DataFrame
     
@@ -323,6 +1086,9 @@ def add_training_load_metrics(df, fc_max=190, fc_repos=50, gender='M'):
         fc_max: FC max
         fc_repos: FC repos
         gender: Genre pour le TRIMP
+        stream_cache: Instance de StreamCache (optionnel) : quand le stream FC
+                      d'une activité est en cache, le TRIMP et le hrTSS
+                      intégrés sur le stream remplacent l'estimation par la FC moyenne
     
     Returns:
         DataFrame enrichi
@@ -331,26 +1097,45 @@ def add_training_load_metrics(df, fc_max=190, fc_repos=50, gender='M'):
     
     df = df.copy()
     
+    # Calculs vectorisés (mêmes formules que calculate_trimp / calculate_tss_hr /
+    # calculate_tss_simplified, appliquées à toutes les lignes à la fois)
+    duration_minutes = df['duration_hours'].to_numpy(dtype=float) * 60
+    
+    if 'average_heartrate' in df.columns:
+        avg_hr = df['average_heartrate'].to_numpy(dtype=float)
+    else:
+        avg_hr = np.zeros(len(df))
+    
+    has_hr = ~np.isnan(avg_hr)
+    hr_valid = has_hr & (avg_hr != 0)
+    
     # Calcul TRIMP
-    df['trimp'] = df.apply(
-        lambda row: calculator.calculate_trimp(
-            row['duration_hours'] * 60,
-            row.get('average_heartrate', 0),
-            gender
-        ) if pd.notna(row.get('average_heartrate', 0)) else 0,
-        axis=1
-    )
+    hr_ratio = np.clip((avg_hr - calculator.fc_repos) / calculator.fc_reserve, 0, 1)
+    y_factor = 1.92 if gender == 'M' else 1.67
+    trimp = duration_minutes * hr_ratio * 0.64 * np.exp(y_factor * hr_ratio)
+    df['trimp'] = np.where(hr_valid, np.round(trimp, 1), 0.0)
+    
+    # Calcul TSS : FC si disponible, sinon intensité estimée
+    intensity_factor = np.clip(avg_hr / calculator.seuil_fc, 0, 2)
+    tss_hr = (duration_minutes / 60) * intensity_factor ** 2 * 100
     
-    # Calcul TSS
-    df['tss'] = df.apply(
-        lambda row: calculator.calculate_tss_hr(
-            row['duration_hours'] * 60,
-            row.get('average_heartrate', 0)
-        ) if pd.notna(row.get('average_heartrate', 0)) else calculator.calculate_tss_simplified(
-            row['duration_hours'] * 60,
-            intensity=estimate_intensity_from_data(row, calculator)
-        ),
-        axis=1
+    estimated_if = estimate_intensity_series(df, calculator).map(
+        TrainingLoadCalculator.INTENSITY_FACTORS
+    ).to_numpy(dtype=float)
+    tss_simplified = (duration_minutes / 60) * estimated_if ** 2 * 100
+    
+    df['tss'] = np.where(
+        has_hr,
+        np.where(hr_valid, np.round(tss_hr, 1), 0.0),
+        np.round(tss_simplified, 1)
     )
+    df['load_source'] = 'summary'
+    
+    # Les streams FC en cache priment sur l'estimation par la FC moyenne
+    if stream_cache is not None and len(stream_cache) > 0:
+        stream_loads = compute_stream_loads(df, stream_cache, calculator, gender)
+        from_stream = stream_loads['tss'].notna()
+        df.loc[from_stream, ['trimp', 'tss']] = stream_loads.loc[from_stream, ['trimp', 'tss']]
+        df.loc[from_stream, 'load_source'] = 'stream'
     
     return df
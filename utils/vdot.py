@@ -0,0 +1,227 @@
+"""
+Module VDOT (équations de Daniels & Gilbert)
+- Coût en oxygène d'une vitesse de course et fraction de VO2max tenable
+  selon la durée de l'effort
+- VDOT d'une performance en forme fermée, vectorisé sur des tableaux
+  de (distance, temps)
+- Temps prédit pour un VDOT par itérations de Newton vectorisées
+- Chronologie du VDOT de toutes les sorties et meilleurs efforts,
+  mise à jour au fil de l'historique
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Coût en oxygène (ml/kg/min) selon la vitesse v (m/min) : a + b v + c v²
+OXYGEN_COST = (-4.60, 0.182258, 0.000104)
+
+# Fraction de VO2max tenable selon la durée t (min) : base + Σ amplitude × exp(-taux × t)
+DROP_DEAD_BASE = 0.8
+DROP_DEAD_TERMS = ((0.1894393, 0.012778), (0.2989558, 0.1932605))
+
+# Itérations de Newton et tolérance (minutes) pour l'inversion VDOT → temps
+NEWTON_ITERATIONS = 30
+NEWTON_TOLERANCE_MIN = 1e-6
+
+
+def oxygen_cost(velocity_m_min):
+    """
+    Coût en oxygène de la course à une vitesse donnée
+    
+    Args:
+        velocity_m_min: Vitesse(s) en m/min
+    
+    Returns:
+        VO2 en ml/kg/min
+    """
+    a, b, c = OXYGEN_COST
+    v = np.asarray(velocity_m_min, dtype=float)
+    return a + b * v + c * v ** 2
+
+
+def drop_dead_fraction(duration_min):
+    """
+    Fraction de VO2max tenable pendant une durée donnée
+    
+    Args:
+        duration_min: Durée(s) de l'effort en minutes
+    
+    Returns:
+        Fraction de VO2max (≈ 1 pour 11 min, 0.8 pour un effort très long)
+    """
+    t = np.asarray(duration_min, dtype=float)
+    return DROP_DEAD_BASE + sum(amplitude * np.exp(-rate * t) for amplitude, rate in DROP_DEAD_TERMS)
+
+
+def vdot_from_performance(distance_m, time_s):
+    """
+    VDOT d'une ou plusieurs performances, en forme fermée
+    
+    Args:
+        distance_m: Distance(s) en mètres
+        time_s: Temps en secondes (même forme que distance_m, ou diffusable)
+    
+    Returns:
+        VDOT (array, NaN pour les temps ou distances non positifs)
+    """
+    distance_m, time_s = np.broadcast_arrays(np.asarray(distance_m, dtype=float),
+                                             np.asarray(time_s, dtype=float))
+    valid = (distance_m > 0) & (time_s > 0)
+    t = np.where(valid, time_s, 60.0) / 60
+    
+    vdot = oxygen_cost(distance_m / t) / drop_dead_fraction(t)
+    return np.where(valid, vdot, np.nan)
+
+
+def time_from_vdot(distance_m, vdot):
+    """
+    Temps prédit sur une ou plusieurs distances pour un ou plusieurs VDOT
+    
+    Résout VO2(d / t) = VDOT × fraction(t) par la méthode de Newton, toutes
+    les paires (distance, VDOT) à la fois. Le point de départ suppose que
+    l'effort est tenu à 90 % de VO2max, ce qui suffit pour converger en
+    quelques itérations du 800 m à l'ultra.
+    
+    Args:
+        distance_m: Distance(s) en mètres
+        vdot: VDOT (même forme que distance_m, ou diffusable)
+    
+    Returns:
+        Temps en secondes (array, NaN pour les entrées non positives)
+    """
+    distance_m, vdot = np.broadcast_arrays(np.asarray(distance_m, dtype=float),
+                                           np.asarray(vdot, dtype=float))
+    valid = (distance_m > 0) & (vdot > 0)
+    d = np.where(valid, distance_m, 1000.0)
+    target = np.where(valid, vdot, 50.0)
+    a, b, c = OXYGEN_COST
+    
+    # Départ : vitesse dont le coût vaut 90 % du VDOT (racine positive du trinôme)
+    v0 = (-b + np.sqrt(b ** 2 - 4 * c * (a - 0.9 * target))) / (2 * c)
+    t = d / v0
+    
+    for _ in range(NEWTON_ITERATIONS):
+        v = d / t
+        residual = oxygen_cost(v) - target * drop_dead_fraction(t)
+        
+        # Dérivées par rapport à t du coût (v = d / t) et de la fraction tenable
+        d_cost = -(b + 2 * c * v) * v / t
+        d_fraction = -sum(amplitude * rate * np.exp(-rate * t) for amplitude, rate in DROP_DEAD_TERMS)
+        
+        step = residual / (d_cost - target * d_fraction)
+        t = np.maximum(t - step, t / 2)
+        
+        if np.all(np.abs(step) < NEWTON_TOLERANCE_MIN):
+            break
+    
+    return np.where(valid, t * 60, np.nan)
+
+
+class VDOTTimeline:
+    """
+    VDOT de chaque effort exploitable de l'historique
+    
+    Sont retenues les sorties roulantes complètes et les meilleurs efforts
+    extraits des streams (BestEffortStore). Seuls les efforts nouveaux ou
+    modifiés depuis la dernière mise à jour sont calculés, en un seul
+    appel vectorisé.
+    """
+    
+    # En dessous, les équations surestiment le VDOT (effort trop anaérobie)
+    MIN_EFFORT_DISTANCE_M = 1500
+    
+    def __init__(self, min_distance_km=3.0, max_deniv_percent=2.0):
+        """
+        Args:
+            min_distance_km: Distance minimale d'une sortie complète
+            max_deniv_percent: % D+ maximal de la sortie (le VDOT n'a pas de sens en montagne)
+        """
+        self.min_distance_km = min_distance_km
+        self.max_deniv_percent = max_deniv_percent
+        self.efforts = pd.DataFrame(columns=['id', 'source', 'distance_m', 'seconds', 'vdot'])
+    
+    def update(self, df, best_effort_store=None):
+        """
+        Calcule le VDOT des efforts nouveaux ou modifiés
+        
+        Args:
+            df: DataFrame des activités (id, distance_km, distance_m, moving_time, deniv_percent)
+            best_effort_store: Instance de BestEffortStore synchronisée (optionnel)
+        
+        Returns:
+            Nombre d'efforts (re)calculés
+        """
+        flat = df[(df['deniv_percent'] <= self.max_deniv_percent) & (df['moving_time'] > 0)]
+        flat = flat.dropna(subset=['id']).astype({'id': int})
+        
+        runs = flat[flat['distance_km'] >= self.min_distance_km]
+        candidates = [pd.DataFrame({
+            'id': runs['id'].to_numpy(),
+            'source': 'Sortie',
+            'distance_m': runs['distance_m'].to_numpy(dtype=float),
+            'seconds': runs['moving_time'].to_numpy(dtype=float)
+        })]
+        
+        if best_effort_store is not None and not best_effort_store.efforts.empty:
+            efforts = best_effort_store.efforts.infer_objects().astype({'id': int})
+            efforts = efforts[efforts['id'].isin(flat['id'])
+                              & (efforts['distance_m'] >= self.MIN_EFFORT_DISTANCE_M)]
+            candidates.append(pd.DataFrame({
+                'id': efforts['id'].to_numpy(),
+                'source': efforts['effort'].to_numpy(),
+                'distance_m': efforts['distance_m'].to_numpy(dtype=float),
+                'seconds': efforts['seconds'].to_numpy(dtype=float)
+            }))
+        
+        candidates = pd.concat(candidates, ignore_index=True)
+        
+        # Efforts déjà calculés à l'identique : conservés ; les autres sont (re)calculés
+        keys = ['id', 'source', 'distance_m', 'seconds']
+        merged = candidates.merge(self.efforts.infer_objects(), on=keys, how='left')
+        new = merged['vdot'].isna().to_numpy()
+        
+        merged.loc[new, 'vdot'] = vdot_from_performance(
+            merged.loc[new, 'distance_m'].to_numpy(), merged.loc[new, 'seconds'].to_numpy()
+        )
+        self.efforts = merged[self.efforts.columns]
+        
+        return int(new.sum())
+    
+    def trend(self, df, freq='W', window_days=90, percentile=100):
+        """
+        Tendance de forme : VDOT glissant, relevé à la fin de chaque période
+        
+        Args:
+            df: DataFrame des activités (colonnes 'id' et 'start_date')
+            freq: Période d'agrégation ('W' semaine, 'M' mois)
+            window_days: Fenêtre glissante en jours
+            percentile: Percentile du VDOT dans la fenêtre (100 = maximum)
+        
+        Returns:
+            DataFrame indexé par début de période : vdot_best (meilleur VDOT de
+            la période), vdot_trend (VDOT glissant en fin de période), count
+        """
+        columns = ['vdot_best', 'vdot_trend', 'count']
+        
+        if self.efforts.empty:
+            return pd.DataFrame(columns=columns)
+        
+        activities = df[['id', 'start_date']].dropna(subset=['id']).astype({'id': int})
+        efforts = self.efforts.infer_objects().merge(activities, on='id', how='inner')
+        efforts = efforts[np.isfinite(efforts['vdot'])].sort_values('start_date')
+        
+        if efforts.empty:
+            return pd.DataFrame(columns=columns)
+        
+        vdots = pd.Series(efforts['vdot'].to_numpy(), index=pd.DatetimeIndex(efforts['start_date']))
+        window = vdots.rolling(f'{window_days}D')
+        rolling = window.max() if percentile >= 100 else window.quantile(percentile / 100)
+        
+        periods = vdots.index.to_period(freq).start_time.rename('period')
+        
+        return pd.DataFrame({
+            'vdot_best': vdots.groupby(periods).max(),
+            'vdot_trend': rolling.groupby(periods).last(),
+            'count': vdots.groupby(periods).size()
+        })